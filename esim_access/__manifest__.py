@@ -15,16 +15,29 @@
         'security/ir.model.access.csv',
         'data/ir_sequence.xml',
         'data/ir_cron.xml',
+        'data/esim_api_rate_limit_data.xml',
+        'data/esim_package_facet_data.xml',
         'wizards/esim_balance_topup_wizard_views.xml',
+        'views/esim_api_rate_limit_views.xml',
+        'views/esim_api_call_log_views.xml',
+        'views/esim_package_sync_checkpoint_views.xml',
+        'views/esim_webhook_event_views.xml',
         'views/esim_config_views.xml',
         'views/esim_balance_views.xml',
         'views/esim_package_views.xml',
         'views/esim_order_views.xml',
         'views/esim_profile_views.xml',
         'views/esim_topup_views.xml',
+        'views/esim_usage_snapshot_views.xml',
         'views/portal_templates.xml',
         'views/menu.xml',
     ],
+    'assets': {
+        'web.assets_frontend': [
+            'esim_access/static/src/js/portal_order_status.js',
+            'esim_access/static/src/js/portal_package_search.js',
+        ],
+    },
     'installable': True,
     'application': True,
     'auto_install': False,
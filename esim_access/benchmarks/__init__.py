@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+"""eSIM Access 离线压测工具。
+
+本包不会随模块加载（`esim_access/__init__.py` 不导入它），仅供在
+`odoo-bin shell` 中手动执行，详见 `esim_benchmark` 模块说明。
+"""
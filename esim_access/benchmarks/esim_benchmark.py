@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+"""eSIM Access 吞吐量压测。
+
+在本地模拟服务（`mock_server.MockEsimAccessServer`）上依次执行四个场景：
+
+1. package_sync     全量套餐同步（`_sync_packages_from_api`）与按地区增量同步
+2. order_ingestion  并发确认订单 → 履约队列下单 → ORDER_STATUS Webhook → 事件批处理
+3. bulk_refresh     批量刷新全部档案（`_bulk_refresh_status`）与逐个刷新（`action_refresh_status`）
+4. portal_order     门户用户并发登录后 POST `/my/esim/order`
+
+HTTP 阶段直接调用进程内 WSGI 应用 `odoo.http.root`，无需另起 Odoo 服务；
+每个阶段的 SQL 数通过 Odoo 的线程级 `query_count` 统计。
+
+会改写 API 配置、停用全部限流预算并写入客户、套餐与订单，请仅在一次性数据库中执行::
+
+    $ odoo-bin shell -c odoo.conf -d bench_db
+    >>> from odoo.addons.esim_access.benchmarks import esim_benchmark
+    >>> esim_benchmark.run(env, orders=200, concurrency=8, api_latency=0.05)
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from werkzeug.test import Client
+
+from odoo import SUPERUSER_ID, Command, api, fields, http
+
+from odoo.addons.esim_access.benchmarks.mock_server import MockEsimAccessServer
+
+_logger = logging.getLogger(__name__)
+
+SCENARIOS = ('package_sync', 'order_ingestion', 'bulk_refresh', 'portal_order')
+PERCENTILES = (50, 90, 95, 99)
+
+BENCH_WEBHOOK_SECRET = 'BENCH_WEBHOOK_SECRET'
+BENCH_LOGIN_PREFIX = 'esim.bench'
+# 履约 / 事件队列排空的最大轮数，防止故障注入下无限循环
+MAX_DRAIN_ROUNDS = 1000
+
+_CSRF_RE = re.compile(r'name="csrf_token"\s+value="([^"]+)"')
+
+
+@contextmanager
+def _measure(sample: dict, stage: str):
+    """记录单个阶段的耗时（秒）与 SQL 数。
+
+    `odoo.sql_db.Cursor.execute` 会在当前线程存在 `query_count` 属性时累加；
+    WSGI 入口 `http.root` 每次请求也会重置该计数，因此两类阶段口径一致。
+    """
+    thread = threading.current_thread()
+    thread.query_count = 0
+    thread.query_time = 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample[stage] = (time.perf_counter() - start, thread.query_count)
+
+
+def _percentile(values: list[float], pct: int) -> float:
+    """最近秩法百分位。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def _setup(registry, server: MockEsimAccessServer, users: int, balance: float) -> dict:
+    """将 API 配置指向模拟服务并创建门户压测用户，提交后返回各用户的登录名与客户 ID。"""
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        ICP = env['ir.config_parameter']
+        for key, value in {
+            'esim_access.access_code': server.access_code,
+            'esim_access.secret_key': server.secret_key,
+            'esim_access.api_base_url': server.url,
+            'esim_access.webhook_secret': server.webhook_secret,
+        }.items():
+            ICP.set_param(key, value)
+        # 限流预算针对真实供应商，压测时全部停用以测出本地处理能力上限
+        env['esim.api.rate.limit'].search([]).write({'active': False})
+
+        portal_group = env.ref('base.group_portal')
+        accounts = []
+        for index in range(users):
+            login = f'{BENCH_LOGIN_PREFIX}.{index}@example.com'
+            user = env['res.users'].with_context(active_test=False).search([('login', '=', login)], limit=1)
+            if not user:
+                user = env['res.users'].with_context(no_reset_password=True).create({
+                    'name': f'eSIM Benchmark {index}',
+                    'login': login,
+                    'email': login,
+                    'password': login,
+                    'group_ids': [Command.set([portal_group.id])],
+                })
+            partner = user.partner_id.commercial_partner_id
+            partner._esim_change_balance('topup', balance, description='Benchmark top-up')
+            accounts.append({'login': login, 'password': login, 'partner_id': partner.id})
+        return {'accounts': accounts}
+
+
+# ── 场景 ─────────────────────────────────────────────────
+
+
+def _bench_package_sync(registry) -> dict:
+    """全量同步一次，再将全部地区检查点置为过期后执行一次增量同步"""
+    samples = []
+    for stage in ('full', 'incremental'):
+        sample = {}
+        with _measure(sample, stage):
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                Package = env['esim.package']
+                if stage == 'full':
+                    sample['items'] = Package._sync_packages_from_api()
+                else:
+                    env['esim.package.sync.checkpoint'].search([]).write({
+                        'last_sync_date': fields.Datetime.now() - timedelta(days=30),
+                    })
+                    sample['items'] = Package._sync_packages_incremental()
+        samples.append(sample)
+
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        env['esim.package'].search([('package_type', '=', 'BASE')]).write({'is_published': True})
+    return {'samples': samples, 'items': sum(s.get('items', 0) for s in samples)}
+
+
+def _pick_package_ids(registry, count: int) -> list[int]:
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        packages = env['esim.package'].search(
+            [('package_type', '=', 'BASE'), ('is_published', '=', True)], order='sale_price', limit=count,
+        )
+        return packages.ids
+
+
+def _bench_order_ingestion(
+    registry, server: MockEsimAccessServer, setup: dict, orders: int, concurrency: int,
+) -> dict:
+    """并发确认 N 张订单，随后依次排空履约队列、投递 ORDER_STATUS Webhook 并排空事件队列"""
+    package_ids = _pick_package_ids(registry, 20)
+    accounts = setup['accounts']
+
+    def confirm(index):
+        sample = {}
+        try:
+            with _measure(sample, 'confirm'):
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    order = env['esim.order'].create({
+                        'partner_id': accounts[index % len(accounts)]['partner_id'],
+                        'package_id': package_ids[index % len(package_ids)],
+                        'quantity': 1,
+                    })
+                    order.action_confirm()
+        except Exception as e:  # noqa: BLE001 - 压测需统计失败而非中断
+            _logger.exception("eSIM benchmark order #%d failed to confirm", index)
+            sample['error'] = str(e)
+        return sample
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='esim-bench') as pool:
+        samples = list(pool.map(confirm, range(orders)))
+
+    # 履约定时任务每单独立提交，逐批调用直到没有待下单的订单
+    for _round in range(MAX_DRAIN_ROUNDS):
+        sample = {}
+        with _measure(sample, 'fulfil_batch'):
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                Order = env['esim.order']
+                Order._cron_fulfil_orders()
+                remaining = Order.search_count([
+                    ('state', '=', 'confirmed'),
+                    ('next_fulfil_date', '<=', fields.Datetime.now()),
+                ])
+        samples.append(sample)
+        if not remaining:
+            break
+
+    client = Client(http.root, use_cookies=False)
+
+    def post_webhook(headers, body):
+        return client.post('/esim/webhook', headers=headers, data=body)
+
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        placed = env['esim.order'].search_read(
+            [('state', '=', 'processing'), ('api_order_no', '!=', False)], ['api_order_no', 'transaction_id'],
+        )
+    for order in placed:
+        sample = {}
+        with _measure(sample, 'webhook'):
+            response = server.send_webhook(
+                'ORDER_STATUS', post=post_webhook,
+                orderNo=order['api_order_no'], transactionId=order['transaction_id'],
+            )
+            if response.status_code != 200:
+                sample['error'] = f"webhook returned HTTP {response.status_code}"
+        samples.append(sample)
+
+    for _round in range(MAX_DRAIN_ROUNDS):
+        sample = {}
+        with _measure(sample, 'process_events'):
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                Event = env['esim.webhook.event']
+                Event._cron_process_events()
+                remaining = Event.search_count([('state', '=', 'pending')])
+        samples.append(sample)
+        if not remaining:
+            break
+
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        done = env['esim.order'].search_count([('state', '=', 'done')])
+    return {'samples': samples, 'items': orders, 'done': done}
+
+
+def _bench_bulk_refresh(registry, concurrency: int, single_refresh: int) -> dict:
+    """批量刷新全部档案一次，并抽取部分档案并发逐个刷新作对照"""
+    samples = []
+    sample = {}
+    with _measure(sample, 'bulk'):
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            profiles = env['esim.profile'].search([('iccid', '!=', False)])
+            sample['items'] = len(profiles)
+            sample['changed'] = profiles._bulk_refresh_status()
+    samples.append(sample)
+
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        profile_ids = env['esim.profile'].search([('iccid', '!=', False)], limit=single_refresh).ids
+
+    def refresh(profile_id):
+        sample = {}
+        try:
+            with _measure(sample, 'single'):
+                with registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    env['esim.profile'].browse(profile_id).action_refresh_status()
+        except Exception as e:  # noqa: BLE001 - 压测需统计失败而非中断
+            _logger.exception("eSIM benchmark refresh of profile %d failed", profile_id)
+            sample['error'] = str(e)
+        return sample
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='esim-bench') as pool:
+        samples.extend(pool.map(refresh, profile_ids))
+    return {'samples': samples, 'items': samples[0].get('items', 0), 'changed': samples[0].get('changed', 0)}
+
+
+def _portal_login(client: Client, account: dict) -> None:
+    response = client.get('/web/login')
+    match = _CSRF_RE.search(response.get_data(as_text=True))
+    response = client.post('/web/login', data={
+        'login': account['login'],
+        'password': account['password'],
+        'csrf_token': match.group(1) if match else '',
+        'redirect': '/my',
+    })
+    if response.status_code not in (302, 303):
+        raise RuntimeError(f"portal login for {account['login']} returned HTTP {response.status_code}")
+
+
+def _bench_portal_order(registry, setup: dict, orders: int, concurrency: int) -> dict:
+    """每个 worker 以独立门户用户登录（会话 Cookie 独立），从套餐详情页取 CSRF 令牌后下单"""
+    package_ids = _pick_package_ids(registry, 20)
+    accounts = setup['accounts'][:concurrency]
+    per_worker = [list(range(worker, orders, len(accounts))) for worker in range(len(accounts))]
+
+    def worker(worker_index):
+        client = Client(http.root)
+        worker_samples = []
+        try:
+            _portal_login(client, accounts[worker_index])
+        except Exception as e:  # noqa: BLE001 - 压测需统计失败而非中断
+            _logger.exception("eSIM benchmark portal login failed")
+            return [{'error': str(e)} for _index in per_worker[worker_index]]
+
+        for index in per_worker[worker_index]:
+            sample = {}
+            package_id = package_ids[index % len(package_ids)]
+            try:
+                with _measure(sample, 'package_page'):
+                    response = client.get(f'/my/esim/packages/{package_id}')
+                match = _CSRF_RE.search(response.get_data(as_text=True))
+                with _measure(sample, 'order'):
+                    response = client.post('/my/esim/order', data={
+                        'package_id': package_id,
+                        'quantity': 1,
+                        'csrf_token': match.group(1) if match else '',
+                    })
+                if response.status_code not in (302, 303):
+                    raise RuntimeError(f"order returned HTTP {response.status_code}")
+            except Exception as e:  # noqa: BLE001 - 压测需统计失败而非中断
+                _logger.exception("eSIM benchmark portal order #%d failed", index)
+                sample['error'] = str(e)
+            worker_samples.append(sample)
+        return worker_samples
+
+    with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix='esim-bench') as pool:
+        samples = [sample for chunk in pool.map(worker, range(len(accounts))) for sample in chunk]
+    return {'samples': samples, 'items': orders}
+
+
+# ── 报告 ─────────────────────────────────────────────────
+
+
+def _build_scenario_report(result: dict, elapsed: float) -> dict:
+    samples = result.pop('samples')
+    failed = sum(1 for s in samples if 'error' in s)
+    report = dict(result, elapsed=elapsed, failed=failed, stages={})
+    report['throughput'] = result['items'] / elapsed if elapsed else 0.0
+    stages = []
+    for sample in samples:
+        stages.extend(stage for stage, value in sample.items() if isinstance(value, tuple) and stage not in stages)
+    for stage in stages:
+        durations = [s[stage][0] * 1000 for s in samples if stage in s]
+        queries = [s[stage][1] for s in samples if stage in s]
+        report['stages'][stage] = {
+            'count': len(durations),
+            'latency_ms': {f'p{pct}': _percentile(durations, pct) for pct in PERCENTILES},
+            'latency_max_ms': max(durations),
+            'queries_avg': sum(queries) / len(queries),
+            'queries_max': max(queries),
+        }
+    return report
+
+
+def format_report(report: dict) -> str:
+    """将压测结果格式化为文本表格。"""
+    header = f"{'stage':<16}{'count':>7}" + ''.join(f"{'p%d ms' % pct:>10}" for pct in PERCENTILES)
+    header += f"{'max ms':>10}{'avg SQL':>10}{'max SQL':>10}"
+    lines = []
+    for scenario, result in report['scenarios'].items():
+        extra = ' '.join(
+            f"{key}={result[key]}" for key in ('done', 'changed') if key in result
+        )
+        lines += [
+            f"== {scenario}: items={result['items']} failed={result['failed']} {extra}".rstrip(),
+            f"elapsed={result['elapsed']:.2f}s throughput={result['throughput']:.2f} items/s",
+            header,
+        ]
+        for stage, stats in result['stages'].items():
+            line = f"{stage:<16}{stats['count']:>7d}"
+            line += ''.join(f"{stats['latency_ms'][f'p{pct}']:>10.1f}" for pct in PERCENTILES)
+            line += f"{stats['latency_max_ms']:>10.1f}{stats['queries_avg']:>10.1f}{stats['queries_max']:>10d}"
+            lines.append(line)
+        lines.append('')
+    lines.append("mock API calls: " + ', '.join(
+        f"{endpoint}={count}" for endpoint, count in sorted(report['api_calls'].items())
+    ))
+    return '\n'.join(lines)
+
+
+def run(
+    env,
+    orders: int = 100,
+    concurrency: int = 8,
+    package_count: int = 200,
+    single_refresh: int = 50,
+    balance: float = 100000.0,
+    api_latency: float = 0.0,
+    api_latency_jitter: float = 0.0,
+    error_rate: float = 0.0,
+    http_error_rate: float = 0.0,
+    scenarios: tuple = SCENARIOS,
+) -> dict:
+    """执行压测并打印报告。
+
+    :param env: shell 中的 env，仅用于获取 registry；各 worker 使用独立游标
+    :param orders: order_ingestion 与 portal_order 场景各自的订单数 N
+    :param concurrency: 并发 worker 数（同时也是门户压测用户数）
+    :param package_count: 模拟服务生成的基础套餐数（另有同等数量的充值套餐）
+    :param single_refresh: bulk_refresh 场景中逐个刷新的档案数
+    :param api_latency: 模拟服务每次 API 调用的附加延迟（秒）
+    :param error_rate: 模拟服务返回业务错误的比例
+    :param http_error_rate: 模拟服务返回 HTTP 503 的比例
+    :param scenarios: 要执行的场景，顺序固定为 SCENARIOS 中的顺序（后续场景依赖前面产生的数据）
+    :return: 报告字典，结构见 `_build_scenario_report`
+    """
+    registry = env.registry
+    server = MockEsimAccessServer(
+        package_count=package_count,
+        latency=api_latency,
+        latency_jitter=api_latency_jitter,
+        error_rate=error_rate,
+        http_error_rate=http_error_rate,
+        webhook_secret=BENCH_WEBHOOK_SECRET,
+    ).start()
+    runners = {
+        'package_sync': lambda setup: _bench_package_sync(registry),
+        'order_ingestion': lambda setup: _bench_order_ingestion(registry, server, setup, orders, concurrency),
+        'bulk_refresh': lambda setup: _bench_bulk_refresh(registry, concurrency, single_refresh),
+        'portal_order': lambda setup: _bench_portal_order(registry, setup, orders, concurrency),
+    }
+    report = {'scenarios': {}}
+    try:
+        setup = _setup(registry, server, concurrency, balance)
+        for scenario in SCENARIOS:
+            if scenario not in scenarios:
+                continue
+            start = time.perf_counter()
+            result = runners[scenario](setup)
+            report['scenarios'][scenario] = _build_scenario_report(result, time.perf_counter() - start)
+    finally:
+        server.stop()
+        report['api_calls'] = dict(server.call_counts)
+
+    print(format_report(report))  # noqa: T201 - shell 交互输出
+    return report
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""本地模拟 eSIM Access 服务。
+
+实现模块用到的全部端点：
+- open/package/list / open/esim/order / open/esim/query
+- topUp / open/esim/cancel / suspend / revoke
+
+每个请求按真实平台规则校验 RT-AccessCode / RT-Timestamp / RT-RequestID / RT-Signature；
+可配置响应延迟与故障注入（业务错误码、HTTP 503），并可向商户投递签名的 Webhook。
+
+签名算法复用 `services.esim_api.compute_request_signature` 与
+`services.webhook_auth.compute_webhook_signature`，与生产链路一致。
+"""
+
+import hmac
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from odoo.addons.esim_access.services.esim_api import (
+    PRICE_DIVISOR, VOLUME_DIVISOR, compute_request_signature, format_api_datetime,
+)
+from odoo.addons.esim_access.services.webhook_auth import compute_webhook_signature
+
+_logger = logging.getLogger(__name__)
+
+# 生成套餐时轮换使用的覆盖地区（含多国区域套餐）
+_LOCATIONS = ('US', 'GB', 'JP', 'KR', 'SG', 'TH', 'DE', 'FR', 'AU', 'CN', 'HK', 'US,CA,MX', 'FR,DE,IT,ES')
+_DURATIONS = (1, 3, 7, 15, 30)
+_VOLUMES_GB = (1, 3, 5, 10, 20)
+
+# 故障注入时返回的业务错误码
+INJECTED_ERROR_CODE = '900001'
+
+
+def _parse_api_time(value: str) -> datetime | None:
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
+class MockEsimAccessServer:
+    """线程化的本地 eSIM Access 服务，单进程内可同时服务多个并发 worker。
+
+    - latency / latency_jitter: 每次请求的附加延迟（秒）及随机抖动上限
+    - error_rate: 按比例返回业务错误（success=false, errorCode=900001）
+    - http_error_rate: 按比例返回 HTTP 503，用于验证重试与履约退避
+    - webhook_url / webhook_secret: 下单后投递 ORDER_STATUS 通知的地址与签名密钥
+    """
+
+    def __init__(
+        self,
+        access_code: str = 'BENCH_ACCESS_CODE',
+        secret_key: str = 'BENCH_SECRET_KEY',
+        host: str = '127.0.0.1',
+        port: int = 0,
+        package_count: int = 200,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        http_error_rate: float = 0.0,
+        webhook_url: str = '',
+        webhook_secret: str = '',
+        seed: int = 0,
+    ):
+        self.access_code = access_code
+        self.secret_key = secret_key
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._packages = self._generate_packages(package_count)
+        self._orders = {}
+        self._orders_by_transaction = {}
+        self._profiles = {}
+        self.call_counts = {}
+        self._server = ThreadingHTTPServer((host, port), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api/v1'
+
+    def start(self) -> 'MockEsimAccessServer':
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='mock-esim-access', daemon=True,
+        )
+        self._thread.start()
+        _logger.info("Mock eSIM Access server listening on %s", self.url)
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    # ------------------------------------------------------------------
+    # 数据
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _generate_packages(count: int) -> list[dict]:
+        """按固定规则生成 BASE 套餐及对应的 TOPUP 套餐，结果可重复"""
+        packages = []
+        for index in range(count):
+            location = _LOCATIONS[index % len(_LOCATIONS)]
+            duration = _DURATIONS[index % len(_DURATIONS)]
+            volume_gb = _VOLUMES_GB[(index // len(_DURATIONS)) % len(_VOLUMES_GB)]
+            code = f'BENCH{index:05d}'
+            price = (volume_gb * 2 + duration) * PRICE_DIVISOR // 2
+            base = {
+                'packageCode': code,
+                'slug': f'bench-{location.lower().replace(",", "-")}-{volume_gb}gb-{duration}d-{index}',
+                'name': f'{location} {volume_gb}GB {duration}Days',
+                'price': price,
+                'retailPrice': price * 2,
+                'currencyCode': 'USD',
+                'volume': volume_gb * VOLUME_DIVISOR,
+                'duration': duration,
+                'durationUnit': 'DAY',
+                'unusedValidTime': 180,
+                'location': location,
+                'description': f'Benchmark package {code}',
+                'dataType': 1,
+                'smsStatus': 0,
+                'activeType': 2,
+                'speed': '4G/5G',
+                'ipExport': location.split(',')[0],
+                'supportTopUpType': 2,
+                'fupPolicy': '',
+            }
+            packages.append(base)
+            packages.append(dict(base, packageCode=f'TOPUP_{code}', slug=f'topup-{base["slug"]}',
+                                 name=f'TopUp {base["name"]}'))
+        return packages
+
+    def _new_profile(self, order_no: str, package: dict) -> dict:
+        seq = next(self._sequence)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        iccid = f'8999{seq:015d}'
+        return {
+            'iccid': iccid,
+            'esimTranNo': f'T{seq:012d}',
+            'orderNo': order_no,
+            'ac': f'LPA:1$mock.esim.local${uuid.uuid4().hex.upper()}',
+            'qrCodeUrl': f'{self.url}/qr/{iccid}.png',
+            'smdpStatus': 'RELEASED',
+            'esimStatus': 'GOT_RESOURCE',
+            'imsi': f'4540{seq:011d}',
+            'eid': '',
+            'apn': 'mock',
+            'totalVolume': package['volume'],
+            'orderUsage': 0,
+            'expiredTime': format_api_datetime(now + timedelta(days=package['duration'])),
+            'createTime': format_api_datetime(now),
+            'packageList': [{'packageCode': package['packageCode']}],
+        }
+
+    # ------------------------------------------------------------------
+    # 签名与故障注入
+    # ------------------------------------------------------------------
+
+    def _verify_request(self, headers, body: str) -> bool:
+        if headers.get('RT-AccessCode') != self.access_code:
+            return False
+        expected = compute_request_signature(
+            self.secret_key, self.access_code,
+            headers.get('RT-Timestamp', ''), headers.get('RT-RequestID', ''), body,
+        )
+        return hmac.compare_digest(expected, (headers.get('RT-Signature') or '').upper())
+
+    def _roll(self, rate: float) -> bool:
+        if not rate:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    # ------------------------------------------------------------------
+    # 接口实现（返回 obj，或抛出 _ApiError）
+    # ------------------------------------------------------------------
+
+    def _package_list(self, payload: dict) -> dict:
+        package_type = payload.get('type') or 'BASE'
+        location_code = (payload.get('locationCode') or '').upper()
+        package_code = payload.get('packageCode') or payload.get('slug') or ''
+        iccid = payload.get('iccid') or ''
+        is_topup = package_type == 'TOPUP'
+
+        packages = [pkg for pkg in self._packages if pkg['packageCode'].startswith('TOPUP_') == is_topup]
+        if iccid:
+            with self._lock:
+                profile = self._profiles.get(iccid)
+            if not profile:
+                raise _ApiError('200010', 'iccid not found')
+            base_code = profile['packageList'][0]['packageCode']
+            packages = [pkg for pkg in packages if pkg['packageCode'] == f'TOPUP_{base_code}']
+        if package_code:
+            packages = [pkg for pkg in packages if package_code in (pkg['packageCode'], pkg['slug'])]
+        if location_code:
+            packages = [pkg for pkg in packages if location_code in pkg['location'].split(',')]
+        return {'packageList': packages}
+
+    def _place_order(self, payload: dict) -> dict:
+        transaction_id = payload.get('transactionId') or ''
+        packages_by_code = {pkg['packageCode']: pkg for pkg in self._packages}
+        with self._lock:
+            # 同一交易 ID 重复下单返回原订单（供应商去重）
+            if transaction_id in self._orders_by_transaction:
+                return {'orderNo': self._orders_by_transaction[transaction_id], 'transactionId': transaction_id}
+            order_no = f'B{next(self._sequence):012d}'
+            profiles = []
+            for info in payload.get('packageInfoList') or []:
+                package = packages_by_code.get(info.get('packageCode'))
+                if not package:
+                    raise _ApiError('200005', f"package {info.get('packageCode')} not found")
+                for _index in range(max(int(info.get('count') or 1), 1)):
+                    profiles.append(self._new_profile(order_no, package))
+            self._orders[order_no] = {'transactionId': transaction_id, 'iccids': [p['iccid'] for p in profiles]}
+            self._orders_by_transaction[transaction_id] = order_no
+            for profile in profiles:
+                self._profiles[profile['iccid']] = profile
+        if self.webhook_url:
+            threading.Thread(
+                target=self.send_webhook, args=('ORDER_STATUS',),
+                kwargs={'orderNo': order_no, 'transactionId': transaction_id}, daemon=True,
+            ).start()
+        return {'orderNo': order_no, 'transactionId': transaction_id}
+
+    def _query(self, payload: dict) -> dict:
+        pager = payload.get('pager') or {}
+        page_num = max(int(pager.get('pageNum') or 1), 1)
+        page_size = min(max(int(pager.get('pageSize') or 50), 5), 500)
+        with self._lock:
+            if payload.get('orderNo'):
+                order = self._orders.get(payload['orderNo'])
+                if not order:
+                    raise _ApiError('200011', 'order not found')
+                profiles = [self._profiles[iccid] for iccid in order['iccids']]
+            elif payload.get('iccid'):
+                profile = self._profiles.get(payload['iccid'])
+                if not profile:
+                    raise _ApiError('200010', 'iccid not found')
+                profiles = [profile]
+            else:
+                start = _parse_api_time(payload.get('startTime', '')) or datetime.min
+                end = _parse_api_time(payload.get('endTime', '')) or datetime.max
+                profiles = [
+                    profile for profile in self._profiles.values()
+                    if start <= _parse_api_time(profile['createTime']) < end
+                ]
+            # 每次查询模拟少量流量消耗，便于观察用量写入
+            for profile in profiles:
+                if profile['esimStatus'] in ('GOT_RESOURCE', 'IN_USE'):
+                    used = profile['orderUsage'] + self._random.randint(0, 50) * 1024 * 1024
+                    profile['orderUsage'] = min(used, profile['totalVolume'])
+            total = len(profiles)
+            page = [dict(profile) for profile in profiles[(page_num - 1) * page_size:page_num * page_size]]
+        return {'esimList': page, 'pager': {'pageNum': page_num, 'pageSize': page_size, 'total': total}}
+
+    def _top_up(self, payload: dict) -> dict:
+        package = next((pkg for pkg in self._packages if pkg['packageCode'] == payload.get('packageCode')), None)
+        if not package:
+            raise _ApiError('200005', 'package not found')
+        with self._lock:
+            profile = self._profiles.get(payload.get('iccid'))
+            if not profile:
+                raise _ApiError('200010', 'iccid not found')
+            profile['totalVolume'] += package['volume']
+            expired = _parse_api_time(profile['expiredTime']) + timedelta(days=package['duration'])
+            profile['expiredTime'] = format_api_datetime(expired)
+            return {
+                'transactionId': payload.get('transactionId'),
+                'iccid': profile['iccid'],
+                'totalVolume': profile['totalVolume'],
+                'orderUsage': profile['orderUsage'],
+                'expiredTime': profile['expiredTime'],
+            }
+
+    def _set_status(self, payload: dict, allowed: tuple, esim_status: str, smdp_status: str = '') -> dict:
+        with self._lock:
+            profile = self._profiles.get(payload.get('iccid')) or next(
+                (p for p in self._profiles.values() if p['esimTranNo'] == payload.get('esimTranNo')), None,
+            )
+            if not profile:
+                raise _ApiError('200010', 'iccid not found')
+            if profile['esimStatus'] not in allowed:
+                raise _ApiError('200012', f"esim status {profile['esimStatus']} not allowed")
+            profile['esimStatus'] = esim_status
+            if smdp_status:
+                profile['smdpStatus'] = smdp_status
+        return {}
+
+    def _cancel(self, payload: dict) -> dict:
+        return self._set_status(payload, ('GOT_RESOURCE',), 'CANCEL', 'DELETED')
+
+    def _suspend(self, payload: dict) -> dict:
+        return self._set_status(payload, ('GOT_RESOURCE', 'IN_USE'), 'SUSPENDED')
+
+    def _revoke(self, payload: dict) -> dict:
+        return self._set_status(payload, ('GOT_RESOURCE', 'IN_USE', 'SUSPENDED'), 'REVOKE')
+
+    def _build_handler(self):
+        server = self
+        routes = {
+            'open/package/list': server._package_list,
+            'open/esim/order': server._place_order,
+            'open/esim/query': server._query,
+            'topUp': server._top_up,
+            'open/esim/cancel': server._cancel,
+            'suspend': server._suspend,
+            'revoke': server._revoke,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+                _logger.debug("Mock eSIM Access server: " + format, *args)
+
+            def _send_json(self, status: int, data: dict) -> None:
+                encoded = json.dumps(data, separators=(',', ':')).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8')
+
+                endpoint = next((name for name in routes if path.endswith(f'/{name}')), None)
+                if endpoint is None:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.call_counts[endpoint] = server.call_counts.get(endpoint, 0) + 1
+                if not server._verify_request(self.headers, body):
+                    self._send_json(200, {'success': False, 'errorCode': '000101', 'errorMessage': 'invalid signature'})
+                    return
+
+                delay = server.latency + (server._random.uniform(0, server.latency_jitter) if server.latency_jitter else 0)
+                if delay:
+                    time.sleep(delay)
+                if server._roll(server.http_error_rate):
+                    self.send_error(503, 'Injected failure')
+                    return
+                if server._roll(server.error_rate):
+                    self._send_json(200, {
+                        'success': False, 'errorCode': INJECTED_ERROR_CODE, 'errorMessage': 'injected failure',
+                    })
+                    return
+
+                try:
+                    obj = routes[endpoint](json.loads(body or '{}'))
+                except _ApiError as e:
+                    self._send_json(200, {'success': False, 'errorCode': e.code, 'errorMessage': e.message})
+                    return
+                self._send_json(200, {'success': True, 'errorCode': '0', 'obj': obj})
+
+        return Handler
+
+    # ------------------------------------------------------------------
+    # Webhook
+    # ------------------------------------------------------------------
+
+    def build_webhook(self, notify_type: str, **content) -> tuple[dict, bytes]:
+        """构造 Webhook 通知，返回 (请求头, 请求体)；配置了 webhook_secret 时附带签名头"""
+        body = json.dumps({'notifyType': notify_type, **content}, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'RT-RequestID': uuid.uuid4().hex}
+        if self.webhook_secret:
+            timestamp = str(int(time.time()))
+            headers.update({
+                'RT-Timestamp': timestamp,
+                'RT-Signature': compute_webhook_signature(
+                    self.webhook_secret, timestamp, headers['RT-RequestID'], body,
+                ),
+            })
+        return headers, body
+
+    def send_webhook(self, notify_type: str, post=None, **content):
+        """向商户投递 Webhook。
+
+        :param post: 可选的投递函数 `post(headers, body)`；缺省时通过 HTTP 发送到 webhook_url。
+        """
+        headers, body = self.build_webhook(notify_type, **content)
+        if post is not None:
+            return post(headers, body)
+        try:
+            return requests.post(self.webhook_url, headers=headers, data=body, timeout=30)
+        except requests.RequestException:
+            _logger.warning("Mock eSIM Access server: webhook delivery to %s failed", self.webhook_url, exc_info=True)
+            return None
+
+    def order_numbers(self) -> list[str]:
+        with self._lock:
+            return list(self._orders)
+
+
+class _ApiError(Exception):
+
+    def __init__(self, code: str, message: str):
+        self.code = code
+        self.message = message
+        super().__init__(f'[{code}] {message}')
@@ -12,6 +12,12 @@ _logger = logging.getLogger(__name__)
 PACKAGES_PER_PAGE = 12
 PROFILES_PER_PAGE = 10
 TRANSACTIONS_PER_PAGE = 20
+CART_SESSION_KEY = 'esim_cart'
+SUGGEST_LIMIT = 8
+# QR 码链接带版本号，内容不会变化，浏览器缓存一年
+QR_CACHE_MAX_AGE = 365 * 24 * 3600
+USAGE_CHART_DAYS = 14
+SUGGEST_MIN_LENGTH = 2
 
 
 class EsimPortal(CustomerPortal):
@@ -26,42 +32,17 @@ class EsimPortal(CustomerPortal):
         """统一处理筛选参数，避免 None 和空白字符串干扰 domain。"""
         return (value or '').strip()
 
-    @staticmethod
-    def _get_package_duration_option(package) -> dict | None:
-        """构建有效期筛选项。"""
-        if not package.duration or not package.duration_unit:
-            return None
-        label_unit = '天' if package.duration_unit == 'DAY' else '月'
-        return {
-            'value': f"{package.duration}|{package.duration_unit}",
-            'label': f"{package.duration} {label_unit}",
-        }
-
-    @staticmethod
-    def _get_package_volume_option(package) -> dict | None:
-        """构建流量筛选项。"""
-        if package.volume in (None, False):
-            return None
-        return {
-            'value': str(package.volume),
-            'label': f"{package.volume:g} GB",
-        }
-
     def _prepare_home_portal_values(self, counters):
         values = super()._prepare_home_portal_values(counters)
         partner = self._get_portal_partner()
 
         # 余额卡片展示的是实际金额，不属于 portal counter 机制，首页首屏始终提供。
+        # 余额与计数缓存同在 res.partner 上，一次读取即可，无需计数查询
         values['esim_balance'] = partner.sudo().esim_balance
 
-        if 'esim_profile_count' in counters:
-            values['esim_profile_count'] = request.env['esim.profile'].sudo().search_count(
-                [('partner_id', '=', partner.id)]
-            )
-        if 'esim_order_count' in counters:
-            values['esim_order_count'] = request.env['esim.order'].sudo().search_count(
-                [('partner_id', '=', partner.id)]
-            )
+        if 'esim_profile_count' in counters or 'esim_order_count' in counters:
+            esim_counters = partner._get_esim_portal_counters()
+            values.update({key: count for key, count in esim_counters.items() if key in counters})
         return values
 
     @staticmethod
@@ -97,9 +78,7 @@ class EsimPortal(CustomerPortal):
 
         domain = [('is_published', '=', True), ('package_type', '=', 'BASE'), ('active', '=', True)]
         if location:
-            domain.append(('location', 'ilike', location))
-        if name:
-            domain.append(('name', 'ilike', name))
+            domain += request.env['esim.package'].sudo()._get_location_domain(location)
         if duration:
             duration_value, _, duration_unit = duration.partition('|')
             if duration_value.isdigit() and duration_unit:
@@ -116,12 +95,12 @@ class EsimPortal(CustomerPortal):
             domain.append(('data_type', '=', data_type))
 
         Package = request.env['esim.package'].sudo()
-        all_packages = Package.search([
-            ('is_published', '=', True),
-            ('package_type', '=', 'BASE'),
-            ('active', '=', True),
-        ], order='location, volume, duration')
-        package_count = Package.search_count(domain)
+        if name:
+            # 关键字搜索按相关度排序，在有限的结果集内分页
+            ranked_ids = Package._search_catalogue(name, domain)
+            package_count = len(ranked_ids)
+        else:
+            package_count = Package.search_count(domain)
 
         filter_args = {
             'location': location,
@@ -139,30 +118,14 @@ class EsimPortal(CustomerPortal):
             step=PACKAGES_PER_PAGE,
         )
 
-        packages = Package.search(domain, limit=PACKAGES_PER_PAGE, offset=pager['offset'],
-                                  order='location, volume, duration')
-
-        all_location_codes = set()
-        all_durations = {}
-        all_volumes = {}
-        for pkg in all_packages:
-            if pkg.location:
-                for loc in pkg.location.split(','):
-                    code = loc.strip()
-                    if code:
-                        all_location_codes.add(code.upper())
-            duration_option = self._get_package_duration_option(pkg)
-            if duration_option:
-                all_durations[duration_option['value']] = duration_option
-            volume_option = self._get_package_volume_option(pkg)
-            if volume_option:
-                all_volumes[volume_option['value']] = volume_option
-
-        country_name_map = self._build_country_name_map(all_location_codes)
-        available_locations = sorted(
-            [{'value': code, 'label': country_name_map.get(code, code)} for code in all_location_codes],
-            key=lambda item: item['label'],
-        )
+        if name:
+            packages = Package.browse(ranked_ids[pager['offset']:pager['offset'] + PACKAGES_PER_PAGE])
+        else:
+            packages = Package.search(domain, limit=PACKAGES_PER_PAGE, offset=pager['offset'],
+                                      order='location, volume, duration')
+
+        # 筛选项来自预先汇总的筛选索引（ormcache），无需扫描全部套餐
+        facets = request.env['esim.package.facet'].sudo()._get_portal_facets()
 
         data_type_map = dict(request.env['esim.package']._fields['data_type'].selection)
         available_data_types = [
@@ -176,14 +139,34 @@ class EsimPortal(CustomerPortal):
             'page_name': 'esim_packages',
             'default_url': '/my/esim/packages',
             'current_filters': filter_args,
-            'available_locations': available_locations,
-            'country_name_map': country_name_map,
-            'available_durations': sorted(all_durations.values(), key=lambda item: item['label']),
-            'available_volumes': sorted(all_volumes.values(), key=lambda item: float(item['value'])),
+            'available_locations': facets['locations'],
+            'country_name_map': facets['country_name_map'],
+            'available_durations': facets['durations'],
+            'available_volumes': facets['volumes'],
             'available_data_types': available_data_types,
         }
         return request.render('esim_access.portal_esim_packages', values)
 
+    @http.route('/my/esim/packages/suggest', type='http', auth='user', methods=['GET'])
+    def portal_esim_package_suggest(self, q='', **kw):
+        """套餐搜索联想（JSON），按相关度返回少量候选"""
+        q = self._normalize_filter_value(q)
+        if len(q) < SUGGEST_MIN_LENGTH:
+            return request.make_json_response([])
+
+        Package = request.env['esim.package'].sudo()
+        domain = [('is_published', '=', True), ('package_type', '=', 'BASE'), ('active', '=', True)]
+        packages = Package.browse(Package._search_catalogue(q, domain, limit=SUGGEST_LIMIT))
+        return request.make_json_response([
+            {
+                'id': package.id,
+                'name': package.name,
+                'location': package.location or '',
+                'url': f'/my/esim/packages/{package.id}',
+            }
+            for package in packages
+        ])
+
     @http.route('/my/esim/packages/<int:package_id>', type='http', auth='user', website=True)
     def portal_esim_package_detail(self, package_id, **kw):
         """套餐详情页"""
@@ -244,6 +227,115 @@ class EsimPortal(CustomerPortal):
 
         return request.redirect(f'/my/esim/orders/{order.id}')
 
+    # ── 购物车 ───────────────────────────────────────────
+
+    @staticmethod
+    def _get_cart() -> list[dict]:
+        """会话中的购物车：[{'package_id', 'quantity', 'period_num'}]"""
+        return list(request.session.get(CART_SESSION_KEY) or [])
+
+    @staticmethod
+    def _save_cart(cart: list[dict]) -> None:
+        request.session[CART_SESSION_KEY] = cart
+
+    def _prepare_cart_lines(self, cart: list[dict]) -> list[dict]:
+        """将购物车条目解析为可展示的套餐行，已下架的套餐自动剔除"""
+        packages = request.env['esim.package'].sudo().browse(
+            [item['package_id'] for item in cart]
+        ).exists()
+        package_map = {p.id: p for p in packages if p.is_published}
+        lines = []
+        for item in cart:
+            package = package_map.get(item['package_id'])
+            if not package:
+                continue
+            lines.append({
+                'package': package,
+                'quantity': item['quantity'],
+                'period_num': item.get('period_num', 0),
+                'subtotal': package.sale_price * item['quantity'],
+            })
+        return lines
+
+    def _render_cart(self, error_message: str = ''):
+        partner = self._get_portal_partner()
+        lines = self._prepare_cart_lines(self._get_cart())
+        values = {
+            'cart_lines': lines,
+            'cart_total': sum(line['subtotal'] for line in lines),
+            'esim_balance': partner.sudo().esim_balance,
+            'error_message': error_message,
+            'page_name': 'esim_cart',
+        }
+        return request.render('esim_access.portal_esim_cart', values)
+
+    @http.route('/my/esim/cart', type='http', auth='user', website=True)
+    def portal_esim_cart(self, **kw):
+        """购物车"""
+        return self._render_cart()
+
+    @http.route('/my/esim/cart/add', type='http', auth='user', website=True, methods=['POST'], csrf=True)
+    def portal_esim_cart_add(self, package_id, quantity=1, period_num=0, **kw):
+        """加入购物车，同一套餐 + 天数合并数量"""
+        package = request.env['esim.package'].sudo().browse(int(package_id))
+        if not package.exists() or not package.is_published:
+            raise MissingError(_("套餐不存在"))
+
+        quantity = max(int(quantity), 1)
+        period_num = max(int(period_num), 0)
+        cart = self._get_cart()
+        for item in cart:
+            if item['package_id'] == package.id and item.get('period_num', 0) == period_num:
+                item['quantity'] += quantity
+                break
+        else:
+            cart.append({'package_id': package.id, 'quantity': quantity, 'period_num': period_num})
+        self._save_cart(cart)
+        return request.redirect('/my/esim/cart')
+
+    @http.route('/my/esim/cart/update', type='http', auth='user', website=True, methods=['POST'], csrf=True)
+    def portal_esim_cart_update(self, index, quantity=0, **kw):
+        """修改购物车条目数量，数量为 0 时移除"""
+        cart = self._get_cart()
+        index = int(index)
+        if 0 <= index < len(cart):
+            quantity = max(int(quantity), 0)
+            if quantity:
+                cart[index]['quantity'] = quantity
+            else:
+                cart.pop(index)
+            self._save_cart(cart)
+        return request.redirect('/my/esim/cart')
+
+    @http.route('/my/esim/cart/checkout', type='http', auth='user', website=True, methods=['POST'], csrf=True)
+    def portal_esim_cart_checkout(self, **kw):
+        """购物车结算：全部套餐生成一张多明细订单，一次 place_order、一次扣款"""
+        lines = self._prepare_cart_lines(self._get_cart())
+        if not lines:
+            return self._render_cart(error_message=_("购物车为空"))
+
+        partner = self._get_portal_partner()
+        order = request.env['esim.order'].sudo().create({
+            'partner_id': partner.id,
+            'line_ids': [
+                fields.Command.create({
+                    'sequence': index,
+                    'package_id': line['package'].id,
+                    'quantity': line['quantity'],
+                    'period_num': line['period_num'],
+                })
+                for index, line in enumerate(lines)
+            ],
+        })
+
+        try:
+            order.action_confirm()
+        except UserError as e:
+            return self._render_cart(error_message=str(e))
+
+        self._save_cart([])
+        return request.redirect(f'/my/esim/orders/{order.id}')
+
     # ── 我的订单 ─────────────────────────────────────────
 
     @http.route(['/my/esim/orders', '/my/esim/orders/page/<int:page>'],
@@ -289,6 +381,20 @@ class EsimPortal(CustomerPortal):
         }
         return request.render('esim_access.portal_esim_order_detail', values)
 
+    @http.route('/my/esim/orders/<int:order_id>/status', type='http', auth='user', methods=['GET'])
+    def portal_esim_order_status(self, order_id, **kw):
+        """订单实时状态（JSON），供订单详情页在排队 / 处理中时轮询"""
+        partner = self._get_portal_partner()
+        order = request.env['esim.order'].sudo().browse(order_id)
+        if not order.exists() or order.partner_id.commercial_partner_id != partner:
+            raise AccessError(_("无权访问此订单"))
+
+        return request.make_json_response({
+            'state': order.state,
+            'state_label': dict(order._fields['state'].selection).get(order.state),
+            'profile_count': order.profile_count,
+        })
+
     @http.route('/my/esim/orders/<int:order_id>/cancel', type='http', auth='user',
                 website=True, methods=['POST'], csrf=True)
     def portal_esim_order_cancel(self, order_id, **kw):
@@ -300,6 +406,8 @@ class EsimPortal(CustomerPortal):
 
         try:
             order.action_cancel()
+            if order.state != 'cancelled':
+                raise UserError(_("部分 eSIM 取消失败，订单暂未退款，请稍后重试。"))
         except UserError as e:
             values = {
                 'order': order,
@@ -334,6 +442,9 @@ class EsimPortal(CustomerPortal):
         values = {
             'profiles': profiles,
             'pager': pager,
+            'usage_series': request.env['esim.usage.snapshot'].sudo()._get_consumption_series(
+                [('partner_id', '=', partner.id)], days=USAGE_CHART_DAYS,
+            ),
             'page_name': 'esim_profiles',
             'default_url': '/my/esim/profiles',
         }
@@ -347,21 +458,41 @@ class EsimPortal(CustomerPortal):
         if not profile.exists() or profile.partner_id.commercial_partner_id != partner:
             raise AccessError(_("无权访问此 eSIM"))
 
-        # 获取可用的充值套餐
-        topup_packages = []
-        if profile.state in ('ready', 'active') and profile.iccid:
-            topup_packages = request.env['esim.package'].sudo().search([
-                ('package_type', '=', 'topup'),
-                ('is_published', '=', True),
-                ('active', '=', True),
-            ])
+        return request.render(
+            'esim_access.portal_esim_profile_detail', self._prepare_profile_detail_values(profile),
+        )
 
+    @staticmethod
+    def _prepare_profile_detail_values(profile, error_message: str = '') -> dict:
+        """可用充值套餐取自按 ICCID 的缓存，页面渲染不同步调用供应商接口"""
         values = {
             'profile': profile,
-            'topup_packages': topup_packages,
+            'topup_packages': profile._get_cached_topup_packages(),
+            'topup_refreshing': profile.topup_refresh_pending,
+            'usage_series': request.env['esim.usage.snapshot'].sudo()._get_consumption_series(
+                [('profile_id', '=', profile.id)], days=USAGE_CHART_DAYS,
+            ),
             'page_name': 'esim_profile_detail',
         }
-        return request.render('esim_access.portal_esim_profile_detail', values)
+        if error_message:
+            values['error_message'] = error_message
+        return values
+
+    @http.route('/my/esim/profiles/<int:profile_id>/qr/<int:size>', type='http', auth='user', methods=['GET'])
+    def portal_esim_profile_qr(self, profile_id, size, **kw):
+        """本地生成的激活 QR 码；链接带激活码哈希版本号，可长期缓存"""
+        partner = self._get_portal_partner()
+        profile = request.env['esim.profile'].sudo().browse(profile_id)
+        if not profile.exists() or profile.partner_id.commercial_partner_id != partner:
+            raise AccessError(_("无权访问此 eSIM"))
+
+        attachment = profile._get_qr_image(size)
+        if not attachment:
+            raise MissingError(_("QR 码不存在"))
+        return request.make_response(attachment.raw, headers=[
+            ('Content-Type', 'image/png'),
+            ('Cache-Control', f'private, max-age={QR_CACHE_MAX_AGE}, immutable'),
+        ])
 
     # ── 充值 ─────────────────────────────────────────────
 
@@ -374,8 +505,9 @@ class EsimPortal(CustomerPortal):
         if not profile.exists() or profile.partner_id.commercial_partner_id != partner:
             raise AccessError(_("无权操作此 eSIM"))
 
+        # 只接受供应商按该 ICCID 返回的充值套餐，其他 ICCID 的套餐或基础套餐一律拒绝
         package = request.env['esim.package'].sudo().browse(int(package_id))
-        if not package.exists() or package.package_type != 'TOPUP':
+        if not package.exists() or package not in profile._get_cached_topup_packages():
             raise MissingError(_("充值套餐不存在"))
 
         topup = request.env['esim.topup'].sudo().create({
@@ -387,18 +519,10 @@ class EsimPortal(CustomerPortal):
         try:
             topup.action_topup()
         except UserError as e:
-            topup_packages = request.env['esim.package'].sudo().search([
-                ('package_type', '=', 'TOPUP'),
-                ('is_published', '=', True),
-                ('active', '=', True),
-            ])
-            values = {
-                'profile': profile,
-                'topup_packages': topup_packages,
-                'error_message': str(e),
-                'page_name': 'esim_profile_detail',
-            }
-            return request.render('esim_access.portal_esim_profile_detail', values)
+            return request.render(
+                'esim_access.portal_esim_profile_detail',
+                self._prepare_profile_detail_values(profile, error_message=str(e)),
+            )
 
         return request.redirect(f'/my/esim/profiles/{profile.id}')
 
@@ -5,8 +5,16 @@ import logging
 from odoo import http
 from odoo.http import request
 
+from ..models.esim_webhook_event import NOTIFY_TYPE_SELECTION
+from ..services.webhook_auth import ReplayCache, verify_webhook_request
+
 _logger = logging.getLogger(__name__)
 
+WEBHOOK_NOTIFY_TYPES = dict(NOTIFY_TYPE_SELECTION)
+
+# 进程级重放缓存，所有请求线程共享
+_replay_cache = ReplayCache()
+
 
 class EsimWebhookController(http.Controller):
     """接收 eSIM Access 平台的 Webhook 回调通知"""
@@ -20,108 +28,52 @@ class EsimWebhookController(http.Controller):
         methods=['POST'],
     )
     def handle_webhook(self):
+        body = request.httprequest.get_data()
+        reject_reason = self._verify_request(body)
+        if reject_reason:
+            _logger.warning("eSIM Webhook 拒绝请求 (%s): %s", request.httprequest.remote_addr, reject_reason)
+            return request.make_json_response({'status': 'error', 'message': 'Unauthorized'}, status=401)
+
         try:
-            payload = request.httprequest.get_data(as_text=True) or '{}'
+            payload = body.decode('utf-8') or '{}'
             data = json.loads(payload)
-        except (TypeError, ValueError, json.JSONDecodeError):
+        except (TypeError, ValueError, UnicodeDecodeError):
             _logger.warning("eSIM Webhook: 无法解析请求体")
             return request.make_json_response({'status': 'error', 'message': 'Invalid JSON'}, status=400)
 
         notify_type = data.get('notifyType', '')
-        iccid = data.get('iccid', '')
-        order_no = data.get('orderNo', '')
-        transaction_id = data.get('transactionId', '')
-
         _logger.info(
             "eSIM Webhook 收到通知: type=%s, iccid=%s, orderNo=%s",
-            notify_type, iccid, order_no,
+            notify_type, data.get('iccid', ''), data.get('orderNo', ''),
         )
 
-        handler = {
-            'ORDER_STATUS': self._handle_order_status,
-            'ESIM_STATUS': self._handle_esim_status,
-            'DATA_USAGE': self._handle_data_usage,
-            'VALIDITY_USAGE': self._handle_validity_usage,
-        }.get(notify_type)
-
-        if not handler:
+        if notify_type not in WEBHOOK_NOTIFY_TYPES:
             _logger.warning("eSIM Webhook: 未知通知类型 %s", notify_type)
             return request.make_json_response(
                 {'status': 'error', 'message': f'Unknown notifyType: {notify_type}'},
                 status=400,
             )
 
-        try:
-            handler(data)
-        except Exception as e:
-            _logger.exception("eSIM Webhook 处理异常: %s", e)
-            return request.make_json_response({'status': 'error', 'message': str(e)}, status=500)
-
+        # 只落库原始报文即应答，实际处理由 esim.webhook.event 定时任务批量完成
+        request.env['esim.webhook.event'].sudo()._enqueue(
+            data, payload, request_id=request.httprequest.headers.get('RT-RequestID', ''),
+        )
         return request.make_json_response({'status': 'ok'})
 
-    def _handle_order_status(self, data: dict) -> None:
-        """处理订单状态通知：eSIM 已准备就绪"""
-        order_no = data.get('orderNo', '')
-        transaction_id = data.get('transactionId', '')
-
-        domain = []
-        if order_no:
-            domain = [('api_order_no', '=', order_no)]
-        elif transaction_id:
-            domain = [('transaction_id', '=', transaction_id)]
-        else:
-            return
-
-        order = request.env['esim.order'].sudo().search(domain, limit=1)
-        if not order:
-            _logger.warning("eSIM Webhook ORDER_STATUS: 未找到订单 %s", order_no or transaction_id)
-            return
-
-        # 调用统一查询端点获取 eSIM 列表
-        try:
-            api_client = request.env['esim.package'].sudo()._get_api_client()
-            result = api_client.query_esim(order_no=order.api_order_no)
-            order._process_order_result(result)
-        except Exception as e:
-            _logger.error("eSIM Webhook: 查询订单详情失败: %s", e)
-            order.message_post(body=f"Webhook 通知已收到，但查询订单详情失败: {e}")
-
-    def _handle_esim_status(self, data: dict) -> None:
-        """处理 eSIM 状态通知：eSIM 已被使用"""
-        iccid = data.get('iccid', '')
-        if not iccid:
-            return
-
-        profile = request.env['esim.profile'].sudo().search([('iccid', '=', iccid)], limit=1)
-        if not profile:
-            _logger.warning("eSIM Webhook ESIM_STATUS: 未找到档案 iccid=%s", iccid)
-            return
-
-        profile.write({'state': 'active'})
-        profile.message_post(body="eSIM 已激活使用（Webhook 通知）")
-
-    def _handle_data_usage(self, data: dict) -> None:
-        """处理流量告警通知：剩余流量 ≤ 100MB"""
-        iccid = data.get('iccid', '')
-        if not iccid:
-            return
-
-        profile = request.env['esim.profile'].sudo().search([('iccid', '=', iccid)], limit=1)
-        if not profile:
-            return
-
-        profile.message_post(body="⚠️ eSIM 流量即将耗尽（剩余 ≤ 100MB），请及时充值")
-        # 刷新实际用量数据
-        profile.action_refresh_status()
-
-    def _handle_validity_usage(self, data: dict) -> None:
-        """处理有效期告警通知：有效期仅剩 1 天"""
-        iccid = data.get('iccid', '')
-        if not iccid:
-            return
-
-        profile = request.env['esim.profile'].sudo().search([('iccid', '=', iccid)], limit=1)
-        if not profile:
-            return
-
-        profile.message_post(body="⚠️ eSIM 有效期仅剩 1 天，请及时充值续费")
+    def _verify_request(self, body: bytes) -> str | None:
+        """
+        在解析报文和任何写库操作之前校验签名、时间窗口与重放，返回拒绝原因。
+        未配置密钥时保持兼容、不做校验。
+        """
+        secret = request.env['esim.webhook.event'].sudo()._get_webhook_secret()
+        if not secret:
+            return None
+        headers = request.httprequest.headers
+        return verify_webhook_request(
+            secret,
+            timestamp=headers.get('RT-Timestamp', ''),
+            request_id=headers.get('RT-RequestID', ''),
+            signature=headers.get('RT-Signature', ''),
+            body=body,
+            replay_cache=_replay_cache,
+        )
@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 from . import esim_config
+from . import esim_api_rate_limit
+from . import esim_api_call_log
 from . import esim_balance
+from . import esim_portal_counter
 from . import esim_package
+from . import esim_package_facet
+from . import esim_package_sync_checkpoint
 from . import esim_order
+from . import esim_order_line
 from . import esim_profile
 from . import esim_topup
+from . import esim_usage_snapshot
+from . import esim_webhook_event
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+# 原始调用日志默认保留天数（可在设置中修改），小时汇总保留天数
+DEFAULT_RAW_RETENTION_DAYS = 7
+STAT_RETENTION_DAYS = 400
+
+
+class EsimApiCallLog(models.Model):
+    """
+    供应商 API 调用日志（原始记录）：由 API 客户端在内存中缓冲后批量写入，
+    每次逻辑调用一条（重试计入 attempts），定期汇总为小时统计并清理。
+    """
+
+    _name = 'esim.api.call.log'
+    _description = 'eSIM API 调用日志'
+    _order = 'call_date desc, id desc'
+    _log_access = False
+
+    call_date = fields.Datetime(string="调用时间", required=True, readonly=True)
+    endpoint = fields.Char(string="端点", required=True, readonly=True)
+    duration_ms = fields.Integer(string="耗时 (ms)", aggregator='avg', readonly=True)
+    http_status = fields.Integer(string="HTTP 状态", aggregator=False, readonly=True)
+    success = fields.Boolean(string="成功", readonly=True)
+    error_code = fields.Char(string="错误码", readonly=True)
+    attempts = fields.Integer(string="尝试次数", readonly=True)
+    request_bytes = fields.Integer(string="请求大小 (B)", readonly=True)
+    response_bytes = fields.Integer(string="响应大小 (B)", readonly=True)
+
+    def init(self):
+        # 汇总与清理均按时间范围扫描；按端点查看最近调用
+        create_index(self.env.cr, 'esim_api_call_log_call_date_index', self._table, ['call_date'])
+        create_index(
+            self.env.cr, 'esim_api_call_log_endpoint_call_date_index', self._table, ['endpoint', 'call_date'],
+        )
+
+    @api.model
+    def _cron_rollup_and_prune(self) -> None:
+        """定时任务：汇总已结束的小时并清理过期的原始日志与汇总"""
+        self.env['esim.api.call.stat']._rollup()
+        self._prune()
+
+    @api.model
+    def _prune(self) -> int:
+        """删除超过保留期的原始日志，返回删除条数"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        retention_days = max(
+            int(ICP.get_param('esim_access.api_journal_retention_days', DEFAULT_RAW_RETENTION_DAYS) or 1), 1,
+        )
+        cutoff = fields.Datetime.now() - timedelta(days=retention_days)
+        self.env.cr.execute("DELETE FROM esim_api_call_log WHERE call_date < %s", (cutoff,))
+        count = self.env.cr.rowcount
+        self.env.cr.execute(
+            "DELETE FROM esim_api_call_stat WHERE hour < %s",
+            (fields.Datetime.now() - timedelta(days=STAT_RETENTION_DAYS),),
+        )
+        self.invalidate_model()
+        if count:
+            _logger.info("清理 %d 条 %d 天前的 API 调用日志", count, retention_days)
+        return count
+
+
+class EsimApiCallStat(models.Model):
+    """API 调用小时汇总：按端点统计调用量、错误数、耗时分位数与报文大小，保留时间远长于原始日志"""
+
+    _name = 'esim.api.call.stat'
+    _description = 'eSIM API 调用统计'
+    _order = 'hour desc, endpoint'
+    _log_access = False
+
+    hour = fields.Datetime(string="小时", required=True, readonly=True)
+    endpoint = fields.Char(string="端点", required=True, readonly=True)
+    call_count = fields.Integer(string="调用次数", readonly=True)
+    error_count = fields.Integer(string="失败次数", readonly=True)
+    retry_count = fields.Integer(string="重试次数", readonly=True)
+    avg_ms = fields.Float(string="平均耗时 (ms)", digits=(12, 1), aggregator='avg', readonly=True)
+    p50_ms = fields.Float(string="P50 (ms)", digits=(12, 1), aggregator='avg', readonly=True)
+    p95_ms = fields.Float(string="P95 (ms)", digits=(12, 1), aggregator='max', readonly=True)
+    max_ms = fields.Integer(string="最大耗时 (ms)", aggregator='max', readonly=True)
+    request_bytes = fields.Integer(string="请求流量 (B)", readonly=True)
+    response_bytes = fields.Integer(string="响应流量 (B)", readonly=True)
+    error_rate = fields.Float(
+        string="失败率 (%)", digits=(5, 2), compute='_compute_error_rate',
+    )
+
+    _sql_constraints = [
+        ('hour_endpoint_uniq', 'UNIQUE(hour, endpoint)', '同一小时同一端点只能有一条汇总'),
+    ]
+
+    @api.depends('call_count', 'error_count')
+    def _compute_error_rate(self):
+        for rec in self:
+            rec.error_rate = rec.error_count * 100.0 / rec.call_count if rec.call_count else 0.0
+
+    @api.model
+    def _rollup(self) -> int:
+        """
+        汇总已结束的小时（从最近一条汇总所在小时起重算，覆盖迟到写入的日志），返回写入的汇总条数。
+        同一 (小时, 端点) 重复汇总时覆盖旧值，任务可安全重跑。
+        """
+        self.env.cr.execute("SELECT MAX(hour) FROM esim_api_call_stat")
+        since = self.env.cr.fetchone()[0]
+        if since is None:
+            self.env.cr.execute("SELECT MIN(call_date) FROM esim_api_call_log")
+            since = self.env.cr.fetchone()[0]
+            if since is None:
+                return 0
+
+        self.env.cr.execute("""
+            INSERT INTO esim_api_call_stat (
+                hour, endpoint, call_count, error_count, retry_count,
+                avg_ms, p50_ms, p95_ms, max_ms, request_bytes, response_bytes
+            )
+            SELECT date_trunc('hour', call_date),
+                   endpoint,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE NOT success),
+                   COALESCE(SUM(GREATEST(attempts - 1, 0)), 0),
+                   AVG(duration_ms),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY duration_ms),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms),
+                   MAX(duration_ms),
+                   COALESCE(SUM(request_bytes), 0),
+                   COALESCE(SUM(response_bytes), 0)
+              FROM esim_api_call_log
+             WHERE call_date >= date_trunc('hour', %(since)s::timestamp)
+               AND call_date < date_trunc('hour', %(now)s::timestamp)
+          GROUP BY 1, 2
+            ON CONFLICT (hour, endpoint) DO UPDATE
+               SET call_count = EXCLUDED.call_count,
+                   error_count = EXCLUDED.error_count,
+                   retry_count = EXCLUDED.retry_count,
+                   avg_ms = EXCLUDED.avg_ms,
+                   p50_ms = EXCLUDED.p50_ms,
+                   p95_ms = EXCLUDED.p95_ms,
+                   max_ms = EXCLUDED.max_ms,
+                   request_bytes = EXCLUDED.request_bytes,
+                   response_bytes = EXCLUDED.response_bytes
+        """, {'since': since, 'now': fields.Datetime.now()})
+        count = self.env.cr.rowcount
+        self.invalidate_model()
+        _logger.info("API 调用统计汇总 %d 条（自 %s 起）", count, since)
+        return count
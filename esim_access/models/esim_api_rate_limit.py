@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class EsimApiRateLimit(models.Model):
+    """
+    eSIM Access API 按端点的令牌桶预算。
+    tokens / last_refill 仅由 PgTokenBucketLimiter 通过 SQL 原子维护，跨 worker 共享。
+    """
+
+    _name = 'esim.api.rate.limit'
+    _description = 'eSIM API 限流预算'
+    _order = 'endpoint'
+    _rec_name = 'endpoint'
+
+    endpoint = fields.Char(string="API 端点", required=True, help="如 open/esim/query")
+    capacity = fields.Integer(string="突发容量", required=True, default=10, help="桶内最多可累积的令牌数")
+    refill_rate = fields.Float(string="每秒令牌数", required=True, default=5, help="令牌补充速率（次/秒）")
+    tokens = fields.Float(string="当前令牌", readonly=True, default=0)
+    last_refill = fields.Datetime(string="最后补充时间", readonly=True)
+    active = fields.Boolean(string="启用", default=True)
+
+    _sql_constraints = [
+        ('endpoint_uniq', 'UNIQUE(endpoint)', '同一端点只能配置一个限流预算'),
+        ('capacity_positive', 'CHECK(capacity > 0)', '突发容量必须大于 0'),
+        ('refill_rate_positive', 'CHECK(refill_rate > 0)', '每秒令牌数必须大于 0'),
+    ]
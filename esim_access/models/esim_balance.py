@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 import logging
+from datetime import timedelta
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools.sql import create_index
 
 _logger = logging.getLogger(__name__)
 
@@ -12,13 +14,22 @@ BALANCE_LOG_TYPE_SELECTION = [
     ('refund', '退款'),
 ]
 
+# 账务字段：余额变动记录创建后不可修改
+LEDGER_FIELDS = frozenset({
+    'partner_id', 'type', 'amount', 'signed_amount', 'balance_before', 'balance_after',
+})
+
+# 余额快照只汇总早于此时长的变动：log.id 按插入顺序分配、提交顺序却不定，
+# 以 create_date（事务开始时间）为水位并滞后于进行中的事务，晚提交的小 ID 记录不会被跳过
+BALANCE_ROLLUP_LAG_MINUTES = 15
+
 
 class ResPartner(models.Model):
     _inherit = 'res.partner'
 
     esim_balance = fields.Float(
-        string="eSIM 余额", digits=(12, 2), default=0,
-        help="客户用于购买 eSIM 套餐的账户余额",
+        string="eSIM 余额", digits=(12, 2), default=0, readonly=True,
+        help="客户用于购买 eSIM 套餐的账户余额，只能通过余额变动记录增减",
     )
     esim_balance_log_ids = fields.One2many(
         'esim.balance.log', 'partner_id', string="余额变动记录",
@@ -36,6 +47,18 @@ class ResPartner(models.Model):
             'context': {'default_partner_id': self.id},
         }
 
+    def action_view_esim_usage(self):
+        """查看客户全部 eSIM 的用量趋势"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('用量趋势'),
+            'res_model': 'esim.usage.snapshot',
+            'view_mode': 'graph,list',
+            'domain': [('partner_id', '=', self.id)],
+            'context': {'graph_groupbys': ['snapshot_date:day']},
+        }
+
     def _esim_change_balance(
         self,
         log_type: str,
@@ -55,19 +78,31 @@ class ResPartner(models.Model):
         if amount <= 0:
             raise UserError(_("变动金额必须大于 0"))
 
-        balance_before = self.esim_balance
         if log_type == 'consume':
-            if balance_before < amount:
-                raise UserError(
-                    _("余额不足：当前余额 $%.2f，需要 $%.2f") % (balance_before, amount)
-                )
-            balance_after = balance_before - amount
+            delta = -amount
         elif log_type in ('topup', 'refund'):
-            balance_after = balance_before + amount
+            delta = amount
         else:
             raise UserError(_("未知的余额变动类型: %s") % log_type)
 
-        self.esim_balance = balance_after
+        # 单条语句原子加减并校验非负，不做读-改-写：并发购买 / 充值不会丢失更新，
+        # 行锁只持有到当前事务提交（下单已异步化，事务很短）
+        self.flush_recordset(['esim_balance'])
+        self.env.cr.execute("""
+            UPDATE res_partner
+               SET esim_balance = COALESCE(esim_balance, 0) + %(delta)s
+             WHERE id = %(partner_id)s
+               AND COALESCE(esim_balance, 0) + %(delta)s >= 0
+         RETURNING esim_balance
+        """, {'delta': round(delta, 2), 'partner_id': self.id})
+        row = self.env.cr.fetchone()
+        self.invalidate_recordset(['esim_balance'])
+        if not row:
+            raise UserError(
+                _("余额不足：当前余额 $%.2f，需要 $%.2f") % (self.esim_balance, amount)
+            )
+        balance_after = float(row[0])
+        balance_before = balance_after - delta
 
         log = self.env['esim.balance.log'].create({
             'partner_id': self.id,
@@ -117,6 +152,25 @@ class EsimBalanceLog(models.Model):
         'res.users', string="操作人",
         default=lambda self: self.env.uid, readonly=True,
     )
+    signed_amount = fields.Float(
+        string="余额增减", digits=(12, 2), compute='_compute_signed_amount', store=True,
+        help="充值 / 退款为正、消费为负，用于余额快照汇总",
+    )
+
+    def init(self):
+        # 按订单 + 类型查找扣款 / 退款记录（订单余额汇总、取消退款判断）
+        create_index(
+            self.env.cr, 'esim_balance_log_order_id_type_index', self._table, ['order_id', 'type'],
+        )
+        # 余额快照按 create_date 水位区间汇总
+        create_index(
+            self.env.cr, 'esim_balance_log_create_date_index', self._table, ['create_date'],
+        )
+
+    @api.depends('type', 'amount')
+    def _compute_signed_amount(self):
+        for rec in self:
+            rec.signed_amount = -rec.amount if rec.type == 'consume' else rec.amount
 
     @api.model_create_multi
     def create(self, vals_list: list[dict]) -> 'EsimBalanceLog':
@@ -125,8 +179,102 @@ class EsimBalanceLog(models.Model):
                 vals['name'] = self.env['ir.sequence'].next_by_code('esim.balance.log') or _('New')
         return super().create(vals_list)
 
+    def write(self, vals: dict) -> bool:
+        """余额变动记录只追加不修改，账务字段一经写入不可更改"""
+        if LEDGER_FIELDS.intersection(vals):
+            raise UserError(_("余额变动记录不可修改，如需调整请新增一笔充值或退款"))
+        return super().write(vals)
+
+    @api.ondelete(at_uninstall=False)
+    def _unlink_except_ledger(self):
+        raise UserError(_("余额变动记录不可删除"))
+
     @api.depends('name', 'type', 'amount')
     def _compute_display_name(self):
         type_map = dict(BALANCE_LOG_TYPE_SELECTION)
         for rec in self:
             rec.display_name = f"{rec.name} - {type_map.get(rec.type, '')} ${rec.amount:.2f}"
+
+
+class EsimBalanceSnapshot(models.Model):
+    """
+    余额快照：定期按客户汇总上次快照之后新增的余额变动记录，
+    快照余额 = 上次快照余额 + 新增变动之和，并与客户当前余额对账。
+    """
+
+    _name = 'esim.balance.snapshot'
+    _description = 'eSIM 余额快照'
+    _order = 'id desc'
+
+    partner_id = fields.Many2one(
+        'res.partner', string="客户", required=True,
+        ondelete='cascade', index=True, readonly=True,
+    )
+    snapshot_date = fields.Datetime(string="快照时间", required=True, readonly=True, default=fields.Datetime.now)
+    balance = fields.Float(string="账本余额", digits=(12, 2), readonly=True)
+    last_log_id = fields.Integer(string="截至变动记录 ID", readonly=True, index=True)
+    log_date_to = fields.Datetime(
+        string="截至变动时间", readonly=True,
+        help="本快照汇总了创建时间早于该时间的全部变动，下次快照从该时间继续汇总",
+    )
+    log_count = fields.Integer(string="本期变动笔数", readonly=True)
+    drift = fields.Float(
+        string="差异", digits=(12, 2), readonly=True,
+        help="客户截至变动时间的余额 − 账本余额，正常应为 0",
+    )
+
+    @api.model
+    def _cron_rollup_balances(self) -> int:
+        """
+        按客户汇总上次快照后的新增变动并生成快照，返回生成的快照数。
+        只汇总截至水位（当前时间减 BALANCE_ROLLUP_LAG_MINUTES）的变动，届时相关事务均已提交；
+        对账时从客户当前余额中扣除水位之后已可见的变动，得到水位时刻的余额。
+        """
+        self.env['esim.balance.log'].flush_model()
+        self.flush_model()
+        cutoff = fields.Datetime.now() - timedelta(minutes=BALANCE_ROLLUP_LAG_MINUTES)
+        self.env.cr.execute("""
+            WITH last_snapshot AS (
+                SELECT DISTINCT ON (partner_id) partner_id, balance, last_log_id, log_date_to
+                  FROM esim_balance_snapshot
+              ORDER BY partner_id, id DESC
+            ),
+            pending AS (
+                SELECT partner_id, SUM(signed_amount) AS amount
+                  FROM esim_balance_log
+                 WHERE create_date >= %(cutoff)s
+              GROUP BY partner_id
+            )
+            SELECT log.partner_id,
+                   COALESCE(MAX(snap.balance), 0) + SUM(log.signed_amount),
+                   MAX(log.id),
+                   COUNT(*),
+                   MAX(COALESCE(partner.esim_balance, 0) - COALESCE(pending.amount, 0))
+              FROM esim_balance_log log
+              JOIN res_partner partner ON partner.id = log.partner_id
+         LEFT JOIN last_snapshot snap ON snap.partner_id = log.partner_id
+         LEFT JOIN pending ON pending.partner_id = log.partner_id
+             WHERE log.create_date < %(cutoff)s
+               AND (log.create_date >= snap.log_date_to
+                    OR (snap.log_date_to IS NULL AND log.id > COALESCE(snap.last_log_id, 0)))
+          GROUP BY log.partner_id
+        """, {'cutoff': cutoff})
+        vals_list = []
+        for partner_id, balance, last_log_id, log_count, current_balance in self.env.cr.fetchall():
+            balance = float(balance)
+            drift = round(float(current_balance) - balance, 2)
+            if drift:
+                _logger.warning(
+                    "eSIM 余额对账差异：partner %s 截至 %s 余额 %.2f，账本余额 %.2f",
+                    partner_id, cutoff, current_balance, balance,
+                )
+            vals_list.append({
+                'partner_id': partner_id,
+                'balance': balance,
+                'last_log_id': last_log_id,
+                'log_date_to': cutoff,
+                'log_count': log_count,
+                'drift': drift,
+            })
+        self.create(vals_list)
+        return len(vals_list)
@@ -18,9 +18,76 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='esim_access.api_base_url',
         default='https://api.esimaccess.com/api/v1',
     )
+    esim_api_timeout = fields.Integer(
+        string="API 超时 (秒)",
+        config_parameter='esim_access.api_timeout',
+        default=30,
+    )
+    esim_api_max_retries = fields.Integer(
+        string="查询重试次数",
+        config_parameter='esim_access.api_max_retries',
+        default=3,
+        help="套餐列表、eSIM 查询等只读接口在网络错误或限流时的最大重试次数",
+    )
+    esim_api_retry_backoff = fields.Float(
+        string="重试退避基数 (秒)",
+        config_parameter='esim_access.api_retry_backoff',
+        default=0.5,
+        help="第 n 次重试前等待 基数 × 2^(n-1) 秒",
+    )
+    esim_api_rate_limit_max_wait = fields.Float(
+        string="限流最长等待 (秒)",
+        config_parameter='esim_access.api_rate_limit_max_wait',
+        default=30,
+        help="端点令牌耗尽时请求排队等待的最长时间，超时后放弃本次调用",
+    )
+    esim_api_journal_retention_days = fields.Integer(
+        string="调用日志保留天数",
+        config_parameter='esim_access.api_journal_retention_days',
+        default=7,
+        help="原始 API 调用日志的保留天数，小时汇总统计不受影响",
+    )
+    esim_package_sync_interval_hours = fields.Integer(
+        string="地区同步间隔 (小时)",
+        config_parameter='esim_access.package_sync_interval_hours',
+        default=24,
+        help="增量同步时，超过该间隔未成功同步的地区会被重新拉取",
+    )
+    esim_package_full_sync_interval_hours = fields.Integer(
+        string="全量同步间隔 (小时)",
+        config_parameter='esim_access.package_full_sync_interval_hours',
+        default=168,
+        help="增量同步之间定期执行一次全量同步，用于停用供应商已下架的套餐",
+    )
+    esim_package_sync_workers = fields.Integer(
+        string="并发拉取数",
+        config_parameter='esim_access.package_sync_workers',
+        default=4,
+        help="增量同步时同时请求的地区数量上限",
+    )
+    esim_profile_refresh_workers = fields.Integer(
+        string="状态刷新并发页数",
+        config_parameter='esim_access.profile_refresh_workers',
+        default=4,
+        help="批量刷新 eSIM 状态时同时请求的分页数量上限",
+    )
+    esim_profile_action_workers = fields.Integer(
+        string="批量操作并发数",
+        config_parameter='esim_access.profile_action_workers',
+        default=4,
+        help="批量取消 / 挂起 / 吊销 eSIM 时同时发出的 API 请求数上限",
+    )
+    esim_profile_refresh_budget = fields.Integer(
+        string="单次刷新上限",
+        config_parameter='esim_access.profile_refresh_budget',
+        default=500,
+        help="每次定时任务最多发出的 eSIM 查询请求数：逐个刷新时每个 eSIM 一次，批量刷新时每页一次（按优先级选取）",
+    )
     esim_webhook_secret = fields.Char(
         string="Webhook 验证密钥",
         config_parameter='esim_access.webhook_secret',
+        help="配置后回调请求须携带 RT-Timestamp / RT-RequestID / RT-Signature 请求头，"
+             "签名为 HMAC-SHA256(密钥, 时间戳 + 请求 ID + 请求体)，5 分钟外或重复的请求将被拒绝",
     )
     esim_default_markup = fields.Float(
         string="默认加价比例",
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 import logging
 import uuid
+from datetime import timedelta
+
+from psycopg2.errors import LockNotAvailable
 
 from odoo import models, fields, api, _
-from odoo.exceptions import UserError
+from odoo.exceptions import UserError, ValidationError
 
 from ..services.esim_api import EsimAccessAPIError
 
@@ -18,11 +21,24 @@ ORDER_STATE_SELECTION = [
     ('failed', '失败'),
 ]
 
+# 履约队列：每批处理订单数、下单最大尝试次数与重试退避基数（秒）
+FULFIL_BATCH_SIZE = 20
+FULFIL_MAX_ATTEMPTS = 5
+FULFIL_RETRY_BACKOFF_SECONDS = 30
+# 仅网络 / 限流类错误重试；业务错误（余额不足、套餐下架等）直接失败退款
+TRANSIENT_FULFIL_ERROR_CODES = {'HTTP_ERROR', 'RATE_LIMITED'}
+# ORDER_STATUS Webhook 迟到时的轮询兜底：首次延迟与最大轮询次数
+ORDER_POLL_DELAY_SECONDS = 120
+ORDER_POLL_MAX_ATTEMPTS = 6
+# 按订单号查询 eSIM 时的分页大小（接口上限 500），批量订单需翻页取全
+ORDER_QUERY_PAGE_SIZE = 500
+
 
 class EsimOrder(models.Model):
     _name = 'esim.order'
     _description = 'eSIM 订单'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'esim.portal.counter.mixin']
+    _portal_counter_field = 'esim_order_count_cached'
     _order = 'create_date desc'
 
     name = fields.Char(
@@ -34,11 +50,17 @@ class EsimOrder(models.Model):
         tracking=True, index=True,
     )
     package_id = fields.Many2one(
-        'esim.package', string="套餐", required=True,
+        'esim.package', string="套餐",
         domain=[('package_type', '=', 'BASE')],
+        help="单套餐订单使用；多套餐订单请填写订单明细",
     )
     quantity = fields.Integer(string="数量", default=1, required=True)
-    unit_price = fields.Float(string="单价", digits=(12, 2), related='package_id.sale_price', store=True)
+    unit_price = fields.Float(
+        string="单价", digits=(12, 2),
+        help="创建订单时按套餐售价固定，之后调整套餐售价不影响已有订单",
+    )
+    line_ids = fields.One2many('esim.order.line', 'order_id', string="订单明细", copy=True)
+    package_summary = fields.Char(string="套餐摘要", compute='_compute_package_summary')
     total_amount = fields.Float(string="总金额", digits=(12, 2), compute='_compute_total_amount', store=True)
     transaction_id = fields.Char(string="交易 ID", readonly=True, copy=False, index=True)
     api_order_no = fields.Char(string="API 订单号", readonly=True, copy=False, index=True)
@@ -48,21 +70,68 @@ class EsimOrder(models.Model):
     )
     can_cancel = fields.Boolean(
         string="可取消",
-        compute='_compute_can_cancel',
+        compute='_compute_can_cancel', store=True, index=True,
     )
     profile_ids = fields.One2many('esim.profile', 'order_id', string="eSIM 档案")
     profile_count = fields.Integer(string="eSIM 数量", compute='_compute_profile_count')
+    balance_log_ids = fields.One2many('esim.balance.log', 'order_id', string="余额变动记录")
+    balance_consumed_amount = fields.Float(
+        string="已扣余额", digits=(12, 2), compute='_compute_balance_amounts', store=True,
+    )
+    balance_refunded_amount = fields.Float(
+        string="已退余额", digits=(12, 2), compute='_compute_balance_amounts', store=True,
+    )
     order_date = fields.Datetime(string="下单时间", readonly=True)
     period_num = fields.Integer(
         string="使用天数",
         help="每日套餐的天数（1-365），仅适用于按日计费的套餐",
     )
     note = fields.Text(string="备注")
+    fulfil_attempts = fields.Integer(string="履约尝试次数", readonly=True, copy=False)
+    next_fulfil_date = fields.Datetime(
+        string="下次履约时间", readonly=True, copy=False, index=True,
+        help="已确认订单的下次下单时间，或处理中订单的下次轮询时间；为空表示不在队列中",
+    )
+    fulfil_error = fields.Char(string="最近履约错误", readonly=True, copy=False)
 
-    @api.depends('unit_price', 'quantity')
+    @api.depends('unit_price', 'quantity', 'line_ids.subtotal')
     def _compute_total_amount(self):
         for order in self:
-            order.total_amount = order.unit_price * order.quantity
+            if order.line_ids:
+                order.total_amount = sum(order.line_ids.mapped('subtotal'))
+            else:
+                order.total_amount = order.unit_price * order.quantity
+
+    @api.depends('package_id.name', 'quantity', 'line_ids.package_id.name', 'line_ids.quantity')
+    def _compute_package_summary(self):
+        for order in self:
+            if order.line_ids:
+                order.package_summary = ', '.join(
+                    f"{line.package_id.name} × {line.quantity}" for line in order.line_ids
+                )
+            else:
+                order.package_summary = (
+                    f"{order.package_id.name} × {order.quantity}" if order.package_id else ''
+                )
+
+    @api.constrains('package_id', 'line_ids')
+    def _check_package_or_lines(self):
+        for order in self:
+            if not order.package_id and not order.line_ids:
+                raise ValidationError(_("订单 %s 必须选择套餐或填写订单明细") % order.name)
+
+    @api.depends('balance_log_ids.type', 'balance_log_ids.amount')
+    def _compute_balance_amounts(self):
+        """余额变动记录只追加不修改，每次 _esim_change_balance 记账后随之更新"""
+        for order in self:
+            consumed = refunded = 0.0
+            for log in order.balance_log_ids:
+                if log.type == 'consume':
+                    consumed += log.amount
+                elif log.type == 'refund':
+                    refunded += log.amount
+            order.balance_consumed_amount = consumed
+            order.balance_refunded_amount = refunded
 
     def _compute_profile_count(self):
         for order in self:
@@ -72,12 +141,13 @@ class EsimOrder(models.Model):
         'state',
         'api_order_no',
         'profile_ids.state',
-        'profile_ids.esim_status',
-        'profile_ids.smdp_status',
+        'profile_ids.can_cancel',
     )
     def _compute_can_cancel(self):
+        # 依赖档案上已存储的可取消标记，档案供应商状态变化时只重算其所属订单
         for order in self:
-            if order.state == 'draft':
+            if order.state == 'draft' or (order.state == 'confirmed' and not order.api_order_no):
+                # 草稿或仍在履约队列中、尚未提交供应商的订单可直接取消
                 order.can_cancel = True
                 continue
 
@@ -94,13 +164,24 @@ class EsimOrder(models.Model):
                 profile.can_cancel for profile in pending_profiles
             )
 
+    @api.onchange('package_id')
+    def _onchange_package_id(self):
+        self.unit_price = self.package_id.sale_price
+
     @api.model_create_multi
     def create(self, vals_list: list[dict]) -> 'EsimOrder':
         for vals in vals_list:
             if vals.get('name', _('New')) == _('New'):
                 vals['name'] = self.env['ir.sequence'].next_by_code('esim.order') or _('New')
+            if vals.get('package_id') and 'unit_price' not in vals:
+                vals['unit_price'] = self.env['esim.package'].browse(vals['package_id']).sale_price
         return super().create(vals_list)
 
+    def write(self, vals: dict) -> bool:
+        if vals.get('package_id') and 'unit_price' not in vals:
+            vals = dict(vals, unit_price=self.env['esim.package'].browse(vals['package_id']).sale_price)
+        return super().write(vals)
+
     def _build_package_info(self) -> dict:
         """构建单条 packageInfoList 元素"""
         self.ensure_one()
@@ -113,18 +194,41 @@ class EsimOrder(models.Model):
             info['periodNum'] = self.period_num
         return info
 
+    def _build_package_info_list(self) -> list[dict]:
+        """构建整单的 packageInfoList：多套餐订单按明细逐行，单套餐订单为一项"""
+        self.ensure_one()
+        if self.line_ids:
+            return [line._build_package_info() for line in self.line_ids]
+        return [self._build_package_info()]
+
     def action_confirm(self) -> None:
-        """确认订单：扣款 → 调用 API 下单。子模块可覆盖钩子方法以改变扣款行为。"""
+        """
+        确认订单：扣款（预留余额）后加入履约队列，由定时任务异步调用 API 下单。
+        子模块可覆盖钩子方法以改变扣款行为。
+        """
+        now = fields.Datetime.now()
         for order in self:
             if order.state != 'draft':
                 raise UserError(_("只能确认草稿状态的订单"))
 
             order._confirm_deduct_balance()
-            try:
-                order._confirm_place_order()
-            except UserError:
-                order._confirm_refund_on_failure()
-                raise
+            order.write({
+                'state': 'confirmed',
+                # 交易 ID 入队时即固定，重试下单沿用同一 ID，由供应商去重
+                'transaction_id': order.transaction_id or uuid.uuid4().hex,
+                'fulfil_attempts': 0,
+                'next_fulfil_date': now,
+                'fulfil_error': False,
+            })
+            order.message_post(body=_("订单已确认，等待提交至 eSIM Access"))
+        self._trigger_fulfilment()
+
+    @api.model
+    def _trigger_fulfilment(self) -> None:
+        """事务提交后立即唤醒履约定时任务，无需等待下一个周期"""
+        cron = self.env.ref('esim_access.cron_fulfil_esim_orders', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
 
     def _confirm_deduct_balance(self) -> None:
         """确认订单时从客户余额扣款。桥接模块可覆盖此方法跳过余额扣款。"""
@@ -132,63 +236,166 @@ class EsimOrder(models.Model):
         self.partner_id._esim_change_balance(
             log_type='consume',
             amount=self.total_amount,
-            description=_("购买套餐: %s × %d") % (self.package_id.name, self.quantity),
+            description=_("购买套餐: %s") % self.package_summary,
             order_id=self.id,
         )
 
     def _confirm_place_order(self) -> None:
-        """调用 eSIM Access API 下单并更新订单状态。"""
+        """调用 eSIM Access API 下单并更新订单状态，API 错误原样抛出由履约队列判断是否重试。"""
         self.ensure_one()
         api_client = self.env['esim.package']._get_api_client()
-        transaction_id = uuid.uuid4().hex
-        package_info = self._build_package_info()
-        total_amount = package_info['price'] * package_info['count']
+        package_info_list = self._build_package_info_list()
+        total_amount = sum(info['price'] * info['count'] for info in package_info_list)
 
-        try:
-            result = api_client.place_order(
-                transaction_id=transaction_id,
-                package_info_list=[package_info],
-                amount=total_amount,
-            )
-        except EsimAccessAPIError as e:
-            self.write({'state': 'failed'})
-            self.message_post(body=_("下单失败: [%s] %s") % (e.error_code, e.error_msg))
-            raise UserError(_("下单失败: %s") % e.error_msg) from e
+        result = api_client.place_order(
+            transaction_id=self.transaction_id,
+            package_info_list=package_info_list,
+            amount=total_amount,
+        )
 
+        now = fields.Datetime.now()
         self.write({
             'state': 'processing',
-            'transaction_id': transaction_id,
             'api_order_no': result.get('orderNo', ''),
-            'order_date': fields.Datetime.now(),
+            'order_date': now,
+            # 等待 ORDER_STATUS Webhook，超时未到则轮询兜底
+            'fulfil_attempts': 0,
+            'next_fulfil_date': now + timedelta(seconds=ORDER_POLL_DELAY_SECONDS),
+            'fulfil_error': False,
         })
         self.message_post(body=_("订单已提交至 eSIM Access"))
 
+    def _lock_for_update(self, skip_locked: bool = False) -> 'EsimOrder':
+        """
+        锁定订单行，串行化履约队列与取消操作，返回已锁定的订单。
+        默认 NOWAIT，行已被锁时抛出 LockNotAvailable；
+        skip_locked 时跳过已被锁定的订单。加锁后重新读取订单字段。
+        """
+        if not self:
+            return self
+        self.flush_recordset()
+        self.env.cr.execute(
+            f"SELECT id FROM esim_order WHERE id IN %s FOR UPDATE {'SKIP LOCKED' if skip_locked else 'NOWAIT'}",
+            [tuple(self.ids)],
+        )
+        locked = self.browse(row[0] for row in self.env.cr.fetchall())
+        locked.invalidate_recordset()
+        return locked
+
+    def _fulfil_place_order(self) -> None:
+        """履约队列：下单，临时错误按指数退避重试，业务错误或重试耗尽则失败并退款"""
+        self.ensure_one()
+        # 调用方已锁定订单行；加锁前订单可能已被取消
+        if self.state != 'confirmed':
+            return
+        if not self.transaction_id:
+            self.transaction_id = uuid.uuid4().hex
+        try:
+            self._confirm_place_order()
+        except (EsimAccessAPIError, UserError) as e:
+            error_code = getattr(e, 'error_code', 'CONFIG_ERROR')
+            error_msg = getattr(e, 'error_msg', str(e))
+            attempts = self.fulfil_attempts + 1
+            vals = {'fulfil_attempts': attempts, 'fulfil_error': f"[{error_code}] {error_msg}"}
+            if error_code in TRANSIENT_FULFIL_ERROR_CODES and attempts < FULFIL_MAX_ATTEMPTS:
+                delay = FULFIL_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+                vals['next_fulfil_date'] = fields.Datetime.now() + timedelta(seconds=delay)
+                self.write(vals)
+                _logger.warning(
+                    "eSIM 订单 %s 第 %d 次下单失败，%d 秒后重试: [%s] %s",
+                    self.name, attempts, delay, error_code, error_msg,
+                )
+                return
+
+            vals.update({'state': 'failed', 'next_fulfil_date': False})
+            self.write(vals)
+            self.message_post(body=_("下单失败: [%s] %s") % (error_code, error_msg))
+            self._confirm_refund_on_failure()
+
+    def _fulfil_poll_status(self) -> None:
+        """ORDER_STATUS Webhook 迟到时轮询 query_esim，取到 eSIM 即完成订单"""
+        self.ensure_one()
+        if self.state != 'processing':
+            return
+        attempts = self.fulfil_attempts + 1
+        try:
+            api_client = self.env['esim.package']._get_api_client()
+            result = self._query_order_esims(api_client)
+        except (EsimAccessAPIError, UserError) as e:
+            # 供应商分配 eSIM 期间查询也会返回错误，视为尚未就绪
+            result = {}
+            self.fulfil_error = getattr(e, 'error_msg', str(e))
+
+        if result.get('esimList'):
+            self._process_order_result(result)
+            return
+
+        if attempts >= ORDER_POLL_MAX_ATTEMPTS:
+            self.write({'fulfil_attempts': attempts, 'next_fulfil_date': False})
+            self.message_post(body=_("多次查询仍未获取到 eSIM，已停止自动轮询，请稍后手动查询状态"))
+            return
+
+        delay = ORDER_POLL_DELAY_SECONDS * (2 ** (attempts - 1))
+        self.write({
+            'fulfil_attempts': attempts,
+            'next_fulfil_date': fields.Datetime.now() + timedelta(seconds=delay),
+        })
+
+    @api.model
+    def _cron_fulfil_orders(self) -> None:
+        """
+        履约队列定时任务：已确认订单下单，处理中订单轮询兜底。
+        每单独立提交，单个订单异常不影响其余订单；一批处理满时重新唤醒自身。
+        处理前锁定订单行，正在被取消的订单跳过，下一批再处理。
+        """
+        orders = self.search([
+            ('state', 'in', ('confirmed', 'processing')),
+            ('next_fulfil_date', '!=', False),
+            ('next_fulfil_date', '<=', fields.Datetime.now()),
+        ], order='next_fulfil_date asc', limit=FULFIL_BATCH_SIZE)
+
+        for order in orders:
+            try:
+                with self.env.cr.savepoint():
+                    if not order._lock_for_update(skip_locked=True):
+                        continue
+                    if order.state == 'confirmed':
+                        order._fulfil_place_order()
+                    else:
+                        order._fulfil_poll_status()
+            except Exception:
+                _logger.exception("eSIM 订单 %s 履约处理异常", order.name)
+            self.env.cr.commit()
+
+        if len(orders) == FULFIL_BATCH_SIZE:
+            self._trigger_fulfilment()
+
     def _confirm_refund_on_failure(self) -> None:
         """API 下单失败时退还已扣余额。桥接模块可覆盖此方法改变退款行为。"""
         self.ensure_one()
-        if self._has_balance_consumed() and not self._has_balance_refunded():
+        refundable = self._get_refundable_balance()
+        if refundable > 0:
             self.partner_id._esim_change_balance(
                 log_type='refund',
-                amount=self.total_amount,
+                amount=refundable,
                 description=_("下单失败自动退款: %s") % self.name,
                 order_id=self.id,
             )
 
     def _has_balance_consumed(self) -> bool:
-        """检查该订单是否已扣过余额"""
+        """检查该订单是否已扣过余额（读取存储汇总，批量取消时随订单一并预取）"""
         self.ensure_one()
-        return bool(self.env['esim.balance.log'].search_count([
-            ('order_id', '=', self.id),
-            ('type', '=', 'consume'),
-        ]))
+        return bool(self.balance_consumed_amount)
 
     def _has_balance_refunded(self) -> bool:
         """检查该订单是否已退过款"""
         self.ensure_one()
-        return bool(self.env['esim.balance.log'].search_count([
-            ('order_id', '=', self.id),
-            ('type', '=', 'refund'),
-        ]))
+        return bool(self.balance_refunded_amount)
+
+    def _get_refundable_balance(self) -> float:
+        """已扣且尚未退还的余额：按实际扣款记账退款，不受订单金额事后变化影响"""
+        self.ensure_one()
+        return round(self.balance_consumed_amount - self.balance_refunded_amount, 2)
 
     def _sync_profiles_for_cancel(self):
         """取消前补齐订单对应的 eSIM 档案，避免只拿到 orderNo 却没有本地 profile。"""
@@ -198,7 +405,7 @@ class EsimOrder(models.Model):
 
         api_client = self.env['esim.package']._get_api_client()
         try:
-            result = api_client.query_esim(order_no=self.api_order_no)
+            result = self._query_order_esims(api_client)
         except EsimAccessAPIError as e:
             raise UserError(_("查询订单 eSIM 失败: %s") % e.error_msg) from e
 
@@ -214,9 +421,30 @@ class EsimOrder(models.Model):
     def action_cancel(self) -> None:
         """按 eSIM 档案逐个取消订单，并在全部成功后退款。"""
         for order in self:
+            # 锁定订单行，避免履约队列同时向供应商下单；加锁后重新读取状态
+            try:
+                with self.env.cr.savepoint():
+                    order._lock_for_update()
+            except LockNotAvailable:
+                raise UserError(_("订单 %s 正在提交至 eSIM Access，请稍后再试。") % order.name) from None
+
             if order.state not in ('draft', 'confirmed', 'processing', 'done'):
                 raise UserError(_("当前状态不允许取消"))
 
+            if order.state == 'confirmed' and not order.api_order_no:
+                # 仍在履约队列中、尚未提交供应商：出队并退款即可
+                refundable = order._get_refundable_balance()
+                if refundable > 0:
+                    order.partner_id._esim_change_balance(
+                        log_type='refund',
+                        amount=refundable,
+                        description=_("取消订单退款: %s") % order.name,
+                        order_id=order.id,
+                    )
+                order.write({'state': 'cancelled', 'next_fulfil_date': False})
+                order.message_post(body=_("订单尚未提交至 eSIM Access，已取消并完成退款。"))
+                continue
+
             if order.state != 'draft':
                 profiles = order._sync_profiles_for_cancel()
                 if not profiles:
@@ -238,13 +466,19 @@ class EsimOrder(models.Model):
                         % '\n'.join(profile_lines)
                     )
 
-                profiles.filtered(lambda profile: profile.state != 'cancelled').action_cancel_profile()
+                result = profiles.filtered(
+                    lambda profile: profile.state != 'cancelled'
+                )._bulk_profile_operation('cancel')
+                if result['failed'] or result['skipped']:
+                    # 已取消成功的 eSIM 保留结果，订单暂不退款，待剩余 eSIM 重试取消
+                    continue
 
-            # 退还已扣余额（仅当已扣款且未退款时）
-            if order._has_balance_consumed() and not order._has_balance_refunded():
+            # 退还已扣且尚未退还的余额
+            refundable = order._get_refundable_balance()
+            if refundable > 0:
                 order.partner_id._esim_change_balance(
                     log_type='refund',
-                    amount=order.total_amount,
+                    amount=refundable,
                     description=_("取消订单退款: %s") % order.name,
                     order_id=order.id,
                 )
@@ -259,46 +493,100 @@ class EsimOrder(models.Model):
                 continue
             api_client = self.env['esim.package']._get_api_client()
             try:
-                result = api_client.query_esim(order_no=order.api_order_no)
+                result = order._query_order_esims(api_client)
             except EsimAccessAPIError as e:
                 order.message_post(body=_("查询状态失败: %s") % e.error_msg)
                 continue
 
             order._process_order_result(result)
 
+    def _query_order_esims(self, api_client, order_no: str = '') -> dict:
+        """
+        按订单号翻页取回全部 eSIM，合并为单次查询结果。
+        批量订单的 eSIM 数可能超过一页，只处理首页会漏掉档案却把订单标记完成。
+        """
+        self.ensure_one()
+        order_no = order_no or self.api_order_no
+        esim_list = []
+        pager = {}
+        page_num = 1
+        while True:
+            result = api_client.query_esim(
+                order_no=order_no, page_num=page_num, page_size=ORDER_QUERY_PAGE_SIZE,
+            )
+            page = result.get('esimList') or []
+            esim_list.extend(page)
+            pager = result.get('pager') or {}
+            if not page or len(esim_list) >= (pager.get('total') or 0):
+                break
+            page_num += 1
+        return {'esimList': esim_list, 'pager': pager}
+
     def _process_order_result(self, result: dict, mark_done: bool = True) -> None:
-        """处理 API 返回的查询结果，创建或更新 eSIM 档案。"""
+        """
+        处理 API 返回的查询结果，集合式创建或更新 eSIM 档案：
+        一次查询取出全部已有 ICCID，新档案一次 create(vals_list)，已有档案按相同变更值分组写入。
+        """
         self.ensure_one()
         esim_list = result.get('esimList') or []
         if not esim_list:
             return
 
         profile_model = self.env['esim.profile']
-        created_count = 0
+        vals_by_iccid = {}
+        package_code_by_iccid = {}
         for esim_data in esim_list:
             iccid = esim_data.get('iccid', '')
-            if not iccid:
-                continue
+            if iccid:
+                vals_by_iccid[iccid] = profile_model._map_esim_data(esim_data)
+                package_list = esim_data.get('packageList') or [{}]
+                package_code_by_iccid[iccid] = package_list[0].get('packageCode', '')
+
+        # 多套餐订单按 API 返回的 packageCode 匹配明细套餐
+        packages_by_code = {
+            line.package_id.package_code: line.package_id for line in self.line_ids
+        }
+        default_package = self.package_id or self.line_ids[:1].package_id
+
+        existing_by_iccid = {
+            profile.iccid: profile
+            for profile in profile_model.search([('iccid', 'in', list(vals_by_iccid))])
+        }
 
-            vals = profile_model._map_esim_data(esim_data)
-            existing = profile_model.search([('iccid', '=', iccid)], limit=1)
+        create_vals_list = []
+        update_vals_by_profile = {}
+        for iccid, vals in vals_by_iccid.items():
+            existing = existing_by_iccid.get(iccid)
             if existing:
                 vals.pop('iccid', None)
-                existing.write(vals)
+                update_vals_by_profile[existing] = vals
             else:
                 vals.update({
                     'iccid': iccid,
                     'order_id': self.id,
                     'partner_id': self.partner_id.id,
-                    'package_id': self.package_id.id,
+                    'package_id': packages_by_code.get(
+                        package_code_by_iccid.get(iccid), default_package,
+                    ).id,
                 })
-                profile_model.create(vals)
-                created_count += 1
+                create_vals_list.append(vals)
+
+        if create_vals_list:
+            # 批量创建不逐条记录创建日志与跟踪值，汇总信息统一记录在订单上
+            profile_model.with_context(
+                mail_create_nolog=True,
+                mail_create_nosubscribe=True,
+                mail_notrack=True,
+            ).create(create_vals_list)
+        if update_vals_by_profile:
+            profile_model._write_grouped(update_vals_by_profile)
+        # 入库后批量生成本地 QR 码，门户不再外链供应商图片
+        self.profile_ids._generate_qr_images()
 
         if mark_done:
-            self.write({'state': 'done'})
+            self.write({'state': 'done', 'next_fulfil_date': False})
             self.message_post(
-                body=_("订单查询完成，共 %d 个 eSIM 档案（新建 %d 个）") % (len(esim_list), created_count),
+                body=_("订单查询完成，共 %d 个 eSIM 档案（新建 %d 个）") % (len(esim_list), len(create_vals_list)),
             )
 
     def action_view_profiles(self):
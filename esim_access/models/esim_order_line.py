@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+
+
+class EsimOrderLine(models.Model):
+    """多套餐订单明细，一个订单的全部明细在一次 place_order 调用中提交。"""
+
+    _name = 'esim.order.line'
+    _description = 'eSIM 订单明细'
+    _order = 'order_id, sequence, id'
+
+    order_id = fields.Many2one(
+        'esim.order', string="订单", required=True,
+        ondelete='cascade', index=True,
+    )
+    sequence = fields.Integer(string="排序", default=10)
+    package_id = fields.Many2one(
+        'esim.package', string="套餐", required=True,
+        domain=[('package_type', '=', 'BASE')],
+    )
+    quantity = fields.Integer(string="数量", default=1, required=True)
+    period_num = fields.Integer(
+        string="使用天数",
+        help="每日套餐的天数（1-365），仅适用于按日计费的套餐",
+    )
+    unit_price = fields.Float(
+        string="单价", digits=(12, 2),
+        help="创建明细时按套餐售价固定，之后调整套餐售价不影响已有订单",
+    )
+    subtotal = fields.Float(string="小计", digits=(12, 2), compute='_compute_subtotal', store=True)
+
+    _sql_constraints = [
+        ('quantity_positive', 'CHECK(quantity > 0)', '数量必须大于 0'),
+    ]
+
+    @api.onchange('package_id')
+    def _onchange_package_id(self):
+        self.unit_price = self.package_id.sale_price
+
+    @api.model_create_multi
+    def create(self, vals_list: list[dict]) -> 'EsimOrderLine':
+        for vals in vals_list:
+            if vals.get('package_id') and 'unit_price' not in vals:
+                vals['unit_price'] = self.env['esim.package'].browse(vals['package_id']).sale_price
+        return super().create(vals_list)
+
+    def write(self, vals: dict) -> bool:
+        if vals.get('package_id') and 'unit_price' not in vals:
+            vals = dict(vals, unit_price=self.env['esim.package'].browse(vals['package_id']).sale_price)
+        return super().write(vals)
+
+    @api.depends('unit_price', 'quantity')
+    def _compute_subtotal(self):
+        for line in self:
+            line.subtotal = line.unit_price * line.quantity
+
+    def _build_package_info(self) -> dict:
+        """构建单条 packageInfoList 元素"""
+        self.ensure_one()
+        info = {
+            'packageCode': self.package_id.package_code,
+            'count': self.quantity,
+            'price': self.package_id.raw_price,
+        }
+        if self.period_num:
+            info['periodNum'] = self.period_num
+        return info
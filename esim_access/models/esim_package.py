@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import json
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, Command, _
 from odoo.exceptions import UserError
+from odoo.tools import SQL, escape_psql
+from odoo.tools.sql import create_index
 
-from ..services.esim_api import EsimAccessAPI, EsimAccessAPIError, PRICE_DIVISOR, VOLUME_DIVISOR
+from ..services.esim_api import (
+    EsimAccessAPI, EsimAccessAPIError, PRICE_DIVISOR, VOLUME_DIVISOR, get_shared_client,
+)
+from ..services.api_journal import get_shared_journal
+from ..services.rate_limiter import PgTokenBucketLimiter
+from .esim_package_facet import PACKAGE_FACET_FIELDS
 
 _logger = logging.getLogger(__name__)
 
@@ -25,6 +36,15 @@ DATA_TYPE_SELECTION = [
     ('4', '每日不限量'),
 ]
 
+# 增量同步之间穿插全量同步的默认间隔（小时），全量同步负责停用已下架套餐
+DEFAULT_FULL_SYNC_INTERVAL_HOURS = 168
+
+# 目录搜索最多返回的排序结果数，门户分页在此范围内进行
+CATALOGUE_SEARCH_LIMIT = 500
+# 容错匹配的词相似度下限，查询前写入 pg_trgm.word_similarity_threshold
+CATALOGUE_WORD_SIMILARITY_THRESHOLD = 0.6
+_SEARCH_TOKEN_RE = re.compile(r'\w+')
+
 SMS_STATUS_SELECTION = [
     ('0', '不支持 SMS'),
     ('1', 'API 和手机 SMS'),
@@ -49,6 +69,15 @@ class EsimPackage(models.Model):
     duration_unit = fields.Selection(DURATION_UNIT_SELECTION, string="有效期单位", default='DAY')
     unused_valid_time = fields.Integer(string="未激活有效天数")
     location = fields.Char(string="覆盖地区", help="Alpha-2 ISO 国家代码，逗号分隔")
+    country_ids = fields.Many2many(
+        'res.country', 'esim_package_country_rel', 'package_id', 'country_id',
+        string="覆盖国家", compute='_compute_coverage', store=True,
+        help="由覆盖地区解析出的国家，门户按国家筛选时走关联表索引",
+    )
+    coverage_extra_codes = fields.Char(
+        string="其他地区代码", compute='_compute_coverage', store=True,
+        help="覆盖地区中无法对应到国家的代码（如区域代码），逗号分隔",
+    )
     description = fields.Text(string="描述")
     package_type = fields.Selection(PACKAGE_TYPE_SELECTION, string="类型", default='BASE')
     data_type = fields.Selection(DATA_TYPE_SELECTION, string="流量类型")
@@ -61,6 +90,15 @@ class EsimPackage(models.Model):
     is_published = fields.Boolean(string="门户展示", default=False)
     active = fields.Boolean(string="启用", default=True)
     last_sync_date = fields.Datetime(string="最后同步时间", readonly=True)
+    sync_hash = fields.Char(
+        string="同步指纹", readonly=True, copy=False,
+        help="上次同步时 API 原始数据与加价比例的哈希，未变化的套餐跳过写入",
+    )
+
+    search_document = fields.Text(
+        string="搜索文本", compute='_compute_search_document', store=True, index='trigram',
+        help="名称、描述、覆盖国家（各语言名称）、速度与 FUP 策略拼接而成，供门户全文 / 模糊搜索",
+    )
 
     # API 原始价格（万分之一单位），用于调用 API 下单时传递
     raw_price = fields.Integer(string="API 原始价格", help="API 返回的原始价格值")
@@ -69,28 +107,174 @@ class EsimPackage(models.Model):
         ('package_code_uniq', 'UNIQUE(package_code)', '套餐编码不能重复'),
     ]
 
+    def init(self):
+        # 全文检索索引；模糊匹配由 search_document 的 trigram 索引承担
+        create_index(
+            self.env.cr, 'esim_package_search_document_tsv_index', self._table,
+            ["to_tsvector('simple', COALESCE(search_document, ''))"], method='gin',
+        )
+
     @api.depends('name', 'volume', 'duration', 'duration_unit')
     def _compute_display_name(self):
         for rec in self:
             unit = dict(DURATION_UNIT_SELECTION).get(rec.duration_unit, '')
             rec.display_name = f"{rec.name} ({rec.volume}GB/{rec.duration}{unit})"
 
+    @api.depends('location')
+    def _compute_coverage(self):
+        """将逗号分隔的覆盖地区规范化为国家多对多，每批记录只查询一次 res.country"""
+        codes_by_package = {
+            rec.id: [code.strip().upper() for code in (rec.location or '').split(',') if code.strip()]
+            for rec in self
+        }
+        all_codes = {code for codes in codes_by_package.values() for code in codes}
+        country_ids_by_code = {
+            country.code.upper(): country.id
+            for country in self.env['res.country'].sudo().search([('code', 'in', list(all_codes))])
+        } if all_codes else {}
+        for rec in self:
+            codes = codes_by_package[rec.id]
+            rec.country_ids = [Command.set([
+                country_ids_by_code[code] for code in codes if code in country_ids_by_code
+            ])]
+            rec.coverage_extra_codes = ','.join(
+                code for code in codes if code not in country_ids_by_code
+            ) or False
+
+    @api.depends('name', 'description', 'speed', 'fup_policy', 'location', 'country_ids')
+    def _compute_search_document(self):
+        langs = [code for code, _name in self.env['res.lang'].get_installed()]
+        for rec in self:
+            country_names = {
+                country.with_context(lang=lang).name
+                for lang in langs for country in rec.country_ids
+            }
+            parts = [
+                rec.name, rec.description, rec.speed, rec.fup_policy,
+                (rec.location or '').replace(',', ' '), *sorted(country_names),
+            ]
+            rec.search_document = '\n'.join(part for part in parts if part) or False
+
+    @api.model
+    def _search_catalogue(self, text: str, domain: list, limit: int = CATALOGUE_SEARCH_LIMIT) -> list[int]:
+        """
+        按相关度排序搜索套餐，返回套餐 ID 列表。
+        全文检索（前缀匹配）、子串匹配与词相似度匹配（安装了 pg_trgm 时，容忍拼写错误）均走索引。
+        """
+        if not _SEARCH_TOKEN_RE.findall(text.lower()):
+            return self.search(domain, limit=limit).ids
+
+        self.flush_model(['search_document'])
+        if self.env.registry.has_trigram:
+            # <% 以会话参数为阈值，只有运算符形式能使用 trigram 索引
+            self.env.cr.execute(
+                "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                (str(CATALOGUE_WORD_SIMILARITY_THRESHOLD),),
+            )
+        self.env.cr.execute(self._search_catalogue_query(text, domain, limit))
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _search_catalogue_query(self, text: str, domain: list, limit: int) -> SQL:
+        """
+        构造目录搜索 SQL。子串与词相似度匹配须使用与 search_document trigram 索引相同的表达式
+        （启用 unaccent 时为 unaccent(search_document)），否则无法使用索引。
+        """
+        tokens = _SEARCH_TOKEN_RE.findall(text.lower())
+        unaccent = self.env.registry.unaccent
+        document = unaccent(SQL.identifier('search_document'))
+        ts_query = SQL("to_tsquery('simple', %s)", ' & '.join(f'{token}:*' for token in tokens))
+        ts_vector = SQL("to_tsvector('simple', COALESCE(search_document, ''))")
+        matches = [
+            SQL("%s @@ %s", ts_vector, ts_query),
+            SQL("%s ILIKE %s", document, unaccent(SQL("%s", f'%{escape_psql(text)}%'))),
+        ]
+        ranks = [SQL("ts_rank(%s, %s) DESC", ts_vector, ts_query)]
+        if self.env.registry.has_trigram:
+            # %%%% 经 SQL() 与 psycopg2 两次格式化后成为 <% 运算符
+            matches.append(SQL("%s <%%%% %s", unaccent(SQL("%s", text)), document))
+            ranks.append(SQL("word_similarity(%s, %s) DESC", unaccent(SQL("%s", text)), document))
+
+        return SQL(
+            """
+            SELECT id FROM esim_package
+             WHERE id IN (%s) AND (%s)
+          ORDER BY %s, id
+             LIMIT %s
+            """,
+            self._search(domain).subselect(),
+            SQL(" OR ").join(matches),
+            SQL(", ").join(ranks),
+            limit,
+        )
+
+    @api.model
+    def _get_location_domain(self, location_code: str) -> list:
+        """按单个地区代码筛选套餐：国家走关联表索引，其余代码精确匹配逗号分隔列表中的一项"""
+        code = location_code.strip().upper()
+        country = self.env['res.country'].sudo().search([('code', '=', code)], limit=1)
+        if country:
+            return [('country_ids', 'in', country.ids)]
+        return [
+            '|', '|', '|',
+            ('coverage_extra_codes', '=', code),
+            ('coverage_extra_codes', '=like', f'{code},%'),
+            ('coverage_extra_codes', '=like', f'%,{code}'),
+            ('coverage_extra_codes', '=like', f'%,{code},%'),
+        ]
+
+    @api.model_create_multi
+    def create(self, vals_list: list[dict]) -> 'EsimPackage':
+        packages = super().create(vals_list)
+        self.env['esim.package.facet']._schedule_rebuild()
+        return packages
+
+    def write(self, vals: dict) -> bool:
+        result = super().write(vals)
+        if PACKAGE_FACET_FIELDS.intersection(vals):
+            self.env['esim.package.facet']._schedule_rebuild()
+        return result
+
+    def unlink(self) -> bool:
+        self.env['esim.package.facet']._schedule_rebuild()
+        return super().unlink()
+
     def _check_manager_permission(self) -> None:
         """批量管理动作仅允许 eSIM 管理员执行。"""
         if not self.env.user.has_group('esim_access.group_esim_manager'):
             raise UserError(_("只有 eSIM 管理员可以执行此操作。"))
 
-    def _get_api_client(self) -> EsimAccessAPI:
-        """从系统参数构建 API 客户端"""
+    @api.model
+    @tools.ormcache()
+    def _get_api_config(self) -> tuple:
+        """
+        读取 API 连接配置并缓存于 ormcache。
+        ir.config_parameter 写入时会清空 ormcache 并通知其他 worker，设置变更即时生效。
+        """
         ICP = self.env['ir.config_parameter'].sudo()
-        access_code = ICP.get_param('esim_access.access_code', '')
-        secret_key = ICP.get_param('esim_access.secret_key', '')
-        base_url = ICP.get_param('esim_access.api_base_url', 'https://api.esimaccess.com/api/v1')
+        return (
+            ICP.get_param('esim_access.access_code', ''),
+            ICP.get_param('esim_access.secret_key', ''),
+            ICP.get_param('esim_access.api_base_url', 'https://api.esimaccess.com/api/v1'),
+            int(ICP.get_param('esim_access.api_timeout', EsimAccessAPI.DEFAULT_TIMEOUT) or 0),
+            int(ICP.get_param('esim_access.api_max_retries', '3') or 0),
+            float(ICP.get_param('esim_access.api_retry_backoff', '0.5') or 0),
+            float(ICP.get_param('esim_access.api_rate_limit_max_wait', '30') or 0),
+        )
 
+    def _get_api_client(self) -> EsimAccessAPI:
+        """返回当前 worker 共享的 API 客户端（复用连接池，跨 worker 共享限流预算）"""
+        config = self._get_api_config()
+        access_code, secret_key = config[:2]
         if not access_code or not secret_key:
             raise UserError(_("请先在设置中配置 eSIM Access API 凭证"))
 
-        return EsimAccessAPI(access_code, secret_key, base_url)
+        dbname = self.env.cr.dbname
+        return get_shared_client(
+            dbname, config,
+            rate_limiter=PgTokenBucketLimiter(dbname, max_wait=config[6]),
+            journal=get_shared_journal(dbname),
+        )
 
     def action_sync_packages(self):
         """套餐列表页面手动触发同步"""
@@ -136,70 +320,196 @@ class EsimPackage(models.Model):
         return self._set_portal_publish_state(False)
 
     @api.model
-    def _sync_packages_from_api(self, location_code: str = '') -> int:
-        """从 API 同步套餐到本地数据库，返回同步数量"""
-        api_client = self._get_api_client()
-        ICP = self.env['ir.config_parameter'].sudo()
-        markup = float(ICP.get_param('esim_access.default_markup', '1.3'))
+    def _prepare_package_vals(self, pkg: dict, markup: float) -> dict:
+        """将 API 返回的单条套餐数据映射为字段值"""
+        code = pkg.get('packageCode', '')
+        is_topup = code.startswith('TOPUP_')
+        raw_price = pkg.get('price', 0)
+        cost_price = raw_price / PRICE_DIVISOR
+        volume_bytes = pkg.get('volume', 0)
+        volume_gb = round(volume_bytes / VOLUME_DIVISOR, 2)
+        raw_retail = pkg.get('retailPrice', 0)
+        support_topup_val = pkg.get('supportTopUpType')
 
-        try:
-            packages = api_client.get_package_list(location_code=location_code)
-        except EsimAccessAPIError as e:
-            _logger.error("套餐同步失败: %s", e)
-            raise UserError(_("套餐同步失败: %s") % e.error_msg) from e
+        return {
+            'package_code': code,
+            'slug': pkg.get('slug', ''),
+            'name': pkg.get('name', ''),
+            'cost_price': cost_price,
+            'sale_price': round(cost_price * markup, 2),
+            'retail_price': raw_retail / PRICE_DIVISOR if raw_retail else 0,
+            'currency_code': pkg.get('currencyCode', 'USD'),
+            'volume': volume_gb,
+            'duration': pkg.get('duration', 0),
+            'duration_unit': pkg.get('durationUnit', 'DAY'),
+            'unused_valid_time': pkg.get('unusedValidTime', 0),
+            'location': pkg.get('location', ''),
+            'description': pkg.get('description', ''),
+            'package_type': 'TOPUP' if is_topup else 'BASE',
+            'data_type': str(pkg['dataType']) if pkg.get('dataType') else False,
+            'sms_status': str(pkg['smsStatus']) if pkg.get('smsStatus') is not None else False,
+            'active_type': pkg.get('activeType', 0),
+            'speed': pkg.get('speed', ''),
+            'ip_export': pkg.get('ipExport', ''),
+            'support_topup': support_topup_val == 2 if support_topup_val else False,
+            'fup_policy': pkg.get('fupPolicy', ''),
+            'raw_price': raw_price,
+        }
+
+    @staticmethod
+    def _compute_sync_hash(pkg: dict, markup: float) -> str:
+        """API 原始数据 + 加价比例的指纹，任一变化都会导致重写"""
+        payload = json.dumps(pkg, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(f"{payload}|{markup}".encode('utf-8')).hexdigest()
 
+    @api.model
+    def _upsert_packages(self, packages: list[dict], markup: float) -> set:
+        """
+        集合式写入一批 API 套餐，返回本批出现的套餐编码。
+        - 一次查询预取本批编码对应的已有套餐及其指纹（含已停用）
+        - 指纹未变且仍启用的套餐只批量刷新 last_sync_date
+        - 新套餐通过一次 create(vals_list) 批量创建
+        """
         now = fields.Datetime.now()
+        payload_codes = list({pkg.get('packageCode') for pkg in packages if pkg.get('packageCode')})
+        existing_by_code = {
+            rec.package_code: rec
+            for rec in self.with_context(active_test=False).search_fetch(
+                [('package_code', 'in', payload_codes)], ['package_code', 'sync_hash', 'active'],
+            )
+        }
+
         synced_codes = set()
+        create_vals_list = []
+        unchanged_ids = []
         for pkg in packages:
             code = pkg.get('packageCode', '')
-            if not code:
+            if not code or code in synced_codes:
                 continue
             synced_codes.add(code)
 
-            is_topup = code.startswith('TOPUP_')
-            raw_price = pkg.get('price', 0)
-            cost_price = raw_price / PRICE_DIVISOR
-            volume_bytes = pkg.get('volume', 0)
-            volume_gb = round(volume_bytes / VOLUME_DIVISOR, 2)
-            raw_retail = pkg.get('retailPrice', 0)
-            support_topup_val = pkg.get('supportTopUpType')
-
-            vals = {
-                'package_code': code,
-                'slug': pkg.get('slug', ''),
-                'name': pkg.get('name', ''),
-                'cost_price': cost_price,
-                'sale_price': round(cost_price * markup, 2),
-                'retail_price': raw_retail / PRICE_DIVISOR if raw_retail else 0,
-                'currency_code': pkg.get('currencyCode', 'USD'),
-                'volume': volume_gb,
-                'duration': pkg.get('duration', 0),
-                'duration_unit': pkg.get('durationUnit', 'DAY'),
-                'unused_valid_time': pkg.get('unusedValidTime', 0),
-                'location': pkg.get('location', ''),
-                'description': pkg.get('description', ''),
-                'package_type': 'TOPUP' if is_topup else 'BASE',
-                'data_type': str(pkg['dataType']) if pkg.get('dataType') else False,
-                'sms_status': str(pkg['smsStatus']) if pkg.get('smsStatus') is not None else False,
-                'active_type': pkg.get('activeType', 0),
-                'speed': pkg.get('speed', ''),
-                'ip_export': pkg.get('ipExport', ''),
-                'support_topup': support_topup_val == 2 if support_topup_val else False,
-                'fup_policy': pkg.get('fupPolicy', ''),
-                'raw_price': raw_price,
-                'last_sync_date': now,
-            }
+            sync_hash = self._compute_sync_hash(pkg, markup)
+            existing = existing_by_code.get(code)
+            if existing and existing.active and existing.sync_hash == sync_hash:
+                unchanged_ids.append(existing.id)
+                continue
 
-            existing = self.search([('package_code', '=', code)], limit=1)
+            vals = self._prepare_package_vals(pkg, markup)
+            vals.update({'sync_hash': sync_hash, 'last_sync_date': now, 'active': True})
             if existing:
                 existing.write(vals)
             else:
-                self.create(vals)
+                create_vals_list.append(vals)
+
+        if create_vals_list:
+            self.create(create_vals_list)
+        if unchanged_ids:
+            self.browse(unchanged_ids).write({'last_sync_date': now})
+
+        _logger.info(
+            "套餐写入完成：新建 %d，更新 %d，未变化 %d",
+            len(create_vals_list),
+            len(synced_codes) - len(create_vals_list) - len(unchanged_ids),
+            len(unchanged_ids),
+        )
+        return synced_codes
+
+    @api.model
+    def _deactivate_missing_packages(self, synced_codes: set) -> int:
+        """停用 API 全量列表中已不存在的普通套餐，返回停用数量"""
+        missing = self.search([
+            ('package_type', '=', 'BASE'),
+            ('package_code', 'not in', list(synced_codes)),
+        ])
+        if missing:
+            missing.write({'active': False})
+            _logger.info("停用 %d 个已下架套餐", len(missing))
+        return len(missing)
+
+    @api.model
+    def _sync_packages_from_api(self, location_code: str = '') -> int:
+        """从 API 同步套餐到本地数据库，返回同步数量。全量同步时停用已下架套餐。"""
+        api_client = self._get_api_client()
+        ICP = self.env['ir.config_parameter'].sudo()
+        markup = float(ICP.get_param('esim_access.default_markup', '1.3'))
+
+        try:
+            packages = api_client.get_package_list(location_code=location_code)
+        except EsimAccessAPIError as e:
+            _logger.error("套餐同步失败: %s", e)
+            raise UserError(_("套餐同步失败: %s") % e.error_msg) from e
+
+        synced_codes = self._upsert_packages(packages, markup)
+        Checkpoint = self.env['esim.package.sync.checkpoint']
+        if location_code:
+            Checkpoint._register_locations({location_code.upper()})
+            Checkpoint.search([('location_code', '=', location_code.upper())])._mark_done(len(synced_codes))
+        # 仅全量列表可以判定「已下架」；空列表多半是接口异常，不做停用
+        elif synced_codes:
+            self._deactivate_missing_packages(synced_codes)
+            Checkpoint._register_locations(Checkpoint._extract_location_codes(packages), synced=True)
+            Checkpoint._mark_full_sync_done(len(synced_codes))
 
         _logger.info("套餐同步完成，共处理 %d 个套餐", len(synced_codes))
         return len(synced_codes)
 
+    @api.model
+    def _sync_packages_incremental(self, auto_commit: bool = False) -> int:
+        """
+        按地区增量同步套餐，返回处理的套餐数量。
+        - 仅拉取超过同步间隔或上次失败的地区，每个地区单独记录检查点
+        - API 请求在有界线程池中并发执行，ORM 写入统一在当前线程逐地区完成
+        - auto_commit: 每个地区写入后立即提交（定时任务使用），中断后可从检查点续跑
+        - 尚无检查点或距上次全量同步超过全量同步间隔（默认一周）时改为全量同步：
+          登记新地区，并停用供应商已下架的套餐（按地区的列表无法判定下架）
+        """
+        Checkpoint = self.env['esim.package.sync.checkpoint']
+        ICP = self.env['ir.config_parameter'].sudo()
+        full_sync_hours = int(
+            ICP.get_param('esim_access.package_full_sync_interval_hours', DEFAULT_FULL_SYNC_INTERVAL_HOURS)
+            or DEFAULT_FULL_SYNC_INTERVAL_HOURS
+        )
+        if Checkpoint._is_full_sync_due(full_sync_hours):
+            return self._sync_packages_from_api()
+
+        markup = float(ICP.get_param('esim_access.default_markup', '1.3'))
+        max_age_hours = int(ICP.get_param('esim_access.package_sync_interval_hours', '24') or 24)
+        max_workers = max(int(ICP.get_param('esim_access.package_sync_workers', '4') or 1), 1)
+
+        due_checkpoints = Checkpoint._get_due_checkpoints(max_age_hours)
+        if not due_checkpoints:
+            return 0
+
+        api_client = self._get_api_client()
+        total = 0
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='esim-package-sync') as pool:
+            futures = {
+                pool.submit(api_client.get_package_list, location_code=checkpoint.location_code): checkpoint
+                for checkpoint in due_checkpoints
+            }
+            for future in as_completed(futures):
+                checkpoint = futures[future]
+                try:
+                    packages = future.result()
+                except EsimAccessAPIError as e:
+                    _logger.warning("地区 %s 套餐同步失败: %s", checkpoint.location_code, e)
+                    checkpoint._mark_failed(e.error_msg)
+                    failed += 1
+                else:
+                    synced_codes = self._upsert_packages(packages, markup)
+                    checkpoint._mark_done(len(synced_codes))
+                    total += len(synced_codes)
+                if auto_commit:
+                    self.env.cr.commit()
+
+        _logger.info(
+            "增量套餐同步完成：%d 个地区，失败 %d 个，共处理 %d 个套餐",
+            len(due_checkpoints), failed, total,
+        )
+        return total
+
     @api.model
     def _cron_sync_packages(self) -> None:
-        """定时任务入口：同步套餐"""
-        self._sync_packages_from_api()
+        """定时任务入口：按地区增量同步套餐"""
+        self._sync_packages_incremental(auto_commit=True)
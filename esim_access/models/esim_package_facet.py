@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+
+FACET_TYPE_SELECTION = [
+    ('location', '覆盖地区'),
+    ('duration', '有效期'),
+    ('volume', '流量'),
+]
+
+# 影响门户筛选项的套餐字段，变更时需要重建筛选索引
+PACKAGE_FACET_FIELDS = frozenset({
+    'is_published', 'active', 'package_type', 'location', 'country_ids', 'coverage_extra_codes',
+    'duration', 'duration_unit', 'volume',
+})
+
+_REBUILD_PENDING_KEY = 'esim_package_facet_rebuild'
+
+
+class EsimPackageFacet(models.Model):
+    """
+    门户套餐目录的筛选项索引：按门户可见套餐（已发布、启用、BASE）预先汇总
+    地区 / 有效期 / 流量的取值与套餐数，套餐同步或发布状态变化时整体重建。
+    """
+
+    _name = 'esim.package.facet'
+    _description = 'eSIM 套餐筛选索引'
+    _order = 'facet_type, value'
+
+    facet_type = fields.Selection(FACET_TYPE_SELECTION, string="筛选类型", required=True, readonly=True)
+    value = fields.Char(string="取值", required=True, readonly=True)
+    package_count = fields.Integer(string="套餐数", readonly=True)
+
+    _sql_constraints = [
+        ('facet_uniq', 'UNIQUE(facet_type, value)', '筛选项不能重复'),
+    ]
+
+    @api.model
+    def _schedule_rebuild(self) -> None:
+        """在当前事务提交前重建一次，同一事务内多次变更只重建一次"""
+        precommit = self.env.cr.precommit
+        if not precommit.data.get(_REBUILD_PENDING_KEY):
+            precommit.data[_REBUILD_PENDING_KEY] = True
+            precommit.add(self.sudo()._rebuild)
+
+    @api.model
+    def _rebuild(self) -> None:
+        """按门户可见套餐重新汇总全部筛选项（新记录 ID 递增，各 worker 的筛选项缓存随之失效）"""
+        self.env['esim.package'].flush_model()
+        cr = self.env.cr
+        visible = "is_published AND active AND package_type = 'BASE'"
+        # 国家经规范化关联表统计，其余地区代码数量很少，直接拆分统计
+        cr.execute(f"""
+            SELECT UPPER(country.code), COUNT(*)
+              FROM esim_package_country_rel rel
+              JOIN esim_package package ON package.id = rel.package_id
+              JOIN res_country country ON country.id = rel.country_id
+             WHERE {visible}
+          GROUP BY 1
+            UNION ALL
+            SELECT code, COUNT(DISTINCT package.id)
+              FROM esim_package package,
+                   regexp_split_to_table(package.coverage_extra_codes, ',') AS code
+             WHERE {visible} AND package.coverage_extra_codes IS NOT NULL
+          GROUP BY 1
+        """)
+        vals_list = [
+            {'facet_type': 'location', 'value': code, 'package_count': count}
+            for code, count in cr.fetchall()
+        ]
+        cr.execute(f"""
+            SELECT duration, duration_unit, COUNT(*)
+              FROM esim_package
+             WHERE {visible} AND duration > 0 AND duration_unit IS NOT NULL
+          GROUP BY duration, duration_unit
+        """)
+        vals_list += [
+            {'facet_type': 'duration', 'value': f"{duration}|{unit}", 'package_count': count}
+            for duration, unit, count in cr.fetchall()
+        ]
+        cr.execute(f"""
+            SELECT volume, COUNT(*)
+              FROM esim_package
+             WHERE {visible} AND volume IS NOT NULL
+          GROUP BY volume
+        """)
+        vals_list += [
+            {'facet_type': 'volume', 'value': str(float(volume)), 'package_count': count}
+            for volume, count in cr.fetchall()
+        ]
+
+        self.search([]).unlink()
+        self.create(vals_list)
+
+    @api.model
+    def _get_portal_facets(self) -> dict:
+        """
+        门户筛选项：{'locations': [...], 'durations': [...], 'volumes': [...], 'country_name_map': {code: 名称}}
+        以筛选索引的最大 ID 作为版本号，重建后版本号变化即读取新结果，无需清空全局 ormcache。
+        """
+        self.env.cr.execute("SELECT MAX(id) FROM esim_package_facet")
+        return self._get_portal_facets_cached(self.env.cr.fetchone()[0] or 0)
+
+    @api.model
+    @tools.ormcache('self.env.lang', 'version')
+    def _get_portal_facets_cached(self, version: int) -> dict:
+        """按语言与索引版本缓存的门户筛选项"""
+        facets = self.search_read([], ['facet_type', 'value'])
+        location_codes = [f['value'] for f in facets if f['facet_type'] == 'location']
+        countries = self.env['res.country'].sudo().search([('code', 'in', location_codes)])
+        country_name_map = {country.code.upper(): country.name for country in countries}
+
+        durations = []
+        volumes = []
+        for facet in facets:
+            if facet['facet_type'] == 'duration':
+                duration, _sep, unit = facet['value'].partition('|')
+                label_unit = '天' if unit == 'DAY' else '月'
+                durations.append({'value': facet['value'], 'label': f"{duration} {label_unit}"})
+            elif facet['facet_type'] == 'volume':
+                volume = float(facet['value'])
+                volumes.append({'value': str(volume), 'label': f"{volume:g} GB"})
+
+        return {
+            'locations': sorted(
+                ({'value': code, 'label': country_name_map.get(code, code)} for code in location_codes),
+                key=lambda item: item['label'],
+            ),
+            'durations': sorted(durations, key=lambda item: item['label']),
+            'volumes': sorted(volumes, key=lambda item: float(item['value'])),
+            'country_name_map': country_name_map,
+        }
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+CHECKPOINT_STATE_SELECTION = [
+    ('pending', '待同步'),
+    ('done', '已同步'),
+    ('failed', '失败'),
+]
+
+# 区域套餐与全球套餐的查询代码
+REGION_LOCATION_CODES = ('!RG', '!GL')
+# 全量同步进度使用的保留地区代码，不参与按地区增量拉取
+FULL_SYNC_LOCATION_CODE = '*'
+
+
+class EsimPackageSyncCheckpoint(models.Model):
+    """按地区记录套餐增量同步进度，单个地区失败只需重试该地区。"""
+
+    _name = 'esim.package.sync.checkpoint'
+    _description = 'eSIM 套餐同步检查点'
+    _order = 'last_sync_date asc nulls first, location_code'
+    _rec_name = 'location_code'
+
+    location_code = fields.Char(string="地区代码", required=True, readonly=True)
+    state = fields.Selection(
+        CHECKPOINT_STATE_SELECTION, string="状态", default='pending',
+        required=True, readonly=True,
+    )
+    last_sync_date = fields.Datetime(string="最后成功同步", readonly=True)
+    last_attempt_date = fields.Datetime(string="最后尝试时间", readonly=True)
+    package_count = fields.Integer(string="套餐数", readonly=True)
+    error_message = fields.Char(string="错误信息", readonly=True)
+
+    _sql_constraints = [
+        ('location_code_uniq', 'UNIQUE(location_code)', '地区代码不能重复'),
+    ]
+
+    def action_run_incremental_sync(self) -> dict:
+        """检查点列表手动触发增量同步"""
+        package_model = self.env['esim.package']
+        package_model._check_manager_permission()
+        count = package_model._sync_packages_incremental()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("增量同步完成"),
+                'message': _("共同步 %d 个套餐") % count,
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
+
+    @api.model
+    def _extract_location_codes(self, packages: list[dict]) -> set:
+        """从 API 套餐数据的逗号分隔 location 中提取全部地区代码"""
+        codes = set()
+        for pkg in packages:
+            for loc in (pkg.get('location') or '').split(','):
+                code = loc.strip().upper()
+                if code:
+                    codes.add(code)
+        return codes
+
+    @api.model
+    def _register_locations(self, location_codes: set, synced: bool = False) -> None:
+        """
+        登记地区检查点（连同区域 / 全球代码）。
+        - synced: 来自全量同步时新登记的地区直接标记为已同步，避免增量同步立即重复拉取；
+          已有检查点的进度保持不变，仍由各自的同步间隔驱动增量同步
+        """
+        codes = set(location_codes) | set(REGION_LOCATION_CODES)
+        existing = self.search([('location_code', 'in', list(codes))])
+        now = fields.Datetime.now()
+        done_vals = {
+            'state': 'done',
+            'last_sync_date': now,
+            'last_attempt_date': now,
+            'error_message': False,
+        }
+
+        new_codes = codes - set(existing.mapped('location_code'))
+        if new_codes:
+            self.create([
+                dict(done_vals, location_code=code) if synced else {'location_code': code}
+                for code in sorted(new_codes)
+            ])
+
+    @api.model
+    def _get_due_checkpoints(self, max_age_hours: int):
+        """返回需要同步的地区：从未成功、上次失败或超过间隔未同步的，最久未同步的优先"""
+        threshold = fields.Datetime.now() - timedelta(hours=max_age_hours)
+        return self.search([
+            ('location_code', '!=', FULL_SYNC_LOCATION_CODE),
+            '|', '|',
+            ('state', '!=', 'done'),
+            ('last_sync_date', '=', False),
+            ('last_sync_date', '<', threshold),
+        ])
+
+    @api.model
+    def _is_full_sync_due(self, max_age_hours: int) -> bool:
+        """
+        是否需要执行全量同步：从未全量同步、上次失败或超过间隔。
+        只有全量列表能判定套餐已下架，增量同步需定期穿插全量同步。
+        """
+        checkpoint = self.search([('location_code', '=', FULL_SYNC_LOCATION_CODE)], limit=1)
+        threshold = fields.Datetime.now() - timedelta(hours=max_age_hours)
+        return (
+            not checkpoint
+            or checkpoint.state != 'done'
+            or not checkpoint.last_sync_date
+            or checkpoint.last_sync_date < threshold
+        )
+
+    @api.model
+    def _mark_full_sync_done(self, package_count: int) -> None:
+        checkpoint = self.search([('location_code', '=', FULL_SYNC_LOCATION_CODE)], limit=1)
+        if not checkpoint:
+            checkpoint = self.create({'location_code': FULL_SYNC_LOCATION_CODE})
+        checkpoint._mark_done(package_count)
+
+    def _mark_done(self, package_count: int) -> None:
+        now = fields.Datetime.now()
+        self.write({
+            'state': 'done',
+            'last_sync_date': now,
+            'last_attempt_date': now,
+            'package_count': package_count,
+            'error_message': False,
+        })
+
+    def _mark_failed(self, error_message: str) -> None:
+        self.write({
+            'state': 'failed',
+            'last_attempt_date': fields.Datetime.now(),
+            'error_message': error_message,
+        })
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from collections import Counter
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# 计数缓存的最长有效期，超过后在下次访问门户首页时重新统计，兜底增量维护的偏差
+PORTAL_COUNTER_TTL = timedelta(hours=1)
+
+# 计数缓存字段 → 被统计的模型
+PORTAL_COUNTER_MODELS = {
+    'esim_profile_count_cached': 'esim.profile',
+    'esim_order_count_cached': 'esim.order',
+}
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    esim_profile_count_cached = fields.Integer(string="eSIM 数量（缓存）", readonly=True, copy=False)
+    esim_order_count_cached = fields.Integer(string="eSIM 订单数（缓存）", readonly=True, copy=False)
+    esim_counters_date = fields.Datetime(
+        string="门户计数统计时间", readonly=True, copy=False,
+        help="为空或超过有效期时，门户首页重新统计 eSIM / 订单数量",
+    )
+
+    @api.model
+    def _esim_bump_portal_counter(self, field_name: str, deltas: dict[int, int]) -> None:
+        """
+        增量调整计数缓存：单条 UPDATE 原子加减，不与并发创建互相覆盖。
+        尚未统计过的客户不调整，首次访问门户时整体统计。
+        """
+        partner_ids_by_delta = {}
+        for partner_id, delta in deltas.items():
+            if delta:
+                partner_ids_by_delta.setdefault(delta, []).append(partner_id)
+        if not partner_ids_by_delta:
+            return
+        for delta, partner_ids in partner_ids_by_delta.items():
+            self.env.cr.execute(f"""
+                UPDATE res_partner
+                   SET {field_name} = GREATEST(COALESCE({field_name}, 0) + %s, 0)
+                 WHERE id IN %s AND esim_counters_date IS NOT NULL
+            """, (delta, tuple(partner_ids)))
+        self.browse(list(deltas)).invalidate_recordset([field_name])
+
+    def _get_esim_portal_counters(self) -> dict:
+        """返回 {'esim_profile_count': n, 'esim_order_count': n}，缓存过期时重新统计"""
+        self.ensure_one()
+        partner = self.sudo()
+        now = fields.Datetime.now()
+        if not partner.esim_counters_date or partner.esim_counters_date < now - PORTAL_COUNTER_TTL:
+            counts = {
+                field_name: self.env[model_name].sudo().search_count([('partner_id', '=', partner.id)])
+                for field_name, model_name in PORTAL_COUNTER_MODELS.items()
+            }
+            self.env.cr.execute("""
+                UPDATE res_partner
+                   SET esim_profile_count_cached = %s,
+                       esim_order_count_cached = %s,
+                       esim_counters_date = %s
+                 WHERE id = %s
+            """, (
+                counts['esim_profile_count_cached'], counts['esim_order_count_cached'], now, partner.id,
+            ))
+            partner.invalidate_recordset(['esim_counters_date', *PORTAL_COUNTER_MODELS])
+        return {
+            'esim_profile_count': partner.esim_profile_count_cached,
+            'esim_order_count': partner.esim_order_count_cached,
+        }
+
+
+class EsimPortalCounterMixin(models.AbstractModel):
+    """按 partner_id 维护客户门户计数缓存：创建、删除与更换客户时增量调整"""
+
+    _name = 'esim.portal.counter.mixin'
+    _description = 'eSIM 门户计数维护'
+
+    # 子模型对应的 res.partner 计数缓存字段
+    _portal_counter_field = None
+
+    @api.model_create_multi
+    def create(self, vals_list: list[dict]):
+        records = super().create(vals_list)
+        records._bump_portal_counter(1)
+        return records
+
+    def write(self, vals: dict) -> bool:
+        if 'partner_id' not in vals:
+            return super().write(vals)
+        self._bump_portal_counter(-1)
+        res = super().write(vals)
+        self._bump_portal_counter(1)
+        return res
+
+    def unlink(self) -> bool:
+        self._bump_portal_counter(-1)
+        return super().unlink()
+
+    def _bump_portal_counter(self, sign: int) -> None:
+        counts = Counter(rec.partner_id.id for rec in self if rec.partner_id)
+        self.env['res.partner']._esim_bump_portal_counter(
+            self._portal_counter_field,
+            {partner_id: sign * count for partner_id, count in counts.items()},
+        )
@@ -1,10 +1,19 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
+import math
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-from odoo import models, fields, api, _
+from markupsafe import Markup
+
+from odoo import models, fields, api, Command, _
 from odoo.exceptions import UserError
+from odoo.tools import float_compare
 
-from ..services.esim_api import EsimAccessAPIError, VOLUME_DIVISOR, parse_api_datetime
+from ..services.esim_api import EsimAccessAPIError, VOLUME_DIVISOR, format_api_datetime, parse_api_datetime
+from .esim_usage_snapshot import USAGE_SNAPSHOT_FIELDS
 
 _logger = logging.getLogger(__name__)
 
@@ -34,11 +43,51 @@ _ESIM_STATUS_STATE_MAP = {
     'REVOKE': 'revoked',
 }
 
+# 批量刷新：API 允许的最大分页大小
+BULK_QUERY_PAGE_SIZE = 500
+# 批量刷新：单次时间范围查询的跨度（天），超出时拆分为多个窗口
+BULK_QUERY_WINDOW_DAYS = 30
+# 调度：单次到期档案数超过该值时改用分页批量刷新，否则逐个 ICCID 查询
+BULK_REFRESH_THRESHOLD = 100
+
+# 自适应刷新间隔（小时）
+REFRESH_INTERVAL_MIN_HOURS = 0.25
+REFRESH_INTERVAL_READY_HOURS = 24
+REFRESH_INTERVAL_ACTIVE_HOURS = 12
+# 刷新失败（供应商接口报错）后的重试间隔（分钟），不按正常间隔顺延
+REFRESH_RETRY_MINUTES = 10
+# Webhook 活动后的关注窗口（小时）
+WEBHOOK_ACTIVITY_HOURS = 1
+# 剩余流量告警阈值（GB），与供应商 DATA_USAGE 通知的 100MB 保持一致
+LOW_VOLUME_GB = 0.1
+
+# 可用充值套餐缓存的有效期（小时），过期后在门户访问时后台刷新
+TOPUP_CACHE_TTL_HOURS = 6
+# 后台刷新充值套餐缓存：单次处理的 eSIM 数
+TOPUP_REFRESH_BATCH_SIZE = 50
+
+# 本地生成的激活 QR 码尺寸（像素），门户只提供这些尺寸
+QR_CODE_SIZES = (200, 400)
+QR_CODE_ATTACHMENT_PREFIX = 'esim_qr_'
+
+# 批量取消 / 挂起 / 吊销：操作名称与成功后写入的值
+BULK_OPERATION_LABELS = {
+    'cancel': '取消',
+    'suspend': '挂起',
+    'revoke': '吊销',
+}
+BULK_OPERATION_VALS = {
+    'cancel': {'state': 'cancelled', 'esim_status': 'CANCEL'},
+    'suspend': {'state': 'suspended'},
+    'revoke': {'state': 'revoked'},
+}
+
 
 class EsimProfile(models.Model):
     _name = 'esim.profile'
     _description = 'eSIM 档案'
-    _inherit = ['mail.thread']
+    _inherit = ['mail.thread', 'esim.portal.counter.mixin']
+    _portal_counter_field = 'esim_profile_count_cached'
     _order = 'create_date desc'
     _rec_name = 'iccid'
 
@@ -53,6 +102,10 @@ class EsimProfile(models.Model):
     )
     qr_code = fields.Char(string="激活码 (AC)")
     qr_code_url = fields.Char(string="QR 码图片链接")
+    qr_code_key = fields.Char(
+        string="QR 码版本", compute='_compute_qr_code_key',
+        help="激活码的短哈希，用于 QR 码缓存附件命名与门户图片链接版本",
+    )
     smdp_status = fields.Char(string="SM-DP+ 状态", tracking=True)
     esim_status = fields.Char(string="eSIM 状态", tracking=True)
     eid = fields.Char(string="EID")
@@ -66,12 +119,50 @@ class EsimProfile(models.Model):
     )
     can_cancel = fields.Boolean(
         string="可取消",
-        compute='_compute_can_cancel',
+        compute='_compute_can_cancel', store=True, index=True,
     )
     expired_time = fields.Datetime(string="过期时间")
     topup_ids = fields.One2many('esim.topup', 'profile_id', string="充值记录")
     topup_count = fields.Integer(compute='_compute_topup_count')
 
+    # ── 自适应刷新调度 ──
+    next_refresh_date = fields.Datetime(
+        string="下次刷新时间", readonly=True, index=True, copy=False,
+        help="为空表示尚未调度，会在下一次定时任务中优先刷新",
+    )
+    refresh_priority = fields.Float(string="刷新优先级", readonly=True, copy=False)
+    last_refresh_date = fields.Datetime(string="上次调度时间", readonly=True, copy=False)
+    refresh_used_volume = fields.Float(
+        string="上次调度时已用流量 (GB)", digits=(10, 2), readonly=True, copy=False,
+    )
+    usage_velocity = fields.Float(
+        string="流量消耗速度 (GB/小时)", digits=(10, 4), readonly=True, copy=False,
+    )
+    last_webhook_date = fields.Datetime(string="最近 Webhook 时间", readonly=True, copy=False)
+
+    # ── 用量趋势 ──
+    usage_snapshot_ids = fields.One2many('esim.usage.snapshot', 'profile_id', string="用量快照")
+    usage_burn_rate = fields.Float(
+        string="近期日均消耗 (GB/天)", digits=(10, 3), compute='_compute_usage_forecast',
+        help="最近 72 小时用量快照的平均消耗速度",
+    )
+    forecast_exhaustion_date = fields.Datetime(
+        string="预计流量耗尽时间", compute='_compute_usage_forecast',
+        help="按近期日均消耗推算剩余流量耗尽的时间，无消耗时为空",
+    )
+
+    # ── 可用充值套餐缓存 ──
+    topup_package_ids = fields.Many2many(
+        'esim.package', 'esim_profile_topup_package_rel', 'profile_id', 'package_id',
+        string="可用充值套餐", readonly=True, copy=False,
+        help="供应商按 ICCID 返回的可用充值套餐，由后台任务定期刷新",
+    )
+    topup_packages_date = fields.Datetime(string="充值套餐刷新时间", readonly=True, copy=False)
+    topup_refresh_pending = fields.Boolean(
+        string="待刷新充值套餐", readonly=True, copy=False, index=True,
+        help="门户访问时发现缓存过期，等待后台任务刷新",
+    )
+
     _sql_constraints = [
         ('iccid_uniq', 'UNIQUE(iccid)', 'ICCID 不能重复'),
     ]
@@ -82,6 +173,25 @@ class EsimProfile(models.Model):
             partner_name = rec.partner_id.name or ''
             rec.display_name = f"{partner_name} - {rec.iccid}" if rec.iccid else partner_name
 
+    @api.depends('qr_code')
+    def _compute_qr_code_key(self):
+        for rec in self:
+            rec.qr_code_key = (
+                hashlib.sha1(rec.qr_code.encode('utf-8')).hexdigest()[:12] if rec.qr_code else False
+            )
+
+    @api.depends('remaining_volume')
+    def _compute_usage_forecast(self):
+        burn_rates = self.env['esim.usage.snapshot'].sudo()._get_burn_rates(self.ids)
+        now = fields.Datetime.now()
+        for rec in self:
+            rate = burn_rates.get(rec.id, 0.0)
+            rec.usage_burn_rate = rate
+            rec.forecast_exhaustion_date = (
+                now + timedelta(days=rec.remaining_volume / rate)
+                if rate > 0 and rec.remaining_volume > 0 and rec.state in ('ready', 'active') else False
+            )
+
     @api.depends('total_volume', 'used_volume')
     def _compute_remaining_volume(self):
         for rec in self:
@@ -96,6 +206,18 @@ class EsimProfile(models.Model):
         for rec in self:
             rec.can_cancel = rec._is_cancelable()
 
+    @api.model_create_multi
+    def create(self, vals_list: list[dict]) -> 'EsimProfile':
+        profiles = super().create(vals_list)
+        self.env['esim.usage.snapshot']._schedule_snapshot(profiles)
+        return profiles
+
+    def write(self, vals: dict) -> bool:
+        res = super().write(vals)
+        if USAGE_SNAPSHOT_FIELDS.intersection(vals):
+            self.env['esim.usage.snapshot']._schedule_snapshot(self)
+        return res
+
     @staticmethod
     def _derive_state(esim_status: str, smdp_status: str) -> str:
         """根据 API 返回的 esimStatus 和 smdpStatus 推导 profile 内部状态"""
@@ -150,7 +272,12 @@ class EsimProfile(models.Model):
 
     def action_refresh_status(self) -> None:
         """从 API 刷新 eSIM 状态"""
+        self._refresh_status()
+
+    def _refresh_status(self) -> 'EsimProfile':
+        """逐个 ICCID 查询并刷新状态，返回查询成功的档案；查询失败的档案记录消息后跳过"""
         api_client = self.env['esim.package']._get_api_client()
+        refreshed_ids = []
         for profile in self:
             if not profile.iccid:
                 continue
@@ -160,6 +287,7 @@ class EsimProfile(models.Model):
                 profile.message_post(body=_("状态刷新失败: %s") % e.error_msg)
                 continue
 
+            refreshed_ids.append(profile.id)
             esim_list = result.get('esimList') or []
             if not esim_list:
                 continue
@@ -168,6 +296,159 @@ class EsimProfile(models.Model):
             vals.pop('iccid', None)
             if vals:
                 profile.write(vals)
+        return self.browse(refreshed_ids)
+
+    def _get_changed_vals(self, vals: dict) -> dict:
+        """返回 vals 中与当前记录值不同的字段，用于跳过无变化的写入"""
+        self.ensure_one()
+        changed = {}
+        for name, value in vals.items():
+            field = self._fields[name]
+            current = self[name]
+            if field.type == 'float':
+                if float_compare(current or 0.0, value or 0.0, precision_digits=2) == 0:
+                    continue
+            elif field.type == 'datetime':
+                if current == fields.Datetime.to_datetime(value):
+                    continue
+            elif (current or False) == (value or False):
+                continue
+            changed[name] = value
+        return changed
+
+    def _write_grouped(self, vals_by_profile: dict) -> int:
+        """按相同的变更值分组批量写入，返回实际写入的档案数"""
+        groups = {}
+        for profile, vals in vals_by_profile.items():
+            changed = profile._get_changed_vals(vals)
+            if changed:
+                groups.setdefault(tuple(sorted(changed.items())), []).append(profile.id)
+        written = 0
+        for key, profile_ids in groups.items():
+            self.browse(profile_ids).write(dict(key))
+            written += len(profile_ids)
+        return written
+
+    @api.model
+    def _query_esim_page(self, api_client, start_time, end_time, page_num: int) -> dict:
+        return api_client.query_esim(
+            start_time=format_api_datetime(start_time),
+            end_time=format_api_datetime(end_time),
+            page_num=page_num,
+            page_size=BULK_QUERY_PAGE_SIZE,
+        )
+
+    def _group_query_windows(self, end_time) -> list[tuple]:
+        """
+        按创建时间将档案归入查询窗口，只查询含待刷新档案的时间段：
+        窗口从其中最早档案的创建时间前 1 天开始（容忍供应商下单时间的偏差），跨度不超过 BULK_QUERY_WINDOW_DAYS。
+        返回 [(开始, 结束, 档案)]，窗口及窗口内档案均按 self 中的顺序（优先级）排列。
+        """
+        windows = []
+        for profile in self.sorted('create_date'):
+            if windows and profile.create_date < windows[-1][1]:
+                windows[-1][2].append(profile.id)
+                continue
+            window_start = profile.create_date - timedelta(days=1)
+            if windows:
+                window_start = max(window_start, windows[-1][1])
+            window_end = min(window_start + timedelta(days=BULK_QUERY_WINDOW_DAYS), end_time)
+            windows.append((window_start, window_end, [profile.id]))
+
+        position = {profile.id: index for index, profile in enumerate(self)}
+        windows.sort(key=lambda window: min(position[profile_id] for profile_id in window[2]))
+        return [
+            (window_start, window_end, self.browse(sorted(profile_ids, key=position.get)))
+            for window_start, window_end, profile_ids in windows
+        ]
+
+    def _bulk_refresh_status(self, max_calls: int = 0) -> int:
+        """批量刷新 eSIM 状态，返回实际发生变化的档案数，详见 `_bulk_refresh`"""
+        return self._bulk_refresh(max_calls)[2]
+
+    def _bulk_refresh(self, max_calls: int = 0) -> tuple:
+        """
+        批量刷新 eSIM 状态，返回 (已刷新的档案, 查询失败的档案, 实际发生变化的档案数)。
+        - 只按含待刷新档案的时间窗口查询，以 500 条/页分页拉取，其余页并发请求
+        - 首页未覆盖的档案少于剩余页数时改为逐个 ICCID 查询，取两者中调用更少的方式
+        - max_calls: 本次最多发出的查询请求数（0 为不限），分页与逐个查询都计入；
+          用完即停，未刷新的档案保持到期，留待下次按优先级继续
+        - 单个窗口查询失败只记录日志，该窗口未取到的档案计入失败，其余窗口照常刷新
+        - 结果在内存中按 ICCID 映射，仅对值有变化的档案按相同变更分组写入
+        """
+        profiles = self.filtered('iccid')
+        if not profiles:
+            return self.browse(), self.browse(), 0
+
+        api_client = self.env['esim.package']._get_api_client()
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_workers = max(int(ICP.get_param('esim_access.profile_refresh_workers', '4') or 1), 1)
+        budget = max_calls or math.inf
+
+        esim_by_iccid = {}
+        single_ids = []
+        failed_ids = []
+        calls = 0
+        for window_start, window_end, window_profiles in profiles._group_query_windows(fields.Datetime.now()):
+            if calls >= budget:
+                break
+            unresolved = window_profiles
+            try:
+                calls += 1
+                first_page = self._query_esim_page(api_client, window_start, window_end, 1)
+                for esim_data in first_page.get('esimList') or []:
+                    if esim_data.get('iccid'):
+                        esim_by_iccid[esim_data['iccid']] = esim_data
+                unresolved = window_profiles.filtered(lambda profile: profile.iccid not in esim_by_iccid)
+                total = (first_page.get('pager') or {}).get('total') or 0
+                remaining_pages = range(2, math.ceil(total / BULK_QUERY_PAGE_SIZE) + 1)
+                if unresolved and remaining_pages and len(remaining_pages) <= len(unresolved) \
+                        and calls + len(remaining_pages) <= budget:
+                    calls += len(remaining_pages)
+                    with ThreadPoolExecutor(
+                        max_workers=max_workers, thread_name_prefix='esim-profile-refresh',
+                    ) as pool:
+                        for result in pool.map(
+                            lambda page_num: self._query_esim_page(api_client, window_start, window_end, page_num),
+                            remaining_pages,
+                        ):
+                            for esim_data in result.get('esimList') or []:
+                                if esim_data.get('iccid'):
+                                    esim_by_iccid[esim_data['iccid']] = esim_data
+                    unresolved = unresolved.filtered(lambda profile: profile.iccid not in esim_by_iccid)
+            except EsimAccessAPIError as e:
+                _logger.error("批量刷新 eSIM 失败（%s ~ %s）: %s", window_start, window_end, e)
+                failed_ids.extend(unresolved.ids)
+                continue
+            single_ids.extend(unresolved.ids)
+
+        vals_by_profile = {}
+        for profile in profiles:
+            esim_data = esim_by_iccid.get(profile.iccid)
+            if esim_data is not None:
+                vals = self._map_esim_data(esim_data)
+                vals.pop('iccid', None)
+                vals_by_profile[profile] = vals
+        written = self._write_grouped(vals_by_profile)
+
+        singles = self.browse(single_ids)
+        if max_calls:
+            singles = singles[:max(max_calls - calls, 0)]
+        refreshed_singles = self.browse()
+        if singles:
+            _logger.info("批量刷新中 %d 个 eSIM 改为逐个查询", len(singles))
+            refreshed_singles = singles._refresh_status()
+
+        refreshed = self.browse([profile.id for profile in vals_by_profile]) | refreshed_singles
+        # 失败窗口中的档案可能已由相邻窗口的查询结果覆盖
+        failed = self.browse(failed_ids).filtered(
+            lambda profile: profile.iccid not in esim_by_iccid
+        ) | (singles - refreshed_singles)
+        _logger.info(
+            "批量刷新 eSIM 完成：共 %d 个，已刷新 %d 个（逐个查询 %d 个），失败 %d 个，变化 %d 个，查询请求 %d 次",
+            len(profiles), len(refreshed), len(singles), len(failed), written, calls + len(singles),
+        )
+        return refreshed, failed, written
 
     def action_cancel_profile(self) -> None:
         """取消未安装、未使用的 eSIM，并将状态标记为已取消。"""
@@ -221,11 +502,407 @@ class EsimProfile(models.Model):
             profile.write({'state': 'revoked'})
             profile.message_post(body=_("eSIM 已被永久吊销"))
 
+    # ── 批量操作 ─────────────────────────────────────────
+
+    def action_bulk_cancel(self) -> dict:
+        """批量取消所选 eSIM，逐个返回结果而非遇错整体回滚"""
+        self.env['esim.package']._check_manager_permission()
+        return self._bulk_operation_notification('cancel', self._bulk_profile_operation('cancel'))
+
+    def action_bulk_suspend(self) -> dict:
+        """批量挂起所选 eSIM"""
+        self.env['esim.package']._check_manager_permission()
+        return self._bulk_operation_notification('suspend', self._bulk_profile_operation('suspend'))
+
+    def action_bulk_revoke(self) -> dict:
+        """批量吊销所选 eSIM（不可逆）"""
+        self.env['esim.package']._check_manager_permission()
+        return self._bulk_operation_notification('revoke', self._bulk_profile_operation('revoke'))
+
+    def _check_bulk_operation(self, operation: str) -> str | None:
+        """返回不能执行该操作的原因，可执行时返回 None"""
+        self.ensure_one()
+        if operation == 'cancel':
+            if self.state == 'cancelled':
+                return _("已取消")
+            if not self._is_cancelable():
+                return _("不满足取消条件（需 esimStatus=GOT_RESOURCE 且 smdpStatus=RELEASED）")
+        elif operation == 'suspend':
+            if self.state not in ('ready', 'active'):
+                return _("只能挂起待激活或使用中的 eSIM")
+        elif operation == 'revoke':
+            if self.state == 'revoked':
+                return _("已被吊销")
+        return None
+
+    @staticmethod
+    def _call_bulk_operation(api_client, operation: str, iccid: str, esim_tran_no: str) -> None:
+        """在工作线程中调用 API，只使用预先取出的纯数据，不访问 ORM"""
+        if operation == 'cancel':
+            api_client.cancel_profile(esim_tran_no=esim_tran_no, iccid='' if esim_tran_no else iccid)
+        elif operation == 'suspend':
+            api_client.suspend_esim(iccid)
+        else:
+            api_client.revoke_esim(iccid)
+
+    def _bulk_profile_operation(self, operation: str) -> dict:
+        """
+        批量执行取消 / 挂起 / 吊销：
+        - 前置条件不满足的档案跳过，其余档案的 API 调用通过有界线程池并发发出
+        - 成功的档案一次批量写入状态，按来源订单各发布一条汇总消息
+        返回 {'done': 成功档案, 'failed': {档案 ID: 错误}, 'skipped': {档案 ID: 原因}}
+        """
+        api_client = self.env['esim.package']._get_api_client()
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_workers = max(int(ICP.get_param('esim_access.profile_action_workers', '4') or 1), 1)
+
+        skipped = {}
+        tasks = []
+        for profile in self:
+            reason = profile._check_bulk_operation(operation)
+            if reason:
+                skipped[profile.id] = reason
+            else:
+                tasks.append((profile.id, profile.iccid or '', profile.esim_tran_no or ''))
+
+        def run(task):
+            profile_id, iccid, esim_tran_no = task
+            try:
+                self._call_bulk_operation(api_client, operation, iccid, esim_tran_no)
+            except EsimAccessAPIError as e:
+                return profile_id, e.error_msg
+            return profile_id, None
+
+        done_ids = []
+        failed = {}
+        if tasks:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(tasks)), thread_name_prefix='esim-profile-action',
+            ) as pool:
+                for profile_id, error in pool.map(run, tasks):
+                    if error:
+                        failed[profile_id] = error
+                    else:
+                        done_ids.append(profile_id)
+
+        done = self.browse(done_ids)
+        if done:
+            # 逐档案的跟踪消息由下方的订单汇总消息代替
+            done.with_context(mail_notrack=True).write(BULK_OPERATION_VALS[operation])
+
+        result = {'done': done, 'failed': failed, 'skipped': skipped}
+        self._post_bulk_operation_summary(operation, result)
+        _logger.info(
+            "批量%s eSIM：成功 %d 个，失败 %d 个，跳过 %d 个",
+            BULK_OPERATION_LABELS[operation], len(done), len(failed), len(skipped),
+        )
+        return result
+
+    def _post_bulk_operation_summary(self, operation: str, result: dict) -> None:
+        """按来源订单汇总批量操作结果，每个订单一条消息；没有来源订单的档案在档案自身记录结果"""
+        label = BULK_OPERATION_LABELS[operation]
+        done_ids = set(result['done'].ids)
+        for order, profiles in self.grouped('order_id').items():
+            if not order:
+                for profile in profiles:
+                    reason = result['failed'].get(profile.id) or result['skipped'].get(profile.id)
+                    profile.message_post(body=_("批量%s eSIM：%s") % (
+                        label, _("成功") if profile.id in done_ids else reason,
+                    ))
+                continue
+            lines = [
+                _("批量%s eSIM：成功 %d 个，失败 %d 个，跳过 %d 个") % (
+                    label,
+                    len(done_ids.intersection(profiles.ids)),
+                    len(set(result['failed']).intersection(profiles.ids)),
+                    len(set(result['skipped']).intersection(profiles.ids)),
+                ),
+            ]
+            for profile in profiles:
+                reason = result['failed'].get(profile.id) or result['skipped'].get(profile.id)
+                if reason:
+                    lines.append(f"{profile.iccid}: {reason}")
+            order.message_post(body=Markup('<br/>').join(lines))
+
+    def _bulk_operation_notification(self, operation: str, result: dict) -> dict:
+        failed_count = len(result['failed'])
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("批量%s完成") % BULK_OPERATION_LABELS[operation],
+                'message': _("成功 %d 个，失败 %d 个，跳过 %d 个") % (
+                    len(result['done']), failed_count, len(result['skipped']),
+                ),
+                'type': 'warning' if failed_count else 'success',
+                'sticky': bool(failed_count),
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
+
+    def _compute_refresh_schedule(self, velocity: float, now) -> tuple:
+        """
+        根据流量消耗速度、剩余流量、到期时间和 Webhook 活动计算 (刷新间隔小时数, 优先级)。
+        间隔越短、优先级越高的档案越先被刷新。
+        """
+        self.ensure_one()
+        interval = REFRESH_INTERVAL_ACTIVE_HOURS if self.state == 'active' else REFRESH_INTERVAL_READY_HOURS
+        priority = 10.0 if self.state == 'active' else 0.0
+
+        if velocity > 0:
+            # 预计耗尽前至少刷新 4 次
+            interval = min(interval, self.remaining_volume / velocity / 4)
+            priority += min(velocity * 10, 30)
+
+        if self.state == 'active' and self.total_volume:
+            if self.remaining_volume <= LOW_VOLUME_GB:
+                priority += 40
+            elif self.remaining_volume <= 1:
+                priority += 20
+
+        if self.expired_time:
+            hours_to_expiry = (self.expired_time - now).total_seconds() / 3600
+            if 0 < hours_to_expiry <= 48:
+                interval = min(interval, hours_to_expiry / 4)
+                priority += 50 if hours_to_expiry <= 24 else 25
+
+        if self.last_webhook_date and now - self.last_webhook_date <= timedelta(hours=WEBHOOK_ACTIVITY_HOURS):
+            interval = REFRESH_INTERVAL_MIN_HOURS
+            priority += 30
+
+        return max(interval, REFRESH_INTERVAL_MIN_HOURS), priority
+
+    def _schedule_next_refresh(self) -> None:
+        """
+        刷新完成后更新消耗速度（与上次速度做平滑）并计算下次刷新时间与优先级。
+        下次刷新时间取整到分钟，取值相同的档案合并为一次写入（未消耗流量的档案通常完全一致）。
+        """
+        now = fields.Datetime.now()
+        groups = defaultdict(list)
+        for profile in self:
+            if profile.state not in ('ready', 'active'):
+                groups[(('next_refresh_date', False), ('refresh_priority', 0))].append(profile.id)
+                continue
+
+            velocity = profile.usage_velocity
+            if profile.last_refresh_date:
+                hours = (now - profile.last_refresh_date).total_seconds() / 3600
+                if hours > 0:
+                    sample = max(profile.used_volume - profile.refresh_used_volume, 0) / hours
+                    velocity = (velocity + sample) / 2 if velocity else sample
+
+            interval, priority = profile._compute_refresh_schedule(velocity, now)
+            vals = {
+                'last_refresh_date': now,
+                'refresh_used_volume': profile.used_volume,
+                'usage_velocity': round(velocity, 4),
+                'next_refresh_date': now + timedelta(minutes=round(interval * 60)),
+                'refresh_priority': priority,
+            }
+            groups[tuple(sorted(vals.items()))].append(profile.id)
+
+        for key, profile_ids in groups.items():
+            self.browse(profile_ids).write(dict(key))
+
+    def _mark_webhook_activity(self) -> None:
+        """收到供应商 Webhook 后记录活动并将档案置为立即到期"""
+        now = fields.Datetime.now()
+        self.write({
+            'last_webhook_date': now,
+            'next_refresh_date': now,
+        })
+
+    @api.model
+    def _get_refresh_due_domain(self) -> list:
+        return [
+            ('state', 'in', ('ready', 'active')),
+            '|',
+            ('next_refresh_date', '=', False),
+            ('next_refresh_date', '<=', fields.Datetime.now()),
+        ]
+
     @api.model
     def _cron_refresh_profiles(self) -> None:
-        """定时任务：刷新活跃 eSIM 的状态"""
-        active_profiles = self.search([('state', 'in', ('ready', 'active'))])
-        active_profiles.action_refresh_status()
+        """
+        定时任务：仅刷新已到期的 eSIM，按优先级排序，单次查询请求数不超过 API 预算。
+        到期数量较多时使用分页批量查询（每页请求计入预算），否则逐个 ICCID 查询（每个档案一次）。
+        预算用完时未刷新的档案保持到期，下次继续；查询失败的档案 REFRESH_RETRY_MINUTES 分钟后重试。
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        budget = max(int(ICP.get_param('esim_access.profile_refresh_budget', '500') or 1), 1)
+        due_profiles = self.search(
+            self._get_refresh_due_domain(),
+            order='refresh_priority desc, next_refresh_date asc nulls first',
+            limit=budget,
+        )
+        if not due_profiles:
+            return
+
+        if len(due_profiles) > BULK_REFRESH_THRESHOLD:
+            refreshed, failed, _written = due_profiles._bulk_refresh(max_calls=budget)
+        else:
+            refreshed = due_profiles._refresh_status()
+            failed = due_profiles.filtered('iccid') - refreshed
+        refreshed._schedule_next_refresh()
+        # 查询失败的档案短暂退避后重试，不按正常间隔顺延
+        failed.write({'next_refresh_date': fields.Datetime.now() + timedelta(minutes=REFRESH_RETRY_MINUTES)})
+        _logger.info(
+            "按调度刷新 %d / %d 个到期 eSIM，失败 %d 个", len(refreshed), len(due_profiles), len(failed),
+        )
+
+    # ── 本地 QR 码缓存 ──────────────────────────────────
+
+    def _qr_attachment_name(self, size: int) -> str:
+        self.ensure_one()
+        return f"{QR_CODE_ATTACHMENT_PREFIX}{size}_{self.qr_code_key}.png"
+
+    def _generate_qr_images(self) -> int:
+        """
+        由激活码在本地批量生成各尺寸 QR 码并缓存为附件（按尺寸 + 激活码哈希命名），
+        已有缓存跳过，激活码变化后的旧附件一并清理。返回新生成的图片数。
+        """
+        profiles = self.filtered('qr_code')
+        if not profiles:
+            return 0
+        Attachment = self.env['ir.attachment'].sudo()
+        existing = Attachment.search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', profiles.ids),
+            ('name', '=like', f'{QR_CODE_ATTACHMENT_PREFIX}%'),
+        ])
+        existing_keys = {(att.res_id, att.name) for att in existing}
+
+        Report = self.env['ir.actions.report']
+        vals_list = []
+        wanted_names = set()
+        for profile in profiles:
+            for size in QR_CODE_SIZES:
+                name = profile._qr_attachment_name(size)
+                wanted_names.add((profile.id, name))
+                if (profile.id, name) in existing_keys:
+                    continue
+                vals_list.append({
+                    'name': name,
+                    'res_model': self._name,
+                    'res_id': profile.id,
+                    'mimetype': 'image/png',
+                    'raw': Report.barcode('QR', profile.qr_code, width=size, height=size, humanreadable=0),
+                })
+        existing.filtered(lambda att: (att.res_id, att.name) not in wanted_names).unlink()
+        if vals_list:
+            Attachment.create(vals_list)
+        return len(vals_list)
+
+    def _get_qr_image(self, size: int) -> 'IrAttachment':
+        """返回指定尺寸的 QR 码附件，缓存缺失时即时生成"""
+        self.ensure_one()
+        if not self.qr_code or size not in QR_CODE_SIZES:
+            return self.env['ir.attachment']
+        domain = [
+            ('res_model', '=', self._name),
+            ('res_id', '=', self.id),
+            ('name', '=', self._qr_attachment_name(size)),
+        ]
+        Attachment = self.env['ir.attachment'].sudo()
+        attachment = Attachment.search(domain, limit=1)
+        if not attachment:
+            self._generate_qr_images()
+            attachment = Attachment.search(domain, limit=1)
+        return attachment
+
+    # ── 可用充值套餐缓存 ─────────────────────────────────
+
+    def _get_cached_topup_packages(self) -> 'EsimPackage':
+        """
+        返回缓存的可用充值套餐，不调用供应商接口；缓存为空或过期时登记后台刷新，本次先展示已有结果。
+        缓存内容由供应商按 ICCID 返回，无需再按门户展示开关过滤（充值套餐不参与目录发布）。
+        """
+        self.ensure_one()
+        if self.state not in ('ready', 'active') or not self.iccid:
+            return self.env['esim.package']
+        stale_before = fields.Datetime.now() - timedelta(hours=TOPUP_CACHE_TTL_HOURS)
+        if not self.topup_packages_date or self.topup_packages_date < stale_before:
+            self._request_topup_refresh()
+        return self.topup_package_ids.filtered('active')
+
+    def _request_topup_refresh(self) -> None:
+        """登记刷新并唤醒后台任务"""
+        pending = self.filtered(lambda profile: not profile.topup_refresh_pending)
+        if not pending:
+            return
+        pending.write({'topup_refresh_pending': True})
+        self.env.ref('esim_access.cron_refresh_esim_topup_packages')._trigger()
+
+    def _refresh_topup_packages(self) -> int:
+        """
+        按 ICCID 查询供应商可用充值套餐：API 请求并发发出，返回的套餐写入本地套餐表后
+        缓存到档案上。查询失败的档案保留旧缓存，下次访问时重试。返回成功刷新的数量。
+        """
+        Package = self.env['esim.package']
+        api_client = Package._get_api_client()
+        ICP = self.env['ir.config_parameter'].sudo()
+        markup = float(ICP.get_param('esim_access.default_markup', '1.3'))
+        max_workers = max(int(ICP.get_param('esim_access.profile_action_workers', '4') or 1), 1)
+
+        def fetch(profile_id_iccid):
+            profile_id, iccid = profile_id_iccid
+            try:
+                return profile_id, api_client.get_package_list(package_type='TOPUP', iccid=iccid), None
+            except EsimAccessAPIError as e:
+                return profile_id, None, e.error_msg
+
+        tasks = [(profile.id, profile.iccid) for profile in self if profile.iccid]
+        results = []
+        if tasks:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(tasks)), thread_name_prefix='esim-topup-cache',
+            ) as pool:
+                results = list(pool.map(fetch, tasks))
+
+        now = fields.Datetime.now()
+        refreshed = 0
+        for profile_id, packages, error in results:
+            profile = self.browse(profile_id)
+            if error:
+                _logger.warning("eSIM %s 可用充值套餐查询失败: %s", profile.iccid, error)
+                continue
+            codes = Package._upsert_packages(packages, markup)
+            profile.write({
+                'topup_package_ids': [Command.set(
+                    Package.search([('package_code', 'in', list(codes))]).ids
+                )],
+                'topup_packages_date': now,
+            })
+            refreshed += 1
+        self.write({'topup_refresh_pending': False})
+        return refreshed
+
+    @api.model
+    def _cron_refresh_topup_packages(self) -> None:
+        """定时任务：刷新门户登记过的充值套餐缓存，批量已满时立即再次唤醒"""
+        profiles = self.search(
+            [('topup_refresh_pending', '=', True)],
+            order='topup_packages_date asc nulls first', limit=TOPUP_REFRESH_BATCH_SIZE,
+        )
+        if not profiles:
+            return
+        refreshed = profiles._refresh_topup_packages()
+        _logger.info("刷新 %d / %d 个 eSIM 的可用充值套餐", refreshed, len(profiles))
+        if len(profiles) == TOPUP_REFRESH_BATCH_SIZE:
+            self.env.cr.commit()
+            self.env.ref('esim_access.cron_refresh_esim_topup_packages')._trigger()
+
+    def action_view_usage(self):
+        """查看用量曲线"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('用量趋势'),
+            'res_model': 'esim.usage.snapshot',
+            'view_mode': 'graph,list',
+            'domain': [('profile_id', '=', self.id)],
+            'context': {'graph_groupbys': ['snapshot_date:day']},
+        }
 
     def action_view_topups(self):
         """查看充值记录"""
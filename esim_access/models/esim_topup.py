@@ -102,5 +102,7 @@ class EsimTopup(models.Model):
                 profile_vals['used_volume'] = round(result['orderUsage'] / VOLUME_DIVISOR, 2)
             if profile_vals:
                 profile.write(profile_vals)
+            # 充值后可用充值套餐可能变化，下次访问时重新查询
+            profile.write({'topup_packages_date': False})
 
             topup.message_post(body=_("充值成功"))
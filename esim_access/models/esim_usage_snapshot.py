@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+RESOLUTION_SELECTION = [
+    ('raw', '原始'),
+    ('hourly', '小时'),
+    ('daily', '天'),
+]
+
+# 触发记录用量快照的档案字段
+USAGE_SNAPSHOT_FIELDS = frozenset({'used_volume', 'total_volume'})
+
+# 降采样：原始快照保留天数（之后合并为每小时一条），小时快照保留天数（之后合并为每天一条）
+RAW_RETENTION_DAYS = 2
+HOURLY_RETENTION_DAYS = 30
+# 消耗速度预测使用的时间窗口（小时）
+BURN_RATE_WINDOW_HOURS = 72
+
+_PENDING_KEY = 'esim_usage_snapshot_profile_ids'
+
+
+class EsimUsageSnapshot(models.Model):
+    """
+    eSIM 流量用量时间序列：档案用量变化时追加一条快照（只增不改），
+    consumed_volume 为相对上一条快照的增量，降采样合并时累加，任意分组求和即为消耗量。
+    """
+
+    _name = 'esim.usage.snapshot'
+    _description = 'eSIM 用量快照'
+    _order = 'snapshot_date desc, id desc'
+    _log_access = False
+
+    profile_id = fields.Many2one(
+        'esim.profile', string="eSIM", required=True, ondelete='cascade', readonly=True,
+    )
+    partner_id = fields.Many2one('res.partner', string="客户", index=True, readonly=True)
+    snapshot_date = fields.Datetime(string="快照时间", required=True, readonly=True)
+    resolution = fields.Selection(RESOLUTION_SELECTION, string="粒度", default='raw', required=True, readonly=True)
+    used_volume = fields.Float(string="已用流量 (GB)", digits=(10, 2), aggregator='max', readonly=True)
+    total_volume = fields.Float(string="总流量 (GB)", digits=(10, 2), aggregator='max', readonly=True)
+    consumed_volume = fields.Float(
+        string="消耗流量 (GB)", digits=(10, 3), aggregator='sum', readonly=True,
+        help="相对上一条快照新增的已用流量",
+    )
+
+    def init(self):
+        # 按档案取最近快照、按时间范围绘制曲线
+        create_index(
+            self.env.cr, 'esim_usage_snapshot_profile_id_snapshot_date_index', self._table,
+            ['profile_id', 'snapshot_date'],
+        )
+
+    # ── 写入 ─────────────────────────────────────────────
+
+    @api.model
+    def _schedule_snapshot(self, profiles) -> None:
+        """登记用量变化的档案，当前事务提交前统一批量写入快照"""
+        precommit = self.env.cr.precommit
+        pending = precommit.data.get(_PENDING_KEY)
+        if pending is None:
+            pending = precommit.data[_PENDING_KEY] = set()
+            precommit.add(self.sudo()._flush_pending_snapshots)
+        pending.update(profiles.ids)
+
+    @api.model
+    def _flush_pending_snapshots(self) -> None:
+        profile_ids = self.env.cr.precommit.data.pop(_PENDING_KEY, set())
+        if profile_ids:
+            self._record_snapshots(self.env['esim.profile'].browse(profile_ids).exists())
+
+    @api.model
+    def _record_snapshots(self, profiles) -> int:
+        """按档案当前用量追加快照，用量未变化的跳过，返回写入条数"""
+        if not profiles:
+            return 0
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (profile_id) profile_id, used_volume, total_volume
+              FROM esim_usage_snapshot
+             WHERE profile_id IN %s
+          ORDER BY profile_id, snapshot_date DESC, id DESC
+        """, (tuple(profiles.ids),))
+        last_by_profile = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+        now = fields.Datetime.now()
+        vals_list = []
+        for profile in profiles:
+            used = round(profile.used_volume or 0.0, 3)
+            total = round(profile.total_volume or 0.0, 3)
+            last_used, last_total = last_by_profile.get(profile.id, (None, None))
+            if last_used is not None and round(last_used, 3) == used and round(last_total, 3) == total:
+                continue
+            vals_list.append({
+                'profile_id': profile.id,
+                'partner_id': profile.partner_id.id,
+                'snapshot_date': now,
+                'used_volume': used,
+                'total_volume': total,
+                # 已用流量回落（如换卡或供应商重置）不计为负消耗
+                'consumed_volume': max(used - (last_used or 0.0), 0.0),
+            })
+        if vals_list:
+            self.create(vals_list)
+            self.flush_model()
+        return len(vals_list)
+
+    # ── 降采样 ───────────────────────────────────────────
+
+    @api.model
+    def _downsample(self, source: str, target: str, unit: str, cutoff) -> None:
+        """
+        将 cutoff 之前的 source 粒度快照按 (档案, unit) 分桶合并：
+        保留每桶最后一条作为 target 粒度快照，消耗量累加到该条，其余删除。
+        """
+        self.env.cr.execute("""
+            WITH buckets AS (
+                SELECT id,
+                       SUM(consumed_volume) OVER bucket AS bucket_consumed,
+                       ROW_NUMBER() OVER (bucket ORDER BY snapshot_date DESC, id DESC) AS rn
+                  FROM esim_usage_snapshot
+                 WHERE resolution = %(source)s
+                   AND snapshot_date < date_trunc(%(unit)s, %(cutoff)s::timestamp)
+                WINDOW bucket AS (PARTITION BY profile_id, date_trunc(%(unit)s, snapshot_date))
+            ), kept AS (
+                UPDATE esim_usage_snapshot snapshot
+                   SET resolution = %(target)s, consumed_volume = buckets.bucket_consumed
+                  FROM buckets
+                 WHERE snapshot.id = buckets.id AND buckets.rn = 1
+            )
+            DELETE FROM esim_usage_snapshot snapshot
+             USING buckets
+             WHERE snapshot.id = buckets.id AND buckets.rn > 1
+        """, {'source': source, 'target': target, 'unit': unit, 'cutoff': cutoff})
+        _logger.info("用量快照降采样 %s → %s：合并删除 %d 条", source, target, self.env.cr.rowcount)
+
+    @api.model
+    def _cron_downsample_snapshots(self) -> None:
+        """定时任务：原始快照 → 每小时，小时快照 → 每天"""
+        self.flush_model()
+        now = fields.Datetime.now()
+        self._downsample('raw', 'hourly', 'hour', now - timedelta(days=RAW_RETENTION_DAYS))
+        self._downsample('hourly', 'daily', 'day', now - timedelta(days=HOURLY_RETENTION_DAYS))
+        self.invalidate_model()
+
+    # ── 聚合查询 ─────────────────────────────────────────
+
+    @api.model
+    def _get_consumption_series(self, domain: list, days: int = 14, unit: str = 'day') -> list[dict]:
+        """按 unit 汇总最近 days 天的消耗量：[{'date': datetime, 'consumed': GB}, ...]，按时间升序"""
+        since = fields.Datetime.now() - timedelta(days=days)
+        groups = self._read_group(
+            domain + [('snapshot_date', '>=', since)],
+            groupby=[f'snapshot_date:{unit}'],
+            aggregates=['consumed_volume:sum'],
+            order=f'snapshot_date:{unit}',
+        )
+        return [{'date': date, 'consumed': consumed or 0.0} for date, consumed in groups]
+
+    @api.model
+    def _get_burn_rates(self, profile_ids: list[int]) -> dict[int, float]:
+        """最近 BURN_RATE_WINDOW_HOURS 小时内各档案的平均消耗速度（GB/天）"""
+        if not profile_ids:
+            return {}
+        since = fields.Datetime.now() - timedelta(hours=BURN_RATE_WINDOW_HOURS)
+        groups = self._read_group(
+            [('profile_id', 'in', profile_ids), ('snapshot_date', '>=', since)],
+            groupby=['profile_id'],
+            aggregates=['consumed_volume:sum'],
+        )
+        days = BURN_RATE_WINDOW_HOURS / 24
+        return {profile.id: (consumed or 0.0) / days for profile, consumed in groups}
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import models, fields, api, tools, _
+
+_logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENT_STATE_SELECTION = [
+    ('pending', '待处理'),
+    ('done', '已处理'),
+    ('failed', '失败'),
+]
+
+NOTIFY_TYPE_SELECTION = [
+    ('ORDER_STATUS', '订单状态'),
+    ('ESIM_STATUS', 'eSIM 状态'),
+    ('DATA_USAGE', '流量告警'),
+    ('VALIDITY_USAGE', '有效期告警'),
+]
+
+# 每批处理的事件数、失败重试上限与已处理事件保留天数
+WEBHOOK_BATCH_SIZE = 500
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_RETENTION_DAYS = 30
+
+
+class EsimWebhookEvent(models.Model):
+    """
+    Webhook 收件箱：回调请求只落库原始报文并立即应答，
+    由定时任务批量处理，同一订单 / ICCID 的多条事件合并为一次 API 查询。
+    """
+
+    _name = 'esim.webhook.event'
+    _description = 'eSIM Webhook 事件'
+    _order = 'id desc'
+    _rec_name = 'notify_type'
+
+    notify_type = fields.Selection(NOTIFY_TYPE_SELECTION, string="通知类型", required=True, readonly=True)
+    payload = fields.Text(string="原始报文", required=True, readonly=True)
+    iccid = fields.Char(string="ICCID", readonly=True, index=True)
+    order_no = fields.Char(string="API 订单号", readonly=True, index=True)
+    transaction_id = fields.Char(string="交易 ID", readonly=True)
+    request_id = fields.Char(string="请求 ID", readonly=True, copy=False, help="回调请求头 RT-RequestID，用于跨进程防重放")
+    state = fields.Selection(
+        WEBHOOK_EVENT_STATE_SELECTION, string="状态", default='pending',
+        required=True, readonly=True, index=True,
+    )
+    attempts = fields.Integer(string="处理次数", readonly=True)
+    processed_date = fields.Datetime(string="处理时间", readonly=True)
+    error_message = fields.Char(string="错误信息", readonly=True)
+
+    _sql_constraints = [
+        ('request_id_uniq', 'UNIQUE(request_id)', '同一回调请求只能记录一次'),
+    ]
+
+    @api.model
+    @tools.ormcache()
+    def _get_webhook_secret(self) -> str:
+        """Webhook 验证密钥缓存于 ormcache，验签无需每次查询数据库"""
+        return self.env['ir.config_parameter'].sudo().get_param('esim_access.webhook_secret', '')
+
+    @api.model
+    def _enqueue(self, data: dict, payload: str, request_id: str = '') -> 'EsimWebhookEvent':
+        """落库一条 Webhook 事件并唤醒处理任务；请求 ID 重复（跨进程重放）时返回空记录集"""
+        try:
+            with self.env.cr.savepoint():
+                event = self.create({
+                    'notify_type': data.get('notifyType'),
+                    'payload': payload,
+                    'iccid': data.get('iccid') or False,
+                    'order_no': data.get('orderNo') or False,
+                    'transaction_id': data.get('transactionId') or False,
+                    'request_id': request_id or False,
+                })
+        except psycopg2.IntegrityError:
+            return self.browse()
+        self._trigger_processing()
+        return event
+
+    @api.model
+    def _trigger_processing(self) -> None:
+        """事务提交后立即唤醒处理任务"""
+        cron = self.env.ref('esim_access.cron_process_esim_webhook_events', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    def action_retry(self) -> None:
+        """将失败事件重新放回队列"""
+        self.filtered(lambda event: event.state == 'failed').write({
+            'state': 'pending',
+            'attempts': 0,
+            'error_message': False,
+        })
+        self._trigger_processing()
+
+    # ── 批量处理 ─────────────────────────────────────────
+
+    @api.model
+    def _cron_process_events(self) -> None:
+        """按通知类型与订单 / ICCID 分组处理待处理事件，每组独立提交"""
+        events = self.search([('state', '=', 'pending')], order='id', limit=WEBHOOK_BATCH_SIZE)
+        groups = defaultdict(list)
+        for event in events:
+            if event.notify_type == 'ORDER_STATUS':
+                key = event.order_no or event.transaction_id
+            else:
+                key = event.iccid
+            groups[(event.notify_type, key or '')].append(event.id)
+
+        handlers = {
+            'ORDER_STATUS': self._process_order_status,
+            'ESIM_STATUS': self._process_esim_status,
+            'DATA_USAGE': self._process_data_usage,
+            'VALIDITY_USAGE': self._process_validity_usage,
+        }
+        for (notify_type, key), event_ids in groups.items():
+            group = self.browse(event_ids)
+            try:
+                with self.env.cr.savepoint():
+                    if key:
+                        handlers[notify_type](group)
+                    group._mark_processed()
+            except Exception as e:
+                _logger.exception("eSIM Webhook 事件处理异常: type=%s key=%s", notify_type, key)
+                group._mark_error(str(e))
+            self.env.cr.commit()
+
+        if len(events) == WEBHOOK_BATCH_SIZE:
+            self._trigger_processing()
+        self._prune_processed_events()
+
+    def _mark_processed(self) -> None:
+        self.write({
+            'state': 'done',
+            'processed_date': fields.Datetime.now(),
+            'error_message': False,
+        })
+
+    def _mark_error(self, error_message: str) -> None:
+        """记录错误，未超过重试上限的事件保持待处理，下次定时任务再试"""
+        for attempts, events in self.grouped(lambda event: event.attempts + 1).items():
+            events.write({
+                'state': 'failed' if attempts >= WEBHOOK_MAX_ATTEMPTS else 'pending',
+                'attempts': attempts,
+                'error_message': error_message,
+            })
+
+    @api.model
+    def _prune_processed_events(self) -> None:
+        threshold = fields.Datetime.now() - timedelta(days=WEBHOOK_RETENTION_DAYS)
+        self.search([('state', '=', 'done'), ('processed_date', '<', threshold)]).unlink()
+
+    def _get_profile(self):
+        """同组事件共享 ICCID，返回对应的 eSIM 档案"""
+        iccid = self[:1].iccid
+        profile = self.env['esim.profile'].search([('iccid', '=', iccid)], limit=1)
+        if not profile:
+            _logger.warning("eSIM Webhook %s: 未找到档案 iccid=%s", self[:1].notify_type, iccid)
+        return profile
+
+    def _process_order_status(self) -> None:
+        """订单状态：同一订单的多条通知只查询一次订单详情"""
+        event = self[:1]
+        domain = (
+            [('api_order_no', '=', event.order_no)] if event.order_no
+            else [('transaction_id', '=', event.transaction_id)]
+        )
+        order = self.env['esim.order'].search(domain, limit=1)
+        if not order and event.order_no and event.transaction_id:
+            # 下单结果尚未写入 api_order_no 时按交易 ID 匹配
+            order = self.env['esim.order'].search([('transaction_id', '=', event.transaction_id)], limit=1)
+        if not order:
+            _logger.warning("eSIM Webhook ORDER_STATUS: 未找到订单 %s", event.order_no or event.transaction_id)
+            return
+
+        # 查询失败时抛出异常，由 _cron_process_events 记录错误并稍后重试
+        api_client = self.env['esim.package']._get_api_client()
+        result = order._query_order_esims(api_client, order_no=event.order_no)
+        order._process_order_result(result)
+
+    def _process_esim_status(self) -> None:
+        """eSIM 状态：已被使用"""
+        profile = self._get_profile()
+        if not profile:
+            return
+        if profile.state != 'active':
+            profile.write({'state': 'active'})
+            profile.message_post(body=_("eSIM 已激活使用（Webhook 通知）"))
+        profile._mark_webhook_activity()
+
+    def _process_data_usage(self) -> None:
+        """流量告警：同一 ICCID 的多条告警只提醒一次、刷新一次用量"""
+        profile = self._get_profile()
+        if not profile:
+            return
+        profile.message_post(body=_("⚠️ eSIM 流量即将耗尽（剩余 ≤ 100MB），请及时充值"))
+        profile._mark_webhook_activity()
+        profile.action_refresh_status()
+
+    def _process_validity_usage(self) -> None:
+        """有效期告警：同一 ICCID 的多条告警只提醒一次"""
+        profile = self._get_profile()
+        if not profile:
+            return
+        profile.message_post(body=_("⚠️ eSIM 有效期仅剩 1 天，请及时充值续费"))
+        profile._mark_webhook_activity()
@@ -1,2 +1,5 @@
 # -*- coding: utf-8 -*-
 from . import esim_api
+from . import api_journal
+from . import rate_limiter
+from . import webhook_auth
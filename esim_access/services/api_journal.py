@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from odoo.sql_db import db_connect
+
+_logger = logging.getLogger(__name__)
+
+# 缓冲条数达到该值或距上次写入超过该秒数时批量写入
+JOURNAL_FLUSH_SIZE = 50
+JOURNAL_FLUSH_INTERVAL = 10
+# 写入失败时缓冲区的最大条数，超出后丢弃最早的记录（日志不影响业务调用）
+JOURNAL_MAX_BUFFER = 5000
+
+_JOURNAL_COLUMNS = (
+    'call_date', 'endpoint', 'duration_ms', 'http_status', 'success',
+    'error_code', 'attempts', 'request_bytes', 'response_bytes',
+)
+
+
+class PgApiCallJournal:
+    """
+    API 调用日志：调用线程只把记录追加到内存缓冲区，
+    累积到一定条数或时间后用独立连接一次多行 INSERT 写入 esim_api_call_log，
+    不占用业务事务，也不会因业务回滚丢失。
+    """
+
+    def __init__(
+        self,
+        dbname: str,
+        flush_size: int = JOURNAL_FLUSH_SIZE,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+    ):
+        self.dbname = dbname
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(
+        self,
+        endpoint: str,
+        duration_ms: int,
+        http_status: int | None,
+        success: bool,
+        error_code: str = '',
+        attempts: int = 1,
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+    ) -> None:
+        """追加一条调用记录，必要时触发批量写入"""
+        entry = (
+            datetime.now(timezone.utc).replace(tzinfo=None), endpoint, duration_ms, http_status,
+            success, error_code or None, attempts, request_bytes, response_bytes,
+        )
+        with self._lock:
+            self._buffer.append(entry)
+            if len(self._buffer) > JOURNAL_MAX_BUFFER:
+                del self._buffer[:len(self._buffer) - JOURNAL_MAX_BUFFER]
+            due = (
+                len(self._buffer) >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """写入缓冲区中的全部记录，返回写入条数；写入失败时记录放回缓冲区等待下次"""
+        # 同一时刻只允许一个线程写入，其余线程直接返回继续业务调用
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+                self._last_flush = time.monotonic()
+            if not entries:
+                return 0
+            try:
+                with db_connect(self.dbname).cursor() as cr:
+                    placeholders = ', '.join(['%s'] * len(entries))
+                    cr.execute(
+                        f"INSERT INTO esim_api_call_log ({', '.join(_JOURNAL_COLUMNS)}) VALUES {placeholders}",
+                        entries,
+                    )
+            except Exception:
+                _logger.warning("eSIM API 调用日志写入失败，%d 条记录保留到下次写入", len(entries), exc_info=True)
+                with self._lock:
+                    self._buffer[:0] = entries
+                return 0
+            return len(entries)
+        finally:
+            self._flush_lock.release()
+
+
+_shared_journals = {}
+_shared_journals_lock = threading.Lock()
+
+
+def get_shared_journal(dbname: str) -> PgApiCallJournal:
+    """返回当前 worker 进程内该数据库共享的调用日志缓冲"""
+    with _shared_journals_lock:
+        journal = _shared_journals.get(dbname)
+        if journal is None:
+            journal = _shared_journals[dbname] = PgApiCallJournal(dbname)
+        return journal
+
+
+@atexit.register
+def _flush_shared_journals() -> None:
+    """worker 退出前写入剩余的缓冲记录"""
+    for journal in list(_shared_journals.values()):
+        journal.flush()
@@ -3,10 +3,13 @@ import hashlib
 import hmac
 import json
 import logging
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
 
 _logger = logging.getLogger(__name__)
 
@@ -18,6 +21,14 @@ VOLUME_DIVISOR = 1073741824
 # Odoo fields.Datetime 要求的格式
 _ODOO_DT_FORMAT = '%Y-%m-%d %H:%M:%S'
 
+# 只读查询端点，失败重试不会产生副作用
+IDEMPOTENT_ENDPOINTS = frozenset({
+    'open/esim/query',
+    'open/package/list',
+})
+# 可重试的 HTTP 状态码：限流与服务端临时故障
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
 
 def parse_api_datetime(value: str) -> str | None:
     """将 API 返回的 ISO 8601 时间（如 2026-09-07T13:09:52+0000）转为 Odoo datetime 字符串"""
@@ -39,6 +50,23 @@ def parse_api_datetime(value: str) -> str | None:
     return None
 
 
+def format_api_datetime(value: datetime) -> str:
+    """将 Odoo 的 UTC naive datetime 转为 API 时间范围参数格式（如 2026-09-07T13:09:52+0000）"""
+    return value.strftime('%Y-%m-%dT%H:%M:%S+0000')
+
+
+def compute_request_signature(secret_key: str, access_code: str, timestamp: str, request_id: str, body: str) -> str:
+    """
+    API 请求签名：HMAC SHA256(secretKey, timestamp + requestId + accessCode + body)，十六进制大写
+    """
+    sign_data = f"{timestamp}{request_id}{access_code}{body}"
+    return hmac.new(
+        secret_key.encode('utf-8'),
+        sign_data.encode('utf-8'),
+        hashlib.sha256,
+    ).hexdigest().upper()
+
+
 class EsimAccessAPIError(Exception):
     """eSIM Access API 调用异常"""
 
@@ -49,60 +77,137 @@ class EsimAccessAPIError(Exception):
 
 
 class EsimAccessAPI:
-    """eSIM Access API 客户端，封装认证签名和所有端点调用"""
+    """eSIM Access API 客户端，封装认证签名和所有端点调用。
+
+    内部持有一个带连接池的 requests.Session，同一实例的多次调用复用 keep-alive 连接；
+    只读端点（IDEMPOTENT_ENDPOINTS）在网络错误或 429/5xx 时按指数退避重试。
+    可选的 rate_limiter 需提供 acquire(endpoint)，在每次实际发送前调用以取得令牌。
+    可选的 journal 需提供 record(...)，每次调用结束后记录端点、耗时、状态与报文大小。
+    """
 
     DEFAULT_TIMEOUT = 30
+    DEFAULT_POOL_SIZE = 10
 
-    def __init__(self, access_code: str, secret_key: str, base_url: str):
+    def __init__(
+        self,
+        access_code: str,
+        secret_key: str,
+        base_url: str,
+        timeout: int = DEFAULT_TIMEOUT,
+        max_retries: int = 0,
+        retry_backoff: float = 0.5,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        rate_limiter=None,
+        journal=None,
+    ):
         self.access_code = access_code
         self.secret_key = secret_key
         self.base_url = base_url.rstrip('/')
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self.max_retries = max(max_retries, 0)
+        self.retry_backoff = max(retry_backoff, 0)
+        self.rate_limiter = rate_limiter
+        self.journal = journal
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def close(self) -> None:
+        """释放连接池"""
+        self.session.close()
 
     def _generate_signature(self, request_id: str, timestamp: str, body: str) -> str:
         """
         HMAC SHA256 签名：signData = timestamp + requestId + accessCode + body
         """
-        sign_data = f"{timestamp}{request_id}{self.access_code}{body}"
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            sign_data.encode('utf-8'),
-            hashlib.sha256,
-        ).hexdigest().upper()
-        return signature
+        return compute_request_signature(self.secret_key, self.access_code, timestamp, request_id, body)
 
-    def _make_request(self, endpoint: str, payload: dict) -> dict:
-        """发送 POST 请求到 API 端点，处理认证和错误"""
-        url = f"{self.base_url}/{endpoint}"
-        body = json.dumps(payload, separators=(',', ':'))
+    def _build_headers(self, body: str) -> dict:
+        """构建认证请求头，每次发送（含重试）都使用新的 requestId 和时间戳"""
         request_id = uuid.uuid4().hex
         timestamp = str(int(datetime.now(timezone.utc).timestamp()))
-
-        signature = self._generate_signature(request_id, timestamp, body)
-        headers = {
+        return {
             'Content-Type': 'application/json',
             'RT-AccessCode': self.access_code,
             'RT-RequestID': request_id,
             'RT-Timestamp': timestamp,
-            'RT-Signature': signature,
+            'RT-Signature': self._generate_signature(request_id, timestamp, body),
         }
 
-        _logger.info("eSIM API request: %s %s", endpoint, body)
+    @staticmethod
+    def _is_retryable(error: requests.RequestException) -> bool:
+        """网络层错误、超时以及限流/服务端错误可重试"""
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code in RETRYABLE_STATUS_CODES
 
-        try:
-            resp = requests.post(url, data=body, headers=headers, timeout=self.DEFAULT_TIMEOUT)
-            resp.raise_for_status()
-        except requests.RequestException as e:
-            _logger.error("eSIM API HTTP error on %s: %s", endpoint, e)
-            raise EsimAccessAPIError('HTTP_ERROR', str(e)) from e
+    def _make_request(self, endpoint: str, payload: dict) -> dict:
+        """发送 POST 请求到 API 端点，处理认证、重试和错误"""
+        url = f"{self.base_url}/{endpoint}"
+        body = json.dumps(payload, separators=(',', ':'))
+        attempts = self.max_retries + 1 if endpoint in IDEMPOTENT_ENDPOINTS else 1
 
-        result = resp.json()
-        _logger.info("eSIM API response: %s success=%s", endpoint, result.get('success'))
+        _logger.info("eSIM API request: %s %s", endpoint, body)
 
-        if not result.get('success'):
-            error_code = result.get('errorCode', 'UNKNOWN')
-            error_msg = result.get('errorMessage') or result.get('errorMsg') or 'Unknown error'
-            _logger.warning("eSIM API error on %s: [%s] %s", endpoint, error_code, error_msg)
-            raise EsimAccessAPIError(error_code, error_msg)
+        # 调用日志：耗时只统计 HTTP 请求本身（含重试），不含限流排队与退避等待
+        call = {
+            'duration': 0.0, 'http_status': None, 'attempts': 0, 'response_bytes': 0,
+            'success': False, 'error_code': '',
+        }
+        try:
+            for attempt in range(attempts):
+                if self.rate_limiter:
+                    self.rate_limiter.acquire(endpoint)
+                call['attempts'] = attempt + 1
+                started = time.perf_counter()
+                try:
+                    resp = self.session.post(
+                        url, data=body, headers=self._build_headers(body), timeout=self.timeout,
+                    )
+                    call['http_status'] = resp.status_code
+                    call['response_bytes'] = len(resp.content)
+                    resp.raise_for_status()
+                    break
+                except requests.RequestException as e:
+                    if attempt + 1 >= attempts or not self._is_retryable(e):
+                        _logger.error("eSIM API HTTP error on %s: %s", endpoint, e)
+                        raise EsimAccessAPIError('HTTP_ERROR', str(e)) from e
+                    delay = self.retry_backoff * (2 ** attempt)
+                    _logger.warning(
+                        "eSIM API %s 第 %d 次请求失败，%.1f 秒后重试: %s",
+                        endpoint, attempt + 1, delay, e,
+                    )
+                    time.sleep(delay)
+                finally:
+                    call['duration'] += time.perf_counter() - started
+
+            result = resp.json()
+            _logger.info("eSIM API response: %s success=%s", endpoint, result.get('success'))
+
+            if not result.get('success'):
+                error_code = result.get('errorCode', 'UNKNOWN')
+                error_msg = result.get('errorMessage') or result.get('errorMsg') or 'Unknown error'
+                _logger.warning("eSIM API error on %s: [%s] %s", endpoint, error_code, error_msg)
+                raise EsimAccessAPIError(error_code, error_msg)
+            call['success'] = True
+        except EsimAccessAPIError as e:
+            call['error_code'] = e.error_code
+            raise
+        finally:
+            if self.journal:
+                self.journal.record(
+                    endpoint,
+                    duration_ms=round(call['duration'] * 1000),
+                    http_status=call['http_status'],
+                    success=call['success'],
+                    error_code=call['error_code'],
+                    attempts=call['attempts'],
+                    request_bytes=len(body.encode('utf-8')),
+                    response_bytes=call['response_bytes'],
+                )
 
         return result.get('obj', {})
 
@@ -248,3 +353,32 @@ class EsimAccessAPI:
     def suspend_esim(self, iccid: str) -> dict:
         """临时挂起 eSIM"""
         return self._make_request('suspend', {'iccid': iccid})
+
+
+# ── 进程级共享客户端 ──────────────────────────────────────────
+
+_shared_clients: dict[str, tuple[tuple, EsimAccessAPI]] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_client(dbname: str, config: tuple, rate_limiter=None, journal=None) -> EsimAccessAPI:
+    """
+    返回当前 worker 进程内该数据库共享的长连接客户端。
+    - config: (access_code, secret_key, base_url, timeout, max_retries, retry_backoff, ...)
+      整个元组参与比较，配置变化时关闭旧客户端并按新配置重建
+    - rate_limiter / journal: 仅在新建客户端时挂载
+    """
+    with _shared_clients_lock:
+        cached = _shared_clients.get(dbname)
+        if cached and cached[0] == config:
+            return cached[1]
+        if cached:
+            cached[1].close()
+        access_code, secret_key, base_url, timeout, max_retries, retry_backoff = config[:6]
+        client = EsimAccessAPI(
+            access_code, secret_key, base_url,
+            timeout=timeout, max_retries=max_retries, retry_backoff=retry_backoff,
+            rate_limiter=rate_limiter, journal=journal,
+        )
+        _shared_clients[dbname] = (config, client)
+        return client
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo.sql_db import db_connect
+
+from .esim_api import EsimAccessAPIError
+
+_logger = logging.getLogger(__name__)
+
+# 单条语句完成「补充令牌 → 判断 → 扣减」：FOR UPDATE 行锁仅持有到本次独立事务提交。
+# 未配置或已停用的端点不返回任何行，视为不限流。
+_TAKE_TOKEN_SQL = """
+    WITH bucket AS (
+        SELECT id,
+               refill_rate,
+               LEAST(
+                   capacity,
+                   tokens + EXTRACT(EPOCH FROM (clock_timestamp() AT TIME ZONE 'UTC') - last_refill) * refill_rate
+               ) AS available
+          FROM esim_api_rate_limit
+         WHERE endpoint = %s AND active
+           FOR UPDATE
+    ), taken AS (
+        UPDATE esim_api_rate_limit limiter
+           SET tokens = bucket.available - 1,
+               last_refill = clock_timestamp() AT TIME ZONE 'UTC'
+          FROM bucket
+         WHERE limiter.id = bucket.id AND bucket.available >= 1
+     RETURNING limiter.id
+    )
+    SELECT bucket.available, bucket.refill_rate, EXISTS(SELECT 1 FROM taken)
+      FROM bucket
+"""
+
+
+class PgTokenBucketLimiter:
+    """
+    基于 PostgreSQL 状态表（esim.api.rate.limit）的令牌桶限流器。
+    同一数据库的所有 Odoo worker 共享同一组令牌桶；令牌不足时等待补充，
+    超过 max_wait 秒仍未取得令牌则抛出 RATE_LIMITED 异常。
+    """
+
+    def __init__(self, dbname: str, max_wait: float = 30.0):
+        self.dbname = dbname
+        self.max_wait = max_wait
+
+    def _try_acquire(self, endpoint: str) -> float:
+        """尝试取一个令牌，成功返回 0，否则返回建议等待秒数"""
+        with db_connect(self.dbname).cursor() as cr:
+            cr.execute(_TAKE_TOKEN_SQL, (endpoint,))
+            row = cr.fetchone()
+        if not row:
+            return 0.0
+        available, refill_rate, taken = row
+        if taken:
+            return 0.0
+        return max((1 - available) / refill_rate, 0.01)
+
+    def acquire(self, endpoint: str) -> None:
+        """阻塞直到取得该端点的一个令牌"""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._try_acquire(endpoint)
+            if not wait:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _logger.warning("eSIM API %s 限流等待超过 %.1f 秒，放弃请求", endpoint, self.max_wait)
+                raise EsimAccessAPIError('RATE_LIMITED', f'本地限流：{endpoint} 请求过于频繁，请稍后重试')
+            _logger.debug("eSIM API %s 令牌不足，等待 %.2f 秒", endpoint, wait)
+            time.sleep(min(wait, remaining))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+# 回调请求时间戳与本机时间的最大偏差（秒），超出视为过期或重放
+WEBHOOK_TIMESTAMP_TOLERANCE = 300
+# 单进程最多记忆的请求 ID 数，超出时淘汰最早的记录
+WEBHOOK_REPLAY_CACHE_SIZE = 10000
+
+
+def compute_webhook_signature(secret: str, timestamp: str, request_id: str, body: bytes) -> str:
+    """
+    回调签名：HMAC SHA256(secret, timestamp + requestId + body)，十六进制大写，
+    与 API 请求签名（EsimAccessAPI._generate_signature）保持同一风格。
+    """
+    sign_data = f"{timestamp}{request_id}".encode('utf-8') + body
+    return hmac.new(secret.encode('utf-8'), sign_data, hashlib.sha256).hexdigest().upper()
+
+
+class ReplayCache:
+    """记住时间窗口内已接受的请求 ID，线程安全；跨进程的重放由收件箱 request_id 唯一约束兜底"""
+
+    def __init__(self, ttl: float = WEBHOOK_TIMESTAMP_TOLERANCE, max_size: int = WEBHOOK_REPLAY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check_and_add(self, request_id: str, now: float | None = None) -> bool:
+        """请求 ID 未出现过则记录并返回 True，重复则返回 False"""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._seen:
+                oldest_id, seen_at = next(iter(self._seen.items()))
+                if now - seen_at <= self.ttl and len(self._seen) < self.max_size:
+                    break
+                del self._seen[oldest_id]
+            if request_id in self._seen:
+                return False
+            self._seen[request_id] = now
+            return True
+
+
+def verify_webhook_request(
+    secret: str,
+    timestamp: str,
+    request_id: str,
+    signature: str,
+    body: bytes,
+    replay_cache: ReplayCache,
+    now: float | None = None,
+) -> str | None:
+    """
+    校验回调签名、时间窗口与重放，通过返回 None，否则返回拒绝原因。
+    签名校验在记录请求 ID 之前完成，伪造请求不会占用重放缓存。
+    """
+    if not (timestamp and request_id and signature):
+        return 'missing signature headers'
+    try:
+        ts = float(timestamp)
+    except ValueError:
+        return 'invalid timestamp'
+    # 兼容毫秒时间戳
+    if ts > 1e12:
+        ts /= 1000
+    now = time.time() if now is None else now
+    if abs(now - ts) > WEBHOOK_TIMESTAMP_TOLERANCE:
+        return 'timestamp outside tolerance'
+
+    expected = compute_webhook_signature(secret, timestamp, request_id, body)
+    if not hmac.compare_digest(expected, signature.upper()):
+        return 'invalid signature'
+    if not replay_cache.check_and_add(request_id, now):
+        return 'replayed request'
+    return None
@@ -0,0 +1,46 @@
+/** @odoo-module **/
+
+// 门户订单详情：订单在履约队列中（已确认 / 处理中）时轮询状态，状态变化后刷新页面。
+
+const POLL_INTERVAL_MS = 3000;
+const MAX_POLLS = 200;
+
+function watchOrderStatus(el) {
+    const url = el.dataset.statusUrl;
+    const initialState = el.dataset.state;
+    let polls = 0;
+
+    const timer = setInterval(async () => {
+        polls += 1;
+        if (polls > MAX_POLLS) {
+            clearInterval(timer);
+            return;
+        }
+        try {
+            const response = await fetch(url, {
+                credentials: "same-origin",
+                headers: { Accept: "application/json" },
+            });
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            if (data.state !== initialState) {
+                clearInterval(timer);
+                window.location.reload();
+            }
+        } catch {
+            // 网络抖动时等待下一次轮询
+        }
+    }, POLL_INTERVAL_MS);
+}
+
+function start() {
+    document.querySelectorAll("[data-esim-order-status]").forEach(watchOrderStatus);
+}
+
+if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", start);
+} else {
+    start();
+}
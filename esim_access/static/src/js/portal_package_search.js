@@ -0,0 +1,60 @@
+/** @odoo-module **/
+
+// 门户套餐目录：输入关键字时请求搜索联想，填充到输入框关联的 datalist。
+
+const DEBOUNCE_MS = 200;
+const MIN_LENGTH = 2;
+
+function attachSuggest(input) {
+    const url = input.dataset.esimPackageSuggest;
+    const datalist = document.getElementById(input.getAttribute("list"));
+    if (!datalist) {
+        return;
+    }
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener("input", () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < MIN_LENGTH) {
+            datalist.replaceChildren();
+            return;
+        }
+        timer = setTimeout(async () => {
+            controller?.abort();
+            controller = new AbortController();
+            try {
+                const response = await fetch(`${url}?q=${encodeURIComponent(query)}`, {
+                    credentials: "same-origin",
+                    headers: { Accept: "application/json" },
+                    signal: controller.signal,
+                });
+                if (!response.ok) {
+                    return;
+                }
+                const suggestions = await response.json();
+                datalist.replaceChildren(
+                    ...suggestions.map((item) => {
+                        const option = document.createElement("option");
+                        option.value = item.name;
+                        option.label = item.location;
+                        return option;
+                    })
+                );
+            } catch {
+                // 请求被新输入取消或网络抖动时忽略
+            }
+        }, DEBOUNCE_MS);
+    });
+}
+
+function start() {
+    document.querySelectorAll("[data-esim-package-suggest]").forEach(attachSuggest);
+}
+
+if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", start);
+} else {
+    start();
+}
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from . import test_package_sync
+from . import test_package_search
+from . import test_topup_cache
+from . import test_order_result
+from . import test_balance_rollup
+from . import test_order_pricing
+from . import test_order_cancel
+from . import test_portal_topup
+from . import test_profile_refresh
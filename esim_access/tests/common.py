@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase
+
+from ..services.esim_api import PRICE_DIVISOR, VOLUME_DIVISOR, EsimAccessAPIError
+
+
+def make_api_package(code: str, location: str = 'US', **overrides) -> dict:
+    """构造一条 open/package/list 返回的套餐数据"""
+    pkg = {
+        'packageCode': code,
+        'slug': code.lower(),
+        'name': f'{location} {code}',
+        'price': 5 * PRICE_DIVISOR,
+        'retailPrice': 10 * PRICE_DIVISOR,
+        'currencyCode': 'USD',
+        'volume': VOLUME_DIVISOR,
+        'duration': 7,
+        'durationUnit': 'DAY',
+        'location': location,
+        'description': '',
+        'supportTopUpType': 2,
+    }
+    pkg.update(overrides)
+    return pkg
+
+
+class FakeEsimAccessAPI:
+    """替代 EsimAccessAPI 的内存实现，按调用参数过滤预置数据"""
+
+    def __init__(self):
+        self.packages = []
+        self.topup_packages = {}
+        self.order_esims = {}
+        self.profile_esims = {}
+        self.failing_iccids = set()
+        self.range_failures = 0
+        self.calls = []
+
+    def get_package_list(self, location_code: str = '', package_type: str = 'BASE', iccid: str = '', **kw) -> list:
+        self.calls.append(('open/package/list', location_code, package_type, iccid))
+        if package_type == 'TOPUP':
+            return list(self.topup_packages.get(iccid, []))
+        return [
+            pkg for pkg in self.packages
+            if not location_code or location_code in pkg['location'].split(',')
+        ]
+
+    def place_order(self, transaction_id: str, package_info_list: list, amount: int = 0, **kw) -> dict:
+        self.calls.append(('open/esim/order', transaction_id))
+        return {'orderNo': f'B{transaction_id[:12]}', 'transactionId': transaction_id}
+
+    def query_esim(self, order_no: str = '', iccid: str = '', start_time: str = '', end_time: str = '',
+                   page_num: int = 1, page_size: int = 50) -> dict:
+        self.calls.append(('open/esim/query', order_no or iccid or start_time, page_num, page_size))
+        if iccid:
+            if iccid in self.failing_iccids:
+                raise EsimAccessAPIError('HTTP_ERROR', 'Service Unavailable')
+            esims = [self.profile_esims[iccid]] if iccid in self.profile_esims else []
+        elif start_time:
+            if self.range_failures:
+                self.range_failures -= 1
+                raise EsimAccessAPIError('HTTP_ERROR', 'Service Unavailable')
+            esims = list(self.profile_esims.values())
+        else:
+            esims = self.order_esims.get(order_no, [])
+        start = (page_num - 1) * page_size
+        return {
+            'esimList': list(esims[start:start + page_size]),
+            'pager': {'pageNum': page_num, 'pageSize': page_size, 'total': len(esims)},
+        }
+
+
+class EsimAccessCommon(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake_api = FakeEsimAccessAPI()
+        cls.startClassPatcher(patch.object(
+            type(cls.env['esim.package']), '_get_api_client', lambda self: cls.fake_api,
+        ))
+
+    def setUp(self):
+        super().setUp()
+        self.fake_api.packages = []
+        self.fake_api.topup_packages = {}
+        self.fake_api.order_esims = {}
+        self.fake_api.profile_esims = {}
+        self.fake_api.failing_iccids = set()
+        self.fake_api.range_failures = 0
+        self.fake_api.calls = []
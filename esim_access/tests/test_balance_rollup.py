@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestBalanceRollup(TransactionCase):
+
+    def _set_create_date(self, logs, expression):
+        logs.flush_recordset()
+        self.env.cr.execute(
+            f"UPDATE esim_balance_log SET create_date = {expression} WHERE id IN %s",
+            [tuple(logs.ids)],
+        )
+
+    def test_late_commit_with_lower_id_is_rolled_up(self):
+        Snapshot = self.env['esim.balance.snapshot']
+        partner = self.env['res.partner'].create({'name': 'Ledger Customer'})
+        late_log = partner._esim_change_balance('topup', 100)
+        early_log = partner._esim_change_balance('topup', 50)
+        self.assertLess(late_log.id, early_log.id)
+
+        # ID 较小的记录所在事务仍在进行（创建时间晚于水位），ID 较大的记录早已提交
+        self._set_create_date(early_log, "(now() at time zone 'UTC') - interval '1 hour'")
+        self._set_create_date(late_log, "(now() at time zone 'UTC')")
+
+        self.assertEqual(Snapshot._cron_rollup_balances(), 1)
+        first = Snapshot.search([('partner_id', '=', partner.id)])
+        self.assertEqual((first.balance, first.log_count, first.drift), (50, 1, 0))
+
+        # 时间推移到小 ID 记录早于水位之后再次汇总
+        self._set_create_date(late_log | early_log, "create_date - interval '1 hour'")
+        Snapshot.flush_model()
+        self.env.cr.execute(
+            "UPDATE esim_balance_snapshot SET log_date_to = log_date_to - interval '1 hour' WHERE id = %s",
+            [first.id],
+        )
+        Snapshot.invalidate_model()
+
+        self.assertEqual(Snapshot._cron_rollup_balances(), 1)
+        second = Snapshot.search([('partner_id', '=', partner.id)], limit=1)
+        self.assertNotEqual(second, first)
+        self.assertEqual((second.balance, second.log_count, second.drift), (150, 1, 0))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import EsimAccessCommon
+
+
+@tagged('post_install', '-at_install')
+class TestOrderCancel(EsimAccessCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Queued Customer'})
+        self.partner._esim_change_balance('topup', 50)
+        self.package = self.env['esim.package'].create({
+            'package_code': 'QUEUE_TEST_US',
+            'name': 'US Queue',
+            'package_type': 'BASE',
+            'sale_price': 10,
+        })
+
+    def test_cancel_queued_order_refunds_without_supplier(self):
+        order = self.env['esim.order'].create({
+            'partner_id': self.partner.id,
+            'package_id': self.package.id,
+            'quantity': 2,
+        })
+        order.action_confirm()
+        self.assertTrue(order.can_cancel)
+        self.assertEqual(self.partner.esim_balance, 30)
+
+        order.action_cancel()
+
+        self.assertEqual(order.state, 'cancelled')
+        self.assertFalse(order.next_fulfil_date)
+        self.assertEqual(self.partner.esim_balance, 50)
+
+        # 取消后履约队列拿到行锁时不再下单
+        self.assertEqual(order._lock_for_update(skip_locked=True), order)
+        order._fulfil_place_order()
+        self.assertEqual(order.state, 'cancelled')
+        self.assertFalse(self.fake_api.calls)
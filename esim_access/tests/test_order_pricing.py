@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import EsimAccessCommon
+
+
+@tagged('post_install', '-at_install')
+class TestOrderPricing(EsimAccessCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Pricing Customer'})
+        self.partner._esim_change_balance('topup', 100)
+        self.package = self.env['esim.package'].create({
+            'package_code': 'PRICE_TEST_US',
+            'name': 'US Pricing',
+            'package_type': 'BASE',
+            'sale_price': 10,
+        })
+
+    def test_repricing_package_keeps_order_amounts(self):
+        order = self.env['esim.order'].create({
+            'partner_id': self.partner.id,
+            'package_id': self.package.id,
+            'quantity': 2,
+        })
+        cart_order = self.env['esim.order'].create({
+            'partner_id': self.partner.id,
+            'line_ids': [(0, 0, {'package_id': self.package.id, 'quantity': 3})],
+        })
+
+        self.package.sale_price = 25
+
+        self.assertEqual((order.unit_price, order.total_amount), (10, 20))
+        self.assertEqual((cart_order.line_ids.unit_price, cart_order.total_amount), (10, 30))
+
+    def test_cancel_refunds_what_was_consumed(self):
+        order = self.env['esim.order'].create({
+            'partner_id': self.partner.id,
+            'package_id': self.package.id,
+            'quantity': 2,
+        })
+        order.action_confirm()
+        self.assertEqual(self.partner.esim_balance, 80)
+
+        self.package.sale_price = 25
+        order._confirm_refund_on_failure()
+        order._confirm_refund_on_failure()
+
+        self.assertEqual(order.balance_refunded_amount, 20)
+        self.assertEqual(self.partner.esim_balance, 100)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from ..models import esim_order
+from .common import EsimAccessCommon, make_api_package
+
+
+@tagged('post_install', '-at_install')
+class TestOrderResult(EsimAccessCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Bulk Customer'})
+        self.package = self.env['esim.package'].create({
+            'package_code': 'BULK_TEST_US',
+            'name': 'US Bulk',
+            'package_type': 'BASE',
+        })
+
+    def test_multi_page_order_ingests_every_esim(self):
+        order = self.env['esim.order'].create({
+            'partner_id': self.partner.id,
+            'package_id': self.package.id,
+            'quantity': 12,
+            'state': 'processing',
+            'api_order_no': 'B_TEST_MULTI_PAGE',
+        })
+        self.fake_api.order_esims[order.api_order_no] = [
+            {
+                'iccid': f'89990000000000010{index:02d}',
+                'esimStatus': 'GOT_RESOURCE',
+                'smdpStatus': 'RELEASED',
+                'packageList': [{'packageCode': self.package.package_code}],
+            }
+            for index in range(12)
+        ]
+
+        with patch.object(esim_order, 'ORDER_QUERY_PAGE_SIZE', 5):
+            order.action_check_status()
+
+        pages = [call[2] for call in self.fake_api.calls if call[0] == 'open/esim/query']
+        self.assertEqual(pages, [1, 2, 3])
+        self.assertEqual(len(order.profile_ids), 12)
+        self.assertEqual(order.state, 'done')
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import EsimAccessCommon
+
+
+@tagged('post_install', '-at_install')
+class TestPackageSearch(EsimAccessCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.singapore = cls.env['esim.package'].create({
+            'package_code': 'SEARCH_SG', 'name': 'Singapore 5GB 7Days', 'location': 'SG',
+        })
+        cls.japan = cls.env['esim.package'].create({
+            'package_code': 'SEARCH_JP', 'name': 'Japan 1GB 3Days', 'location': 'JP',
+        })
+        cls.domain = [('id', 'in', (cls.singapore | cls.japan).ids)]
+
+    def _has_pg_trgm(self) -> bool:
+        self.env.cr.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return bool(self.env.cr.fetchone())
+
+    def _explain(self, text: str) -> str:
+        """强制禁用顺序扫描后取执行计划，小表上也能验证谓词是否可走索引"""
+        Package = self.env['esim.package']
+        Package.flush_model()
+        self.env.cr.execute("SET LOCAL enable_seqscan = off")
+        self.env.cr.execute(SQL("EXPLAIN %s", Package._search_catalogue_query(text, [], 10)))
+        return '\n'.join(row[0] for row in self.env.cr.fetchall())
+
+    def test_search_without_trigram(self):
+        Package = self.env['esim.package']
+        with patch.object(self.env.registry, 'has_trigram', False):
+            self.assertEqual(Package._search_catalogue('singa', self.domain), self.singapore.ids)
+            self.assertEqual(Package._search_catalogue('japan 1gb', self.domain), self.japan.ids)
+            self.assertEqual(Package._search_catalogue('singapor3', self.domain), [])
+
+    def test_search_with_trigram(self):
+        if not self._has_pg_trgm():
+            self.skipTest("pg_trgm extension is not installed")
+        Package = self.env['esim.package']
+        with patch.object(self.env.registry, 'has_trigram', True):
+            self.assertEqual(Package._search_catalogue('singa', self.domain), self.singapore.ids)
+            # 拼写错误仅由词相似度匹配
+            self.assertEqual(Package._search_catalogue('singapor3', self.domain), self.singapore.ids)
+
+    def test_search_plan_uses_indexes(self):
+        if not self._has_pg_trgm():
+            self.skipTest("pg_trgm extension is not installed")
+        self.env.cr.execute("""
+            SELECT indexname FROM pg_indexes
+             WHERE tablename = 'esim_package' AND indexdef LIKE '%%gin_trgm_ops%%'
+        """)
+        trigram_indexes = [row[0] for row in self.env.cr.fetchall()]
+        self.assertTrue(trigram_indexes, "search_document should have a trigram index")
+
+        with patch.object(self.env.registry, 'has_trigram', True):
+            plan = self._explain('singapor3')
+        self.assertIn('esim_package_search_document_tsv_index', plan)
+        self.assertTrue(any(name in plan for name in trigram_indexes), plan)
+        self.assertNotIn('Seq Scan on esim_package', plan)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import EsimAccessCommon, make_api_package
+from ..models.esim_package import DEFAULT_FULL_SYNC_INTERVAL_HOURS
+from ..models.esim_package_sync_checkpoint import FULL_SYNC_LOCATION_CODE
+
+
+@tagged('post_install', '-at_install')
+class TestPackageSync(EsimAccessCommon):
+
+    def _get_package(self, code: str):
+        return self.env['esim.package'].with_context(active_test=False).search([('package_code', '=', code)])
+
+    def _get_checkpoint(self, location_code: str):
+        return self.env['esim.package.sync.checkpoint'].search([('location_code', '=', location_code)])
+
+    def test_stale_location_is_fetched_alone(self):
+        Package = self.env['esim.package']
+        self.fake_api.packages = [make_api_package('SYNC_US', 'US'), make_api_package('SYNC_JP', 'JP')]
+        Package._sync_packages_incremental()
+        self.assertEqual(self.fake_api.calls, [('open/package/list', '', 'BASE', '')])
+
+        # 只有 JP 超过地区同步间隔，全量同步尚未到期
+        self.fake_api.calls = []
+        self._get_checkpoint('JP').write({'last_sync_date': fields.Datetime.now() - timedelta(days=2)})
+        Package._sync_packages_incremental()
+        self.assertEqual(self.fake_api.calls, [('open/package/list', 'JP', 'BASE', '')])
+
+    def test_full_sync_keeps_location_progress(self):
+        Package = self.env['esim.package']
+        self.fake_api.packages = [make_api_package('SYNC_US', 'US')]
+        Package._sync_packages_incremental()
+        stale = fields.Datetime.now() - timedelta(days=2)
+        self._get_checkpoint('US').write({'last_sync_date': stale})
+        self._get_checkpoint(FULL_SYNC_LOCATION_CODE).write({
+            'last_sync_date': fields.Datetime.now() - timedelta(hours=DEFAULT_FULL_SYNC_INTERVAL_HOURS + 1),
+        })
+
+        Package._sync_packages_incremental()
+        self.assertEqual(self._get_checkpoint('US').last_sync_date, stale)
+
+    def test_incremental_sync_deactivates_withdrawn_package(self):
+        Package = self.env['esim.package']
+        self.fake_api.packages = [make_api_package('SYNC_US', 'US'), make_api_package('SYNC_JP', 'JP')]
+        Package._sync_packages_incremental()
+        self.assertTrue(self._get_package('SYNC_US').active)
+        self.assertTrue(self._get_package('SYNC_JP').active)
+
+        # 供应商下架 JP 套餐；按地区的增量同步无法判定下架
+        self.fake_api.packages = [make_api_package('SYNC_US', 'US')]
+        self._get_checkpoint('JP').write({'last_sync_date': fields.Datetime.now() - timedelta(days=30)})
+        Package._sync_packages_incremental()
+        self.assertTrue(self._get_package('SYNC_JP').active)
+
+        # 超过全量同步间隔后，下一次增量同步改走全量并停用下架套餐
+        self._get_checkpoint(FULL_SYNC_LOCATION_CODE).write({
+            'last_sync_date': fields.Datetime.now() - timedelta(hours=DEFAULT_FULL_SYNC_INTERVAL_HOURS + 1),
+        })
+        Package._sync_packages_incremental()
+        self.assertFalse(self._get_package('SYNC_JP').active)
+        self.assertTrue(self._get_package('SYNC_US').active)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, http
+from odoo.tests import HttpCase, new_test_user, tagged
+from odoo.tools import mute_logger
+
+
+@tagged('post_install', '-at_install')
+class TestPortalTopup(HttpCase):
+
+    def test_topup_outside_profile_cache_is_rejected(self):
+        user = new_test_user(self.env, login='esim_topup_portal', groups='base.group_portal')
+        Package = self.env['esim.package']
+        cached = Package.create({'package_code': 'TOPUP_CACHED', 'name': 'Cached', 'package_type': 'TOPUP'})
+        foreign = Package.create({'package_code': 'TOPUP_FOREIGN', 'name': 'Foreign', 'package_type': 'TOPUP'})
+        profile = self.env['esim.profile'].create({
+            'iccid': '8999000000000000301',
+            'partner_id': user.partner_id.id,
+            'state': 'ready',
+            'topup_package_ids': [fields.Command.set(cached.ids)],
+            'topup_packages_date': fields.Datetime.now(),
+        })
+
+        self.authenticate(user.login, user.login)
+        with mute_logger('odoo.http'):
+            response = self.url_open(f'/my/esim/topup/{profile.id}', data={
+                'package_id': foreign.id,
+                'csrf_token': http.Request.csrf_token(self),
+            }, allow_redirects=False)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(self.env['esim.topup'].search([('profile_id', '=', profile.id)]))
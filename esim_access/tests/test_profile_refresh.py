@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import EsimAccessCommon
+from ..models.esim_profile import REFRESH_RETRY_MINUTES
+
+
+@tagged('post_install', '-at_install')
+class TestProfileRefresh(EsimAccessCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.partner = self.env['res.partner'].create({'name': 'Refresh Customer'})
+        self.env['esim.profile'].search(self.env['esim.profile']._get_refresh_due_domain()).write({
+            'next_refresh_date': fields.Datetime.now() + timedelta(days=1),
+        })
+
+    def _create_profile(self, iccid: str):
+        self.fake_api.profile_esims[iccid] = {
+            'iccid': iccid, 'esimStatus': 'GOT_RESOURCE', 'smdpStatus': 'RELEASED',
+        }
+        return self.env['esim.profile'].create({
+            'iccid': iccid,
+            'partner_id': self.partner.id,
+            'state': 'ready',
+        })
+
+    def test_failed_profile_retries_soon_and_others_are_rescheduled(self):
+        ok = self._create_profile('8999000000000000401')
+        failing = self._create_profile('8999000000000000402')
+        self.fake_api.failing_iccids.add(failing.iccid)
+        before = fields.Datetime.now()
+
+        self.env['esim.profile']._cron_refresh_profiles()
+
+        self.assertTrue(ok.last_refresh_date)
+        self.assertFalse(failing.last_refresh_date)
+        retry_at = before + timedelta(minutes=REFRESH_RETRY_MINUTES)
+        self.assertGreaterEqual(failing.next_refresh_date, retry_at)
+        self.assertLess(failing.next_refresh_date, retry_at + timedelta(minutes=1))
+
+    def test_failed_window_does_not_abort_bulk_refresh(self):
+        old = self._create_profile('8999000000000000403')
+        recent = self._create_profile('8999000000000000404')
+        old.flush_recordset()
+        self.env.cr.execute(
+            "UPDATE esim_profile SET create_date = create_date - interval '90 days' WHERE id = %s", [old.id],
+        )
+        old.invalidate_recordset(['create_date'])
+        # 仅最近的档案出现在时间范围查询结果中，首个窗口（较早档案）查询失败
+        del self.fake_api.profile_esims[old.iccid]
+        self.fake_api.range_failures = 1
+
+        refreshed, failed, _written = (old | recent)._bulk_refresh()
+
+        self.assertEqual(refreshed, recent)
+        self.assertEqual(failed, old)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import EsimAccessCommon, make_api_package
+
+
+@tagged('post_install', '-at_install')
+class TestTopupCache(EsimAccessCommon):
+
+    def test_upserted_topup_is_offered(self):
+        partner = self.env['res.partner'].create({'name': 'Top-up Customer'})
+        profile = self.env['esim.profile'].create({
+            'iccid': '8999000000000000001',
+            'partner_id': partner.id,
+            'state': 'ready',
+        })
+        self.fake_api.topup_packages[profile.iccid] = [make_api_package('TOPUP_TEST_US', 'US')]
+
+        self.assertEqual(profile._refresh_topup_packages(), 1)
+
+        topup = self.env['esim.package'].search([('package_code', '=', 'TOPUP_TEST_US')])
+        self.assertEqual(topup.package_type, 'TOPUP')
+        self.assertFalse(topup.is_published)
+        self.assertEqual(profile._get_cached_topup_packages(), topup)
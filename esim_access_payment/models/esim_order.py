@@ -27,17 +27,21 @@ class EsimOrder(models.Model):
         return super()._confirm_deduct_balance()
 
     def _confirm_refund_on_failure(self) -> None:
-        """在线支付订单 API 下单失败时，将金额转入客户余额作为补偿。"""
+        """在线支付订单 API 下单失败时，将支付金额中尚未补偿的部分转入客户余额。"""
         if self.is_paid_online:
             self.ensure_one()
+            compensated = sum(self.balance_log_ids.filtered(lambda log: log.type == 'topup').mapped('amount'))
+            amount = round(self.total_amount - compensated, 2)
+            if amount <= 0:
+                return
             self.partner_id._esim_change_balance(
                 log_type='topup',
-                amount=self.total_amount,
+                amount=amount,
                 description=_("在线支付下单失败，金额转入余额: %s") % self.name,
                 order_id=self.id,
             )
             self.message_post(
-                body=_("eSIM API 下单失败，已将 $%.2f 转入客户余额。") % self.total_amount,
+                body=_("eSIM API 下单失败，已将 $%.2f 转入客户余额。") % amount,
             )
             return
         return super()._confirm_refund_on_failure()
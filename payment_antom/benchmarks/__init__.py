@@ -0,0 +1,7 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+"""Antom 离线压测工具。
+
+本包不会随模块加载（`payment_antom/__init__.py` 不导入它），仅供在
+`odoo-bin shell` 中手动执行，详见 `checkout_benchmark` 模块说明。
+"""
@@ -0,0 +1,227 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+"""Antom 全链路结账压测。
+
+对本地模拟网关（`mock_gateway.MockAntomGateway`）并发驱动 N 笔交易，逐笔依次经过：
+
+1. session      创建交易并调用 createPaymentSession（`_get_processing_values`）
+2. return       买家支付后同步跳转 `/payment/antom/return`（含 inquiryPayment 兜底）
+3. notify       网关投递签名通知到 `/payment/antom/notify`
+4. post_process 交易后处理（`_post_process`）
+
+HTTP 阶段直接调用进程内 WSGI 应用 `odoo.http.root`，无需另起 Odoo 服务；
+每个阶段的 SQL 数通过 Odoo 的线程级 `query_count` 统计。
+
+会写入交易和 provider 配置，请仅在一次性数据库中执行::
+
+    $ odoo-bin shell -c odoo.conf -d bench_db
+    >>> from odoo.addons.payment_antom.benchmarks import checkout_benchmark
+    >>> checkout_benchmark.run(env, transactions=200, concurrency=8)
+"""
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from werkzeug.test import Client
+
+from odoo import SUPERUSER_ID, api, http
+
+from odoo.addons.payment_antom import const
+from odoo.addons.payment_antom.benchmarks.mock_gateway import MockAntomGateway
+
+_logger = logging.getLogger(__name__)
+
+STAGES = ('session', 'return', 'notify', 'post_process')
+PERCENTILES = (50, 90, 95, 99)
+
+
+@contextmanager
+def _measure(sample: dict, stage: str):
+    """记录单个阶段的耗时（秒）与 SQL 数。
+
+    `odoo.sql_db.Cursor.execute` 会在当前线程存在 `query_count` 属性时累加；
+    WSGI 入口 `http.root` 每次请求也会重置该计数，因此两类阶段口径一致。
+    """
+    thread = threading.current_thread()
+    thread.query_count = 0
+    thread.query_time = 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sample[stage] = (time.perf_counter() - start, thread.query_count)
+
+
+def _percentile(values: list[float], pct: int) -> float:
+    """最近秩法百分位。"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def _setup_provider(registry, gateway: MockAntomGateway, currency_code: str) -> dict:
+    """将 Antom provider 指向模拟网关并准备结账所需的主数据，提交后返回各记录 ID。"""
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        provider = env.ref('payment_antom.payment_provider_antom')
+        payment_method = env.ref('payment_antom.payment_method_antom')
+        currency = env['res.currency'].with_context(active_test=False).search(
+            [('name', '=', currency_code)], limit=1,
+        )
+        currency.active = True
+        payment_method.active = True
+        provider.write({
+            'state': 'test',
+            'antom_client_id': gateway.client_id,
+            'antom_merchant_private_key': gateway.merchant_private_key_pem,
+            'antom_public_key': gateway.gateway_public_key_pem,
+        })
+        partner = env['res.partner'].create({
+            'name': 'Antom Benchmark Buyer',
+            'email': 'antom.benchmark@example.com',
+        })
+        return {
+            'provider_id': provider.id,
+            'payment_method_id': payment_method.id,
+            'currency_id': currency.id,
+            'partner_id': partner.id,
+        }
+
+
+def _run_checkout(registry, gateway: MockAntomGateway, setup: dict, index: int, amount: float) -> dict:
+    """驱动单笔交易走完全部阶段，返回 {stage: (秒, SQL 数)}，出错时带 error。"""
+    sample = {}
+    client = Client(http.root, use_cookies=False)
+
+    def post_notification(path, headers, body):
+        return client.post(path, headers=headers, data=body.encode('utf-8'))
+
+    try:
+        with _measure(sample, 'session'):
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                Transaction = env['payment.transaction']
+                tx = Transaction.create({
+                    'provider_id': setup['provider_id'],
+                    'payment_method_id': setup['payment_method_id'],
+                    'reference': Transaction._compute_reference('antom', prefix=f'BENCH-{index}'),
+                    'amount': amount,
+                    'currency_id': setup['currency_id'],
+                    'partner_id': setup['partner_id'],
+                    'operation': 'online_redirect',
+                })
+                tx._get_processing_values()
+                reference = tx.reference
+
+        gateway.complete_payment(reference)
+
+        with _measure(sample, 'return'):
+            client.get('/payment/antom/return', query_string={'reference': reference})
+
+        with _measure(sample, 'notify'):
+            response = gateway.send_notification(reference, post=post_notification)
+            if response.status_code != 200:
+                raise RuntimeError(f"notify returned HTTP {response.status_code}")
+
+        with _measure(sample, 'post_process'):
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                tx = env['payment.transaction'].search([('reference', '=', reference)])
+                tx._post_process()
+                sample['final_state'] = tx.state
+    except Exception as e:  # noqa: BLE001 - 压测需统计失败而非中断
+        _logger.exception("Antom benchmark checkout #%d failed", index)
+        sample['error'] = str(e)
+    return sample
+
+
+def _build_report(samples: list[dict], elapsed: float) -> dict:
+    completed = [s for s in samples if 'error' not in s]
+    report = {
+        'transactions': len(samples),
+        'completed': len(completed),
+        'failed': len(samples) - len(completed),
+        'done': sum(1 for s in completed if s.get('final_state') == 'done'),
+        'elapsed': elapsed,
+        'throughput': len(completed) / elapsed if elapsed else 0.0,
+        'stages': {},
+    }
+    for stage in STAGES:
+        durations = [s[stage][0] * 1000 for s in samples if stage in s]
+        queries = [s[stage][1] for s in samples if stage in s]
+        if not durations:
+            continue
+        report['stages'][stage] = {
+            'count': len(durations),
+            'latency_ms': {f'p{pct}': _percentile(durations, pct) for pct in PERCENTILES},
+            'latency_max_ms': max(durations),
+            'queries_avg': sum(queries) / len(queries),
+            'queries_max': max(queries),
+        }
+    return report
+
+
+def format_report(report: dict) -> str:
+    """将压测结果格式化为文本表格。"""
+    header = f"{'stage':<14}" + ''.join(f"{'p%d ms' % pct:>10}" for pct in PERCENTILES)
+    header += f"{'max ms':>10}{'avg SQL':>10}{'max SQL':>10}"
+    lines = [
+        f"transactions={report['transactions']} completed={report['completed']} "
+        f"failed={report['failed']} done={report['done']}",
+        f"elapsed={report['elapsed']:.2f}s throughput={report['throughput']:.2f} checkouts/s",
+        header,
+    ]
+    for stage, stats in report['stages'].items():
+        line = f"{stage:<14}"
+        line += ''.join(f"{stats['latency_ms'][f'p{pct}']:>10.1f}" for pct in PERCENTILES)
+        line += f"{stats['latency_max_ms']:>10.1f}{stats['queries_avg']:>10.1f}{stats['queries_max']:>10d}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def run(
+    env,
+    transactions: int = 100,
+    concurrency: int = 8,
+    amount: float = 10.0,
+    currency_code: str = 'USD',
+    gateway_latency: float = 0.0,
+) -> dict:
+    """执行压测并打印报告。
+
+    :param env: shell 中的 env，仅用于获取 registry；各 worker 使用独立游标
+    :param transactions: 交易总数 N
+    :param concurrency: 并发 worker 数
+    :param gateway_latency: 模拟网关每次 API 调用的附加延迟（秒）
+    :return: 报告字典，结构见 `_build_report`
+    """
+    registry = env.registry
+    gateway = MockAntomGateway(latency=gateway_latency).start()
+    # 所有区域 / 环境的网关地址统一指向模拟网关，仅在本进程内生效
+    gateway_urls = {
+        region: {env_key: gateway.url for env_key in urls}
+        for region, urls in const.GATEWAY_URLS.items()
+    }
+    try:
+        with patch.dict(const.GATEWAY_URLS, gateway_urls):
+            setup = _setup_provider(registry, gateway, currency_code)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='antom-bench') as pool:
+                samples = list(pool.map(
+                    lambda index: _run_checkout(registry, gateway, setup, index, amount),
+                    range(transactions),
+                ))
+            elapsed = time.perf_counter() - start
+    finally:
+        gateway.stop()
+
+    report = _build_report(samples, elapsed)
+    print(format_report(report))  # noqa: T201 - shell 交互输出
+    return report
@@ -0,0 +1,239 @@
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+"""本地模拟 Antom 网关。
+
+实现 Hosted Checkout 所需的最小接口集：
+- createPaymentSession / inquiryPayment，按真实网关规则校验商户请求签名，
+  并对响应签名（client-id / response-time / signature 头）；
+- 模拟买家在托管收银台完成支付；
+- 构造并投递签名的异步支付结果通知到 paymentNotifyUrl。
+
+签名与验签全部复用 `payment_antom.utils`，确保与生产链路的算法一致。
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from odoo.addons.payment_antom import const
+from odoo.addons.payment_antom import utils as antom_utils
+
+_logger = logging.getLogger(__name__)
+
+_SUCCESS_RESULT = {
+    'resultCode': 'SUCCESS',
+    'resultStatus': 'S',
+    'resultMessage': 'success',
+}
+
+
+def _generate_key_pair() -> tuple[str, str]:
+    """生成 RSA 密钥对，返回 (PKCS#1 私钥 PEM, 公钥 PEM)。"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode('utf-8')
+    public_pem = key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode('utf-8')
+    return private_pem, public_pem
+
+
+class MockAntomGateway:
+    """线程化的本地 Antom 网关，单进程内可同时服务多个并发 worker。
+
+    - merchant_private_key_pem: 配置到 provider 的商户私钥（网关持有对应公钥验签）
+    - gateway_public_key_pem: 配置到 provider 的 Antom 公钥（网关持有对应私钥签名）
+    """
+
+    def __init__(
+        self,
+        client_id: str = 'BENCH_CLIENT_ID',
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+    ):
+        self.client_id = client_id
+        self.latency = latency
+        self.merchant_private_key_pem, self._merchant_public_key_pem = _generate_key_pair()
+        self._gateway_private_key_pem, self.gateway_public_key_pem = _generate_key_pair()
+        self._payments = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockAntomGateway':
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='mock-antom-gateway', daemon=True,
+        )
+        self._thread.start()
+        _logger.info("Mock Antom gateway listening on %s", self.url)
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    # ------------------------------------------------------------------
+    # 签名
+    # ------------------------------------------------------------------
+
+    def _sign(self, path: str, time_string: str, body: str) -> str:
+        signature = antom_utils.sign_request(
+            path, self.client_id, time_string, body, self._gateway_private_key_pem,
+        )
+        return f"algorithm=RSA256,keyVersion=1,signature={signature}"
+
+    def _verify_merchant_request(self, path: str, headers, body: str) -> bool:
+        signature = antom_utils.parse_signature_header(headers.get('Signature', ''))
+        return bool(signature) and antom_utils.verify_signature(
+            path, headers.get('client-id', ''), headers.get('Request-Time', ''),
+            body, signature, self._merchant_public_key_pem,
+        )
+
+    # ------------------------------------------------------------------
+    # 接口实现
+    # ------------------------------------------------------------------
+
+    def _create_payment_session(self, payload: dict) -> dict:
+        payment_id = uuid.uuid4().hex
+        reference = payload.get('paymentRequestId', '')
+        with self._lock:
+            self._payments[reference] = {
+                'paymentId': payment_id,
+                'paymentAmount': payload.get('paymentAmount', {}),
+                'notifyUrl': payload.get('paymentNotifyUrl', ''),
+                'paid': False,
+            }
+        return {
+            'result': _SUCCESS_RESULT,
+            'paymentRequestId': reference,
+            'paymentId': payment_id,
+            'paymentSessionId': uuid.uuid4().hex,
+            'normalUrl': f'{self.url}/checkout/{payment_id}?reference={reference}',
+        }
+
+    def _inquiry_payment(self, payload: dict) -> dict:
+        reference = payload.get('paymentRequestId', '')
+        with self._lock:
+            payment = dict(self._payments.get(reference) or {})
+        if not payment:
+            return {
+                'result': {
+                    'resultCode': 'ORDER_NOT_EXIST',
+                    'resultStatus': 'F',
+                    'resultMessage': 'order not exist',
+                },
+            }
+        return {
+            'result': _SUCCESS_RESULT,
+            'paymentRequestId': reference,
+            'paymentId': payment['paymentId'],
+            'paymentAmount': payment['paymentAmount'],
+            'paymentStatus': 'SUCCESS' if payment['paid'] else 'PROCESSING',
+        }
+
+    def _build_handler(self):
+        gateway = self
+        routes = {
+            const.API_PATH_CREATE_SESSION: gateway._create_payment_session,
+            const.API_PATH_INQUIRY: gateway._inquiry_payment,
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+                _logger.debug("Mock Antom gateway: " + format, *args)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8')
+
+                route = next((func for suffix, func in routes.items() if path.endswith(suffix)), None)
+                if route is None:
+                    self.send_error(404)
+                    return
+                if not gateway._verify_merchant_request(path, self.headers, body):
+                    self.send_error(401, 'Invalid merchant signature')
+                    return
+
+                if gateway.latency:
+                    time.sleep(gateway.latency)
+
+                response_body = json.dumps(route(json.loads(body or '{}')), separators=(',', ':'))
+                response_time = antom_utils.get_iso8601_time()
+                encoded = response_body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.send_header('client-id', gateway.client_id)
+                self.send_header('response-time', response_time)
+                self.send_header('signature', gateway._sign(path, response_time, response_body))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return Handler
+
+    # ------------------------------------------------------------------
+    # 买家支付与异步通知
+    # ------------------------------------------------------------------
+
+    def complete_payment(self, reference: str) -> None:
+        """模拟买家在托管收银台完成支付。"""
+        with self._lock:
+            self._payments[reference]['paid'] = True
+
+    def build_notification(self, reference: str) -> tuple[str, dict, str]:
+        """构造签名的支付结果通知，返回 (通知路径, 请求头, 请求体)。"""
+        with self._lock:
+            payment = dict(self._payments[reference])
+        path = urlparse(payment['notifyUrl']).path
+        body = json.dumps({
+            'notifyType': 'PAYMENT_RESULT',
+            'result': _SUCCESS_RESULT,
+            'paymentRequestId': reference,
+            'paymentId': payment['paymentId'],
+            'paymentAmount': payment['paymentAmount'],
+            'paymentTime': antom_utils.get_iso8601_time(),
+        }, separators=(',', ':'))
+        request_time = antom_utils.get_iso8601_time()
+        headers = {
+            'Content-Type': 'application/json; charset=UTF-8',
+            'client-id': self.client_id,
+            'request-time': request_time,
+            'signature': self._sign(path, request_time, body),
+        }
+        return path, headers, body
+
+    def send_notification(self, reference: str, post=None):
+        """向商户投递支付结果通知。
+
+        :param post: 可选的投递函数 `post(path, headers, body)`；缺省时按
+                     paymentNotifyUrl 通过 HTTP 真实发送。
+        """
+        path, headers, body = self.build_notification(reference)
+        if post is not None:
+            return post(path, headers, body)
+        with self._lock:
+            notify_url = self._payments[reference]['notifyUrl']
+        return requests.post(notify_url, headers=headers, data=body.encode('utf-8'), timeout=30)